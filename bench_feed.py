@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+推荐流扫描与匹配的离线基准测试
+
+使用 fixtures/ 下的 HTML 夹具（按模板生成 50/500/5000 张卡片的推荐流，以及详情页/错误页），
+通过 page.route 在本地提供页面，用无头 Chromium 运行，不访问真实站点。
+结果写入 JSON 文件，可用 --baseline 与其他提交的结果对比。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+from string import Template
+from typing import Optional, List, Tuple, Dict, Any
+from urllib.parse import urlparse, parse_qs
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from playwright.sync_api import sync_playwright
+
+import xhs_find_and_open as xhs
+import xhs_page
+from xhs_profile import PROFILER
+from xhs_rules import compile_rules
+from xhs_network import FeedCapture
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BENCH_ORIGIN = "https://bench.xhs.local"
+BENCH_NOTE_ID = "66f0a1b2c3d4e5f6a7b8c9d0"
+BENCH_ERROR_ID = "66f0ffffffffffffffffffff"
+DEFAULT_SIZES = [50, 500, 5000]
+DEFAULT_OUTPUT = "bench_results.json"
+
+TITLE_WORDS = [
+    "周末", "露营", "猫咪", "美食", "探店", "旅行", "穿搭", "护肤", "健身", "读书",
+    "咖啡", "早餐", "攻略", "日常", "租房", "装修", "数码", "相机", "徒步", "海边",
+    "vlog", "OOTD", "citywalk", "教程", "分享", "合集", "平价", "好物", "记录", "学习",
+]
+AUTHOR_WORDS = ["阿青", "小鹿", "橘子", "山山", "Momo", "Kiki", "大白", "一只"]
+
+
+def _read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def build_feed_html(size: int, seed: int = 0) -> str:
+    """按卡片模板生成指定数量卡片的推荐流页面（同一 seed 结果固定）"""
+    rng = random.Random(seed * 100003 + size)
+    page_tpl = Template(_read_fixture("feed_page.html"))
+    card_tpl = Template(_read_fixture("feed_card.html"))
+    cards = []
+    for i in range(size):
+        title = "".join(rng.sample(TITLE_WORDS, rng.randint(2, 5)))
+        cards.append(card_tpl.substitute(
+            index=i,
+            note_id="%024x" % rng.getrandbits(96),
+            token="AB%016x" % rng.getrandbits(64),
+            title=title,
+            user_id="%024x" % rng.getrandbits(96),
+            author=rng.choice(AUTHOR_WORDS) + str(rng.randint(1, 999)),
+            likes=str(rng.randint(0, 20000)),
+        ))
+    return page_tpl.substitute(cards="".join(cards))
+
+
+def _serve(route, feeds: Dict[int, str], detail_html: str, error_html: str, homefeed_json: str):
+    parsed = urlparse(route.request.url)
+    if parsed.netloc != urlparse(BENCH_ORIGIN).netloc:
+        route.abort()
+        return
+    if parsed.path == "/api/sns/web/v1/homefeed":
+        # 录制的推荐流接口响应
+        route.fulfill(status=200, content_type="application/json; charset=utf-8", body=homefeed_json)
+        return
+    if parsed.path == "/explore":
+        size = int(parse_qs(parsed.query).get("n", ["50"])[0])
+        body = feeds[size]
+    elif parsed.path.startswith("/explore/"):
+        body = error_html if parsed.path.endswith(BENCH_ERROR_ID) else detail_html
+    else:
+        route.fulfill(status=404, body="")
+        return
+    route.fulfill(status=200, content_type="text/html; charset=utf-8", body=body)
+
+
+def _timed(fn) -> Tuple[float, int, Any]:
+    # 返回 (耗时秒数, Playwright 调用次数, 结果)
+    PROFILER.reset()
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, PROFILER.total_calls(), result
+
+
+def bench_feed_size(page, size: int, repeat: int) -> Dict[str, Any]:
+    page.goto(f"{BENCH_ORIGIN}/explore?n={size}", wait_until="domcontentloaded")
+    xhs.wait_for_feed_ready(page, timeout_ms=10000)
+
+    # 扫描：规则永不命中，保证每张卡片都被处理一遍
+    no_match = compile_rules([({"title"}, "__bench_never_matches__")])
+    scan_times = []
+    scan_calls = 0
+    for _ in range(repeat):
+        elapsed, calls, _ = _timed(lambda: xhs.find_card_link_by_keywords(
+            page, no_match, max_scroll_steps=1, scroll_pause_ms=0))
+        scan_times.append(elapsed)
+        scan_calls = calls
+    # 匹配语料按扫描的实际路径提取：先取 href，再为这些卡片取标题
+    links = xhs._extract_card_links(page)
+    titles = xhs._extract_card_titles(page, links)
+    cards = [{"title": titles.get(link, ""), "link": link} for link in links]
+    n_cards = max(1, len(cards))
+
+    # 逐锚点提取（回退路径），取前 50 个锚点估算单卡成本
+    anchors = page.locator(xhs_page.FEED_CARD_SELECTORS[0]).all()[:50]
+    per_anchor_elapsed, per_anchor_calls, _ = _timed(lambda: [xhs._extract_card_texts(a) for a in anchors])
+    n_anchors = max(1, len(anchors))
+
+    # 匹配：约 20% 的卡片可命中
+    ruleset = compile_rules([({"title"}, w) for w in TITLE_WORDS[:3]] + [({"link"}, "/explore/ff")])
+    loops = max(1, 20000 // n_cards)
+    started = time.perf_counter()
+    matches = 0
+    for _ in range(loops):
+        for card in cards:
+            if ruleset.match(card):
+                matches += 1
+    match_elapsed = time.perf_counter() - started
+
+    best_scan = min(scan_times)
+    return {
+        "cards": len(cards),
+        "scan_seconds": round(best_scan, 4),
+        "scan_seconds_all": [round(t, 4) for t in scan_times],
+        "scan_calls": scan_calls,
+        "scan_calls_per_card": round(scan_calls / n_cards, 4),
+        "cards_per_second": round(len(cards) / best_scan, 1) if best_scan else None,
+        "fallback_seconds_per_card": round(per_anchor_elapsed / n_anchors, 5),
+        "fallback_calls_per_card": round(per_anchor_calls / n_anchors, 2),
+        "match_cards_per_second": round(len(cards) * loops / match_elapsed, 1) if match_elapsed else None,
+        "matches_per_second": round(matches / match_elapsed, 1) if match_elapsed else None,
+    }
+
+
+def bench_unviewable(page, note_id: str) -> Dict[str, Any]:
+    page.goto(f"{BENCH_ORIGIN}/explore/{note_id}", wait_until="domcontentloaded")
+    elapsed, calls, verdict = _timed(lambda: xhs._is_note_unviewable(page))
+    return {"seconds": round(elapsed, 4), "calls": calls, "unviewable": verdict}
+
+
+def bench_capture(page) -> Dict[str, Any]:
+    # 接口捕获模式：回放录制的推荐流响应，直接在结构化数据上匹配
+    capture = FeedCapture().install(page)
+    try:
+        page.goto(f"{BENCH_ORIGIN}/explore?n=50&capture=1", wait_until="domcontentloaded")
+        deadline = time.time() + 10
+        while capture.responses == 0 and time.time() < deadline:
+            page.wait_for_timeout(50)
+        ruleset = compile_rules([({"title"}, "露营"), ({"title"}, "citywalk"), ({"title"}, "好物")])
+        elapsed, calls, matches = _timed(lambda: list(xhs.iter_matching_cards(
+            page, ruleset, max_scroll_steps=1, scroll_pause_ms=0, capture=capture)))
+    finally:
+        capture.uninstall()
+    return {
+        "seconds": round(elapsed, 4),
+        "calls": calls,
+        "notes": capture.notes_seen,
+        "matches": len(matches),
+    }
+
+
+def bench_detail(page, note_id: str) -> Dict[str, Any]:
+    page.goto(f"{BENCH_ORIGIN}/explore/{note_id}", wait_until="domcontentloaded")
+    elapsed, calls, detail = _timed(lambda: xhs.extract_note_detail(page))
+    return {"seconds": round(elapsed, 4), "calls": calls, "detail": detail.to_dict()}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes: List[int], repeat: int, headless: bool = True) -> Dict[str, Any]:
+    feeds = {size: build_feed_html(size) for size in sizes}
+    detail_html = _read_fixture("note_detail.html")
+    error_html = _read_fixture("note_error.html")
+    homefeed_json = _read_fixture("homefeed.json")
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "feeds": {},
+        "unviewable": {},
+    }
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=headless)
+        context = browser.new_context(locale="zh-CN", viewport={"width": 1366, "height": 900})
+        context.route("**/*", lambda route: _serve(route, feeds, detail_html, error_html, homefeed_json))
+        page = context.new_page()
+        PROFILER.enable()
+        try:
+            for size in sizes:
+                print(f"扫描 {size} 张卡片 …")
+                results["feeds"][str(size)] = bench_feed_size(page, size, repeat)
+            print("不可浏览检测 …")
+            results["unviewable"]["detail"] = bench_unviewable(page, BENCH_NOTE_ID)
+            results["unviewable"]["error"] = bench_unviewable(page, BENCH_ERROR_ID)
+            print("接口捕获 …")
+            results["capture"] = bench_capture(page)
+            print("详情提取 …")
+            results["detail"] = bench_detail(page, BENCH_NOTE_ID)
+        finally:
+            PROFILER.disable()
+            context.close()
+            browser.close()
+    return results
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"=== 基准结果（commit {results.get('commit') or '未知'}）===")
+    base_feeds = (baseline or {}).get("feeds", {})
+    for size, r in results["feeds"].items():
+        line = (
+            f"{size:>5} 卡片: 扫描 {r['scan_seconds']:.3f}s, "
+            f"{r['scan_calls_per_card']:.3f} 次调用/卡, "
+            f"回退路径 {r['fallback_calls_per_card']:.1f} 次调用/卡, "
+            f"匹配 {r['matches_per_second']:.0f} 命中/s"
+        )
+        base = base_feeds.get(size)
+        if base and base.get("scan_seconds"):
+            ratio = r["scan_seconds"] / base["scan_seconds"]
+            line += f"（扫描耗时为基线的 {ratio:.2f} 倍，基线 commit {baseline.get('commit')}）"
+        print(line)
+    for name, r in results["unviewable"].items():
+        print(f"不可浏览检测[{name}]: {r['seconds']:.3f}s, {r['calls']} 次调用, 判定={r['unviewable']}")
+    capture = results.get("capture")
+    if capture:
+        print(f"接口捕获: {capture['seconds']:.3f}s, {capture['calls']} 次调用, 笔记 {capture['notes']} 条, 命中 {capture['matches']} 条")
+    detail = results.get("detail")
+    if detail:
+        print(f"详情提取: {detail['seconds']:.3f}s, {detail['calls']} 次调用, 标题={detail['detail']['title']!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线评估推荐流扫描、匹配与不可浏览检测的性能")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="推荐流卡片数量，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模的扫描重复次数（取最快一次）")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果 JSON 文件路径")
+    parser.add_argument("--baseline", help="用于对比的历史结果 JSON 文件")
+    parser.add_argument("--headed", action="store_true", help="显示浏览器窗口")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = run_benchmarks(sizes, max(1, args.repeat), headless=not args.headed)
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
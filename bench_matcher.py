@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+关键词匹配器的纯 Python 基准测试（不需要浏览器）
+
+按固定种子生成中英文混合的卡片标题与 10～100k 条规则，分别测量子串（substring）、
+精确（exact）、正则（regex）与布尔表达式（boolean）四种模式下：
+- 逐条解释执行（_expr_matches，内部调用 _normalize_text / _pattern_matches）的吞吐；
+- 编译后的规则集（CompiledRuleSet）的编译耗时与吞吐；
+- _normalize_text、_pattern_matches 单次调用的吞吐。
+每个测量点最多运行 --budget 秒，结果写入 JSON 与 CSV，可用 --baseline 与其他提交的结果对比。
+"""
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import subprocess
+from typing import Optional, List, Tuple, Dict, Any, Callable
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from xhs_rules import compile_rules, _normalize_text, _pattern_matches, _expr_matches
+
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+DEFAULT_MODES = ["substring", "exact", "regex", "boolean"]
+DEFAULT_CARDS = 2000
+DEFAULT_BUDGET_SEC = 2.0
+DEFAULT_OUTPUT = "bench_matcher.json"
+DEFAULT_CSV = "bench_matcher.csv"
+# 词表大小需不少于最大规则数
+VOCAB_SIZE = 200000
+
+CJK_CHARS = (
+    "周末露营猫咪美食探店旅行穿搭护肤健身读书咖啡早餐攻略日常租房装修数码相机徒步海边"
+    "教程分享合集平价好物记录学习城市公园夜景烘焙甜品火锅烧烤奶茶面包蛋糕手工绘画摄影"
+    "音乐电影追剧宠物狗狗花园植物阳台收纳清洁减脂瑜伽跑步骑行滑雪露台山野湖泊草原古镇"
+)
+ENGLISH_WORDS = [
+    "vlog", "ootd", "citywalk", "coffee", "camping", "travel", "diy", "makeup", "fitness", "daily",
+    "brunch", "outfit", "review", "unboxing", "tips", "guide", "haul", "routine", "plog", "weekend",
+]
+MODE_OPTIONS = {
+    "substring": {"use_regex": False, "exact": False, "case_sensitive": False},
+    "exact": {"use_regex": False, "exact": True, "case_sensitive": False},
+    "regex": {"use_regex": True, "exact": False, "case_sensitive": False},
+    "boolean": {"use_regex": False, "exact": False, "case_sensitive": False},
+}
+
+
+def build_vocab(size: int, seed: int = 0) -> List[str]:
+    """生成互不相同的中英文词（同一 seed 结果固定）"""
+    rng = random.Random(seed)
+    words: List[str] = []
+    seen = set()
+    while len(words) < size:
+        if rng.random() < 0.7:
+            word = "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 4)))
+        else:
+            word = rng.choice(ENGLISH_WORDS) + "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def _pick_word(rng: random.Random, vocab: List[str]) -> str:
+    # 词的序号按对数均匀分布：规则取词表前 N 个词，各个规模的规则集都有一定命中率
+    limit = int(10 ** rng.uniform(1, math.log10(len(vocab))))
+    return vocab[rng.randrange(limit)]
+
+
+def build_cards(vocab: List[str], count: int, seed: int = 0) -> List[Dict[str, str]]:
+    """生成卡片字段值；约 10% 的标题只有一个词，供精确匹配命中"""
+    rng = random.Random(seed * 7919 + count)
+    cards = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            title = _pick_word(rng, vocab)
+        else:
+            parts = [_pick_word(rng, vocab) for _ in range(rng.randint(3, 7))]
+            # 中文词直接相连，英文词前后加空格，偶尔混入大写与多余空白
+            title = "".join(p if p[0] in CJK_CHARS else f" {p.upper() if rng.random() < 0.2 else p}  " for p in parts)
+        link = "/explore/%024x?xsec_token=AB%016x&xsec_source=pc_feed" % (rng.getrandbits(96), rng.getrandbits(64))
+        cards.append({"title": title, "link": link})
+    return cards
+
+
+def build_rules(vocab: List[str], size: int, mode: str, seed: int = 0) -> List[Tuple[set, str]]:
+    """生成 size 条规则：前 size 个词各自组成一条（布尔/正则模式组合其他词）"""
+    rng = random.Random(seed * 104729 + size)
+    words = vocab[:size]
+    rules = []
+    for i, word in enumerate(words):
+        if mode == "regex":
+            other = rng.choice(vocab)
+            kind = i % 3
+            if kind == 0:
+                expr = word
+            elif kind == 1:
+                expr = f"{word}|{other}"
+            else:
+                expr = f"{word}.{{0,6}}{other[:2]}"
+        elif mode == "boolean":
+            a, b = rng.choice(vocab), rng.choice(vocab)
+            kind = i % 4
+            if kind == 0:
+                expr = f"{word} && !{a}"
+            elif kind == 1:
+                expr = f"({word} || {a}) && !{b}"
+            elif kind == 2:
+                expr = f"title:{word} || link:/explore/{rng.getrandbits(8):02x}"
+            else:
+                expr = f'"{word}" && ({a} || !{b})'
+        else:
+            expr = word
+        rules.append(({"title"}, expr))
+    return rules
+
+
+def _measure(fn: Callable[[Any], Any], items: List[Any], budget_sec: float) -> Dict[str, Any]:
+    # 依次处理 items（不够时循环），直到用完预算；至少处理一项
+    processed = 0
+    hits = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    n = len(items)
+    while True:
+        if fn(items[processed % n]):
+            hits += 1
+        processed += 1
+        if processed % 16 == 0 or processed >= n:
+            elapsed = time.perf_counter() - started
+            if elapsed >= budget_sec:
+                break
+    return {
+        "items": processed,
+        "seconds": round(elapsed, 4),
+        "per_second": round(processed / elapsed, 1) if elapsed else None,
+        "hit_rate": round(hits / processed, 4),
+    }
+
+
+def _interpreted_match(rules: List[Tuple[set, str]], opts: Dict[str, bool]) -> Callable[[Dict[str, str]], bool]:
+    # 逐条规则解释执行（编译前的匹配方式），返回是否有规则命中
+    def match(card: Dict[str, str]) -> bool:
+        for fields, expr in rules:
+            for field in ("title", "link"):
+                if field in fields and _expr_matches(card.get(field, ""), expr, field_values=card, **opts):
+                    return True
+        return False
+    return match
+
+
+def bench_primitives(cards: List[Dict[str, str]], vocab: List[str], budget_sec: float) -> Dict[str, Any]:
+    titles = [c["title"] for c in cards]
+    pairs = [(t, vocab[i % 1000]) for i, t in enumerate(titles)]
+    results: Dict[str, Any] = {
+        "normalize_text": _measure(lambda t: _normalize_text(t, False), titles, budget_sec),
+    }
+    for mode in DEFAULT_MODES:
+        if mode == "boolean":
+            continue
+        opts = MODE_OPTIONS[mode]
+        results[f"pattern_matches_{mode}"] = _measure(lambda p: _pattern_matches(p[0], p[1], **opts), pairs, budget_sec)
+    return results
+
+
+def bench_mode(mode: str, size: int, vocab: List[str], cards: List[Dict[str, str]], budget_sec: float, seed: int) -> Dict[str, Any]:
+    opts = MODE_OPTIONS[mode]
+    rules = build_rules(vocab, size, mode, seed)
+    started = time.perf_counter()
+    ruleset = compile_rules(rules, **opts)
+    compile_seconds = time.perf_counter() - started
+    compiled = _measure(lambda c: ruleset.match(c) is not None, cards, budget_sec)
+    interpreted = _measure(_interpreted_match(rules, opts), cards, budget_sec)
+    return {
+        "rules": size,
+        "compile_seconds": round(compile_seconds, 4),
+        "compiled": compiled,
+        "interpreted": interpreted,
+        "speedup": round(compiled["per_second"] / interpreted["per_second"], 1)
+        if compiled["per_second"] and interpreted["per_second"] else None,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes: List[int], modes: List[str], n_cards: int, budget_sec: float, seed: int = 0) -> Dict[str, Any]:
+    vocab = build_vocab(max(VOCAB_SIZE, max(sizes)), seed)
+    cards = build_cards(vocab, n_cards, seed)
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "cards": n_cards,
+        "budget_seconds": budget_sec,
+        "primitives": {},
+        "modes": {},
+    }
+    print("基础函数 …")
+    results["primitives"] = bench_primitives(cards, vocab, budget_sec)
+    for mode in modes:
+        results["modes"][mode] = {}
+        for size in sizes:
+            print(f"{mode} 模式，{size} 条规则 …")
+            results["modes"][mode][str(size)] = bench_mode(mode, size, vocab, cards, budget_sec, seed)
+    return results
+
+
+def write_csv(results: Dict[str, Any], path: str):
+    """每个 (模式, 规则数, 实现) 一行，便于画出规模曲线"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["mode", "rules", "engine", "compile_seconds", "cards", "seconds", "cards_per_second", "hit_rate"])
+        for mode, by_size in results["modes"].items():
+            for size, r in by_size.items():
+                for engine in ("compiled", "interpreted"):
+                    m = r[engine]
+                    writer.writerow([
+                        mode, size, engine,
+                        r["compile_seconds"] if engine == "compiled" else "",
+                        m["items"], m["seconds"], m["per_second"], m["hit_rate"],
+                    ])
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"=== 匹配器基准结果（commit {results.get('commit') or '未知'}，{results['cards']} 张卡片）===")
+    for name, r in results["primitives"].items():
+        print(f"{name}: {r['per_second']:.0f} 次/s")
+    base_modes = (baseline or {}).get("modes", {})
+    for mode, by_size in results["modes"].items():
+        for size, r in by_size.items():
+            line = (
+                f"{mode:>9} {size:>6} 条规则: 编译 {r['compile_seconds']:.3f}s, "
+                f"编译后 {r['compiled']['per_second']:.0f} 卡/s, "
+                f"逐条解释 {r['interpreted']['per_second']:.0f} 卡/s"
+            )
+            base = base_modes.get(mode, {}).get(size)
+            if base and base["compiled"].get("per_second"):
+                ratio = r["compiled"]["per_second"] / base["compiled"]["per_second"]
+                line += f"（编译后吞吐为基线的 {ratio:.2f} 倍，基线 commit {baseline.get('commit')}）"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="评估关键词匹配器在不同规则规模下的吞吐")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="规则数量，逗号分隔")
+    parser.add_argument("--modes", default=",".join(DEFAULT_MODES), help=f"匹配模式，逗号分隔，可选：{', '.join(DEFAULT_MODES)}")
+    parser.add_argument("--cards", type=int, default=DEFAULT_CARDS, help="生成的卡片数量")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SEC, help="每个测量点的时间预算（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果 JSON 文件路径")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="规模曲线 CSV 文件路径")
+    parser.add_argument("--baseline", help="用于对比的历史结果 JSON 文件")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODE_OPTIONS]
+    if unknown:
+        parser.error(f"未知的匹配模式: {', '.join(unknown)}")
+    results = run_benchmarks(sizes, modes, max(1, args.cards), args.budget, args.seed)
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    write_csv(results, args.csv)
+    print(f"结果已写入 {args.output} 与 {args.csv}")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+测试命中卡片候选队列
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from xhs_rules import compile_rules
+from xhs_notes import NoteKey
+from xhs_find_and_open import CandidateQueue
+
+
+NOTE_A = "66f0a1b2c3d4e5f6a7b8c9d0"
+NOTE_B = "66f0ffffffffffffffffffff"
+NOTE_C = "66f0aaaaaaaaaaaaaaaaaaaa"
+
+
+def test_candidate_queue():
+    """测试候选按规则顺序出队、同一笔记只入队一次、跳过已访问笔记"""
+    print("=== 测试候选队列 ===")
+    ruleset = compile_rules([({"title"}, "露营"), ({"title"}, "猫咪")])
+    queue = CandidateQueue(ruleset)
+    assert queue.push(None, f"/explore/{NOTE_A}", "猫咪", "title")
+    assert queue.push(None, f"/explore/{NOTE_B}", "露营", "title")
+    assert queue.push(None, f"/explore/{NOTE_C}", "猫咪", "title")
+    # 同一笔记的其他链接形式不重复入队
+    assert not queue.push(None, f"/explore/{NOTE_A}?xsec_token=AB12", "露营", "title")
+    assert len(queue) == 3
+
+    assert queue.pop()[1:] == (f"/explore/{NOTE_B}", "露营", "title")
+    # 同一规则按发现顺序，已访问的笔记被跳过
+    assert queue.pop({NoteKey(NOTE_A)})[1] == f"/explore/{NOTE_C}"
+    assert queue.pop() is None and not queue
+
+    queue.push(None, f"/explore/{NOTE_A}", "猫咪", "title")
+    queue.clear()
+    assert len(queue) == 0 and queue.push(None, f"/explore/{NOTE_A}", "猫咪", "title")
+    print("候选队列正常")
+
+
+if __name__ == "__main__":
+    test_candidate_queue()
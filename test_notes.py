@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+测试笔记 ID 解析、详情/推荐流数据解析与已处理笔记索引
+"""
+import os
+import sys
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from xhs_notes import (
+    NoteKey,
+    NoteDetail,
+    SeenNoteIndex,
+    parse_count,
+    parse_note_state,
+    note_detail_from_state,
+    merge_note_details,
+    parse_feed_response,
+    note_id_from_url,
+    STATUS_VISITED,
+    STATUS_UNVIEWABLE,
+)
+import xhs_page
+
+
+NOTE_A = "66f0a1b2c3d4e5f6a7b8c9d0"
+NOTE_B = "66f0ffffffffffffffffffff"
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class _Clock:
+    def __init__(self, now: float = 1700000000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_note_id_from_url():
+    """测试从 href/详情 URL 解析笔记 ID"""
+    print("=== 测试笔记 ID 解析 ===")
+    assert note_id_from_url(f"/explore/{NOTE_A}?xsec_token=AB12&xsec_source=pc_feed") == NOTE_A
+    assert note_id_from_url(f"https://www.xiaohongshu.com/explore/{NOTE_A.upper()}") == NOTE_A
+    assert note_id_from_url("/explore") is None
+    assert note_id_from_url("/user/profile/5a1b") is None
+    assert note_id_from_url(None) is None
+    print("笔记 ID 解析正常")
+
+
+def test_note_key_variants():
+    """测试同一笔记的不同链接形式得到相同的 NoteKey"""
+    print("=== 测试 NoteKey ===")
+    variants = [
+        f"/explore/{NOTE_A}?xsec_token=AB12&xsec_source=pc_feed",
+        f"https://www.xiaohongshu.com/explore/{NOTE_A}",
+        f"https://www.xiaohongshu.com/discovery/item/{NOTE_A.upper()}?source=webshare",
+        f"/search_result/{NOTE_A}?xsec_token=CD34",
+        f"/user/profile/5a1b2c3d4e5f60718293a4b5/{NOTE_A}?xsec_token=EF56",
+    ]
+    keys = {NoteKey.from_url(u) for u in variants}
+    assert keys == {NoteKey(NOTE_A)}, keys
+    assert NoteKey.from_url(f"/explore/{NOTE_A}0") is None
+    assert NoteKey.from_url("/user/profile/5a1b2c3d4e5f60718293a4b5") is None
+    assert NoteKey.coerce("/explore?channel=homefeed") == "/explore?channel=homefeed"
+    assert NoteKey.coerce(variants[0]) in {NoteKey.coerce(variants[2])}
+    print("NoteKey 解析正常")
+
+
+def test_parse_count():
+    """测试计数文本解析"""
+    print("=== 测试计数解析 ===")
+    cases = {
+        "1.2万": 12000,
+        "3,456": 3456,
+        "10w+": 100000,
+        "1.5k": 1500,
+        "89": 89,
+        "2亿": 200000000,
+        "赞": None,
+        "": None,
+        None: None,
+    }
+    for text, expected in cases.items():
+        assert parse_count(text) == expected, (text, parse_count(text))
+    detail = NoteDetail("https://www.xiaohongshu.com/explore/" + NOTE_A, "标题", "作者", "正文", "1.2万", "89", "收藏", "dom")
+    assert (detail.likes, detail.comments, detail.collects) == (12000, 89, None)
+    assert detail.to_dict()["likes"] == 12000
+    print("计数解析正常")
+
+
+def test_note_state_fixture():
+    """测试从保存的详情页 HTML 中解析内嵌状态"""
+    print("=== 测试内嵌状态解析 ===")
+    url = f"https://www.xiaohongshu.com/explore/{NOTE_A}?xsec_token=AB12"
+    state = parse_note_state(_read_fixture("note_detail.html"))
+    assert state is not None and state["user"]["userInfo"] is None
+    detail = note_detail_from_state(state, url)
+    assert detail is not None and detail.source == "state"
+    assert detail.title == "周末去海边露营，带上猫咪一起出发"
+    assert detail.author == "露营的阿青"
+    assert detail.content.startswith("第一次带猫咪露营")
+    assert (detail.likes, detail.collects, detail.comments) == (12000, 3456, 89)
+    # 状态中没有 URL 对应的笔记（例如同页打开的弹层）时交给 DOM 提取
+    assert note_detail_from_state(state, f"https://www.xiaohongshu.com/explore/{NOTE_B}") is None
+    # 错误页的状态里没有笔记内容
+    assert note_detail_from_state(parse_note_state(_read_fixture("note_error.html")), url) is None
+    assert parse_note_state("<html><body>无状态</body></html>") is None
+    print("内嵌状态解析正常")
+
+
+def test_merge_note_details():
+    """测试状态数据缺失的字段由 DOM 数据补齐"""
+    print("=== 测试详情合并 ===")
+    state = NoteDetail("u", "状态标题", None, "状态正文", "10", None, None, "state")
+    dom = NoteDetail("u", "页面标题", "页面作者", None, "12", "3", None, "dom")
+    merged = merge_note_details(state, dom)
+    assert (merged.title, merged.author, merged.content) == ("状态标题", "页面作者", "状态正文")
+    assert (merged.likes, merged.comments, merged.collects) == (10, 3, None)
+    assert merged.source == "state+dom"
+    assert merge_note_details(None, dom) is dom
+    print("详情合并正常")
+
+
+def test_parse_feed_response():
+    """测试解析录制的推荐流接口响应"""
+    print("=== 测试推荐流接口解析 ===")
+    notes = parse_feed_response(json.loads(_read_fixture("homefeed.json")))
+    # 热搜词条目被跳过
+    assert len(notes) == 5
+    first = notes[0]
+    assert first.key == NoteKey(NOTE_A)
+    assert (first.title, first.author, first.like_text) == ("周末去海边露营，带上猫咪一起出发", "露营的阿青", "1.2万")
+    assert NoteKey.from_url(first.href) == first.key and "xsec_source=pc_feed" in first.href
+    values = first.field_values()
+    assert "露营的阿青" in values["title"] and values["link"] == first.href
+    assert notes[3].field_values()["title"] == "橘子日常"
+    assert parse_feed_response({"code": -1, "data": None}) == []
+    assert parse_feed_response(None) == []
+    print("推荐流接口解析正常")
+
+
+def test_seen_index_roundtrip():
+    """测试索引的追加写入、懒加载与 TTL 过期"""
+    print("=== 测试已处理笔记索引 ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "seen.tsv")
+        clock = _Clock()
+        index = SeenNoteIndex(path, unviewable_ttl_sec=3600, clock=clock)
+        assert NOTE_A not in index
+        assert index.add_url(f"/explore/{NOTE_A}?xsec_token=x", STATUS_VISITED)
+        assert index.add(NOTE_B, STATUS_UNVIEWABLE)
+        assert not index.add_url("/explore", STATUS_VISITED)
+
+        # 新实例从文件恢复
+        reloaded = SeenNoteIndex(path, unviewable_ttl_sec=3600, clock=clock)
+        assert reloaded.status(NOTE_A) == STATUS_VISITED
+        assert reloaded.contains_url(f"https://www.xiaohongshu.com/explore/{NOTE_B}")
+        assert len(reloaded) == 2
+
+        # 不可浏览判定过期，已访问记录保留
+        clock.now += 3600
+        assert NOTE_B not in reloaded
+        assert NOTE_A in reloaded
+        print("索引读写与过期正常")
+
+
+def test_seen_index_compact():
+    """测试压缩只保留每个笔记的最新有效记录"""
+    print("=== 测试索引压缩 ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "seen.tsv")
+        clock = _Clock()
+        index = SeenNoteIndex(path, unviewable_ttl_sec=60, clock=clock)
+        for _ in range(5):
+            index.add(NOTE_A, STATUS_UNVIEWABLE)
+        index.add(NOTE_A, STATUS_VISITED)
+        index.add(NOTE_B, STATUS_UNVIEWABLE)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("损坏的行\n")
+        clock.now += 120
+        index.compact()
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert lines == [f"{NOTE_A}\t{STATUS_VISITED}\t{int(clock.now - 120)}"], lines
+        assert SeenNoteIndex(path, clock=clock).status(NOTE_A) == STATUS_VISITED
+        print("索引压缩正常")
+
+
+def test_unviewable_persistence():
+    """测试只凭错误元素判定的不可浏览不写入索引，其他依据照常写入"""
+    print("=== 测试不可浏览判定的持久化 ===")
+    verdict = xhs_page._finish_verdict({"errorElement": "[class*='error']", "content": None, "mainText": False})
+    assert verdict["unviewable"] and verdict["reason"] == xhs_page.UNVIEWABLE_ERROR_ELEMENT
+    with tempfile.TemporaryDirectory() as tmp:
+        index = xhs_page._open_seen_index(os.path.join(tmp, "seen.tsv"), 3600)
+        xhs_page._remember_unviewable(index, verdict["reason"], f"/explore/{NOTE_A}")
+        xhs_page._remember_unviewable(index, xhs_page.UNVIEWABLE_KEYWORD, f"/explore/{NOTE_B}")
+        assert NOTE_A not in index and index.status(NOTE_B) == STATUS_UNVIEWABLE
+        assert xhs_page._open_seen_index(None, 3600) is None
+    print("不可浏览判定的持久化正常")
+
+
+if __name__ == "__main__":
+    test_note_id_from_url()
+    test_note_key_variants()
+    test_parse_count()
+    test_note_state_fixture()
+    test_merge_note_details()
+    test_parse_feed_response()
+    test_seen_index_roundtrip()
+    test_seen_index_compact()
+    test_unviewable_persistence()
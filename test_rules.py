@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+测试关键词规则编译与匹配
+"""
+import os
+import sys
+import random
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from xhs_rules import (
+    AhoCorasick,
+    CardDumpWriter,
+    RuleSetReloader,
+    RuleSyntaxError,
+    compile_rules,
+    parse_rule_expr,
+    read_keywords_from_file,
+    replay_card_dump,
+    main as rules_main,
+    _expr_matches,
+)
+
+
+def _interpret(rules, field_values, **opts):
+    # 逐条解释执行，作为编译结果的对照
+    for fields, expr in rules:
+        if "title" in fields and _expr_matches(field_values.get("title", ""), expr, field_values=field_values, **opts):
+            return expr, "title"
+        if "link" in fields and _expr_matches(field_values.get("link", ""), expr, field_values=field_values, **opts):
+            return expr, "link"
+    return None
+
+
+def _random_expr(rng, words, depth=0):
+    # 随机生成带括号、! 与字段前缀的表达式
+    if depth >= 3 or rng.random() < 0.35:
+        term = rng.choice(words)
+        if rng.random() < 0.2:
+            term = rng.choice(["title:", "link:", "any:"]) + term
+        return ("!" if rng.random() < 0.2 else "") + term
+    op = rng.choice([" && ", " || "])
+    parts = [_random_expr(rng, words, depth + 1) for _ in range(rng.randint(2, 3))]
+    expr = op.join(parts)
+    return ("!" if rng.random() < 0.2 else "") + "(" + expr + ")" if depth else expr
+
+
+def test_aho_corasick():
+    """测试多模式子串自动机"""
+    print("=== 测试 Aho-Corasick ===")
+    ac = AhoCorasick(["he", "she", "his", "hers", "猫咪", "咪"])
+    assert ac.find_all("ushers") == {0, 1, 3}
+    assert ac.find_all("小猫咪") == {4, 5}
+    assert ac.find_all("dog") == set()
+    print("自动机匹配正常")
+
+
+def test_compiled_matches_interpreter():
+    """测试编译后的规则集与逐条解释结果一致"""
+    print("=== 测试规则编译一致性 ===")
+    rng = random.Random(7)
+    words = ["旅行", "美食", "猫咪", "Travel", "food", "科技", "数码", "explore", "abc", "日常"]
+    field_sets = [{"title"}, {"link"}, {"title", "link"}]
+    rules = []
+    for _ in range(60):
+        n = rng.randint(1, 3)
+        parts = rng.sample(words, n)
+        op = rng.choice([" && ", " || "])
+        rules.append((rng.choice(field_sets), op.join(parts)))
+    rules.append(({"title"}, "(旅|美)食"))
+    rules.append(({"title"}, "[invalid"))
+    cards = []
+    for _ in range(300):
+        title = " ".join(rng.sample(words, rng.randint(0, 4)))
+        if rng.random() < 0.3:
+            title = title.upper()
+        link = "/explore/" + rng.choice(words + ["xyz"])
+        cards.append({"title": title, "link": link})
+    for opts in (
+        {"use_regex": False, "exact": False, "case_sensitive": False},
+        {"use_regex": False, "exact": True, "case_sensitive": False},
+        {"use_regex": False, "exact": False, "case_sensitive": True},
+        {"use_regex": True, "exact": False, "case_sensitive": False},
+    ):
+        ruleset = compile_rules(rules, **opts)
+        for card in cards:
+            assert ruleset.match(card) == _interpret(rules, card, **opts), (opts, card)
+        print(f"模式 {opts} 一致")
+
+
+def test_boolean_grammar():
+    """测试括号/非/混合与或/字段前缀：编译结果与解释执行一致"""
+    print("=== 测试布尔表达式 ===")
+    assert parse_rule_expr("a || b && c") == ("or", (("term", "a", None), ("and", (("term", "b", None), ("term", "c", None)))))
+    # 右括号后还有文字时整体是一个关键词（兼容正则分组）
+    assert parse_rule_expr("(旅|美)食") == ("term", "(旅|美)食", None)
+    assert parse_rule_expr('"a && b"') == ("term", "a && b", None)
+
+    ruleset = compile_rules([({"title"}, "(猫 || 狗) && !广告"), ({"title"}, "title:露营 && link:/explore/")])
+    assert ruleset.match({"title": "猫咪日常", "link": "/explore/1"}) == ("(猫 || 狗) && !广告", "title")
+    assert ruleset.match({"title": "猫粮广告", "link": "/explore/1"}) is None
+    assert ruleset.match({"title": "周末露营", "link": "/explore/1"}) == ("title:露营 && link:/explore/", "title")
+    assert ruleset.match({"title": "周末露营", "link": "/user/1"}) is None
+
+    rng = random.Random(11)
+    words = ["旅行", "美食", "猫咪", "food", "科技", "explore", "abc", "日常"]
+    field_sets = [{"title"}, {"link"}, {"title", "link"}]
+    rules = [(rng.choice(field_sets), _random_expr(rng, words)) for _ in range(80)]
+    cards = []
+    for _ in range(300):
+        title = " ".join(rng.sample(words, rng.randint(0, 4)))
+        cards.append({"title": title, "link": "/explore/" + rng.choice(words + ["xyz"])})
+    for opts in (
+        {"use_regex": False, "exact": False, "case_sensitive": False},
+        {"use_regex": False, "exact": True, "case_sensitive": False},
+        {"use_regex": True, "exact": False, "case_sensitive": False},
+    ):
+        ruleset = compile_rules(rules, **opts)
+        for card in cards:
+            assert ruleset.match(card) == _interpret(rules, card, **opts), (opts, card)
+    print("布尔表达式正常")
+
+
+def test_rule_syntax_errors():
+    """测试语法错误带有文件行号"""
+    print("=== 测试规则语法错误 ===")
+    for bad in ("a &&", "(a || b", "a)", '"abc', "()", "!"):
+        try:
+            parse_rule_expr(bad)
+        except RuleSyntaxError:
+            continue
+        raise AssertionError(bad)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "keywords.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("# 注释\n猫咪, (露营 || 徒步) && !广告\ntitle:美食 && (甜品\n")
+        try:
+            read_keywords_from_file(path, {"title"})
+        except RuleSyntaxError as e:
+            assert (e.path, e.line) == (path, 3) and f"{path}:3:" in str(e), str(e)
+        else:
+            raise AssertionError("应当报告语法错误")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('猫咪, (露营 || 徒步) && !广告, "3,2,1"\n')
+        assert [expr for _, expr in read_keywords_from_file(path, {"title"})] == ["猫咪", "(露营 || 徒步) && !广告", '"3,2,1"']
+    print("语法错误报告正常")
+
+
+def test_file_field_prefixes():
+    """测试关键词文件与 --keyword 按同一语法解析字段前缀，整行字段需显式使用 @ 形式"""
+    print("=== 测试文件中的字段前缀 ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "keywords.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("link:/explore/ && 猫\n@title,link: 旅行, 科技\ntitle:(猫, 狗)\n")
+        rules = read_keywords_from_file(path, {"title"})
+        assert [(sorted(f), e) for f, e in rules] == [
+            (["title"], "link:/explore/ && 猫"), (["link", "title"], "旅行"), (["link", "title"], "科技"),
+            (["title"], "title:(猫, 狗)"),
+        ], rules
+        # 与命令行 --keyword 相同：前缀只作用于 /explore/，“猫”在默认字段（标题）上匹配
+        ruleset = compile_rules(rules[:1])
+        assert ruleset.match({"title": "猫咪日常", "link": "/explore/1"}) is not None
+        assert ruleset.match({"title": "狗狗日常", "link": "/explore/猫"}) is None
+        assert compile_rules(rules[1:]).match({"title": "", "link": "/explore/旅行"}) == ("旅行", "link")
+
+        # 行首单字段前缀后跟逗号分隔的多条规则：旧版作用于整行，新语法只作用于第一条，要求改写
+        for bad in ("title,link:猫\n", "@foo: 猫\n", "link:a, b\n", "any:猫, 狗\n"):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("猫咪\n" + bad)
+            try:
+                read_keywords_from_file(path, {"title"})
+            except RuleSyntaxError as e:
+                assert e.line == 2, str(e)
+            else:
+                raise AssertionError(bad)
+    print("文件字段前缀正常")
+
+
+def test_exclude_rules():
+    """测试排除规则与正向规则编译在一起：结果与先单独检查排除规则一致"""
+    print("=== 测试排除规则 ===")
+    ruleset = compile_rules([({"title"}, "猫咪")], exclude_rules=[({"title"}, "广告 || 推广"), ({"link"}, "/user/")])
+    assert ruleset.match({"title": "猫咪日常", "link": "/explore/1"}) == ("猫咪", "title")
+    assert ruleset.match({"title": "猫咪粮推广", "link": "/explore/1"}) is None
+    assert ruleset.match({"title": "猫咪日常", "link": "/user/1"}) is None
+    # 只有排除规则用到标题时同样需要提取标题
+    assert compile_rules([({"link"}, "/explore/")], exclude_rules=[({"title"}, "广告")]).needs_title
+
+    rng = random.Random(5)
+    words = ["旅行", "美食", "猫咪", "food", "科技", "explore", "abc", "日常"]
+    field_sets = [{"title"}, {"link"}, {"title", "link"}]
+    rules = [(rng.choice(field_sets), _random_expr(rng, words)) for _ in range(40)]
+    excludes = [(rng.choice(field_sets), _random_expr(rng, words)) for _ in range(10)]
+    combined = compile_rules(rules, exclude_rules=excludes)
+    positive, negative = compile_rules(rules), compile_rules(excludes)
+    for _ in range(300):
+        card = {"title": " ".join(rng.sample(words, rng.randint(0, 4))), "link": "/explore/" + rng.choice(words)}
+        expected = None if negative.match(card) is not None else positive.match(card)
+        assert combined.match(card) == expected, card
+    print("排除规则正常")
+
+
+def test_rule_order():
+    """测试命中结果按规则顺序且 title 优先于 link"""
+    print("=== 测试规则顺序 ===")
+    rules = [({"link"}, "explore"), ({"title", "link"}, "猫")]
+    ruleset = compile_rules(rules)
+    assert ruleset.match({"title": "猫", "link": "/explore/1"}) == ("explore", "link")
+    assert ruleset.match_rule({"title": "猫", "link": "/x"}) == (1, "猫", "title")
+    assert ruleset.match({"title": "狗", "link": "/x"}) is None
+    print("规则顺序正常")
+
+
+def test_needs_title():
+    """测试只含链接规则时不需要提取标题"""
+    print("=== 测试 needs_title ===")
+    assert not compile_rules([({"link"}, "/explore/ab"), ({"link"}, "a && b")]).needs_title
+    assert compile_rules([({"link"}, "/explore/ab"), ({"title"}, "猫")]).needs_title
+    assert compile_rules([({"title", "link"}, "猫")]).needs_title
+    print("needs_title 正常")
+
+
+def test_rule_reloader():
+    """测试关键词文件修改后重新编译，语法错误时保留原规则"""
+    print("=== 测试规则重新加载 ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "keywords.txt")
+        exclude_path = os.path.join(tmp, "exclude.txt")
+
+        def write(file_path, text, mtime):
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.utime(file_path, ns=(mtime, mtime))
+
+        write(path, "猫咪\n", 10**9)
+        write(exclude_path, "广告\n", 10**9)
+        reloader = RuleSetReloader(
+            path, {"title"}, extra_rules=[({"title"}, "露营")], exclude_file=exclude_path,
+        )
+        first = reloader.ruleset
+        assert [expr for _, expr in first.rules] == ["猫咪", "露营"]
+        # 文件未变化时不重新编译
+        assert reloader.poll() is None and reloader.ruleset is first
+
+        write(path, "猫咪\n徒步 && !攻略\n", 2 * 10**9)
+        second = reloader.poll()
+        assert second is not None and reloader.ruleset is second and reloader.reloads == 1
+        assert second.match({"title": "周末徒步", "link": ""}) == ("徒步 && !攻略", "title")
+        assert second.match({"title": "猫咪广告", "link": ""}) is None
+
+        # 语法错误：保留当前规则，修正后再加载
+        write(path, "猫咪 &&\n", 3 * 10**9)
+        assert reloader.poll() is None and reloader.ruleset is second
+        write(path, "猫咪\n", 4 * 10**9)
+        assert reloader.poll() is not None and reloader.reloads == 2
+
+        # 只改了修改时间、内容相同时沿用原规则集
+        current = reloader.ruleset
+        write(path, "猫咪\n", 5 * 10**9)
+        assert reloader.poll() is None and reloader.ruleset is current
+
+        write(exclude_path, "推广\n", 6 * 10**9)
+        assert reloader.poll().match({"title": "猫咪广告", "link": ""}) == ("猫咪", "title")
+
+        # 上万条规则的文件：重新加载时只解析新增的规则
+        write(path, "".join(f"规则{i} && !广告{i}\n" for i in range(6000)), 7 * 10**9)
+        reloader.poll()
+        misses = parse_rule_expr.cache_info().misses
+        write(path, "".join(f"规则{i} && !广告{i}\n" for i in range(6001)), 8 * 10**9)
+        assert len(reloader.poll()) == 6002
+        assert parse_rule_expr.cache_info().misses - misses == 1
+    print("规则重新加载正常")
+
+
+def test_card_dump_replay():
+    """测试卡片转储的写出与离线回放：按首条命中规则计数，同一笔记只计一次"""
+    print("=== 测试卡片转储回放 ===")
+    note_a = "66f0a1b2c3d4e5f6a7b8c9d0"
+    note_b = "66f0ffffffffffffffffffff"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dump", "cards.jsonl")
+        writer = CardDumpWriter(path)
+        writer.write({"title": "周末露营带猫咪", "link": f"/explore/{note_a}?xsec_token=AB"}, 0)
+        writer.write({"title": "猫咪日常推广", "link": f"/explore/{note_b}"}, 1)
+        # 同一笔记换了 token 再次出现
+        writer.write({"title": "周末露营带猫咪", "link": f"/explore/{note_a}?xsec_token=CD"}, 2)
+        writer.close()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("不是 JSON\n\n")
+        assert writer.count == 3
+
+        ruleset = compile_rules([({"title"}, "露营"), ({"title"}, "猫咪")], exclude_rules=[({"title"}, "推广")])
+        report = replay_card_dump(ruleset, [path])
+        assert (report["cards"], report["duplicates"], report["invalid"], report["matched"]) == (2, 1, 1, 1)
+        assert report["hits"] == [("露营", 1), ("猫咪", 0)]
+        assert replay_card_dump(ruleset, [path], dedupe=False)["hits"] == [("露营", 2), ("猫咪", 0)]
+
+        assert rules_main(["match", "--keyword", "猫咪", "--json", path]) == 0
+        assert rules_main(["match", "--keyword", "猫咪 &&", path]) == 1
+    print("卡片转储回放正常")
+
+
+if __name__ == "__main__":
+    test_aho_corasick()
+    test_compiled_matches_interpreter()
+    test_boolean_grammar()
+    test_rule_syntax_errors()
+    test_file_field_prefixes()
+    test_exclude_rules()
+    test_rule_order()
+    test_needs_title()
+    test_rule_reloader()
+    test_card_dump_replay()
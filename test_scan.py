@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+测试推荐流扫描（用只实现扫描所需接口的页面对象代替浏览器页面）
+"""
+import os
+import sys
+import json
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import xhs_find_and_open as xhs
+import xhs_async
+import xhs_page
+from xhs_rules import CardDumpWriter, compile_rules
+from xhs_notes import NoteKey, SeenNoteIndex, STATUS_VISITED
+
+
+NOTE_A = "66f0a1b2c3d4e5f6a7b8c9d0"
+NOTE_B = "66f0ffffffffffffffffffff"
+NOTE_C = "66f0aaaaaaaaaaaaaaaaaaaa"
+
+
+class _Locator:
+    def __init__(self, page, selector):
+        self.page = page
+        self.selector = selector
+
+    @property
+    def first(self):
+        return self
+
+    def evaluate_all(self, js, arg):
+        if js is xhs_page._CARD_LINKS_JS:
+            self.page.scan_tokens.append(arg)
+            return list(self.page.links)
+        if js is xhs_page._CARD_TITLES_JS:
+            self.page.title_requests.append(list(arg))
+            return {link: self.page.titles[link] for link in arg}
+        raise AssertionError("未预期的脚本")
+
+
+class _Mouse:
+    def wheel(self, dx, dy):
+        pass
+
+
+class _FeedPage:
+    url = "https://www.xiaohongshu.com/explore"
+
+    def __init__(self, titles):
+        self.titles = dict(titles)
+        self.links = list(titles)
+        self.title_requests = []
+        self.scan_tokens = []
+        self.mouse = _Mouse()
+
+    def locator(self, selector):
+        return _Locator(self, selector)
+
+    def wait_for_function(self, *args, **kwargs):
+        return None
+
+    def wait_for_timeout(self, ms):
+        pass
+
+
+class _AsyncLocator(_Locator):
+    async def evaluate_all(self, js, arg):
+        return _Locator.evaluate_all(self, js, arg)
+
+
+class _AsyncMouse:
+    async def wheel(self, dx, dy):
+        pass
+
+
+class _AsyncFeedPage(_FeedPage):
+    """与 playwright.async_api 相同：locator() 同步返回，页面调用返回协程"""
+
+    def __init__(self, titles):
+        super().__init__(titles)
+        self.mouse = _AsyncMouse()
+
+    def locator(self, selector):
+        return _AsyncLocator(self, selector)
+
+    async def wait_for_function(self, *args, **kwargs):
+        return None
+
+    async def wait_for_timeout(self, ms):
+        pass
+
+
+def test_card_dump_link_only_rules():
+    """测试只含链接规则时转储仍带标题，已处理/已排除的卡片也写出并注明原因"""
+    print("=== 测试卡片转储（链接规则）===")
+    page = _FeedPage({
+        f"/explore/{NOTE_A}?xsec_token=AB": "周末露营",
+        f"/explore/{NOTE_B}?xsec_token=CD": "猫咪日常",
+        f"/explore/{NOTE_C}?xsec_token=EF": "美食探店",
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        seen_index = SeenNoteIndex(os.path.join(tmp, "seen.tsv"))
+        seen_index.add(NOTE_A, STATUS_VISITED)
+        dump_path = os.path.join(tmp, "cards.jsonl")
+        card_dump = CardDumpWriter(dump_path)
+        try:
+            hit = xhs.find_card_link_by_keywords(
+                page,
+                compile_rules([({"link"}, NOTE_C)]),
+                exclude_urls={NoteKey(NOTE_B)},
+                max_scroll_steps=1,
+                scroll_pause_ms=0,
+                seen_index=seen_index,
+                card_dump=card_dump,
+            )
+        finally:
+            card_dump.close()
+        assert hit is not None and hit[1:] == (NOTE_C, "link") and NOTE_C in hit[0].selector
+        with open(dump_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+    assert [(r["title"], r.get("skipped")) for r in records] == [
+        ("周末露营", "seen"), ("猫咪日常", "excluded"), ("美食探店", None)
+    ], records
+    assert page.title_requests == [page.links]
+    print("卡片转储正常")
+
+
+def test_link_only_scan_skips_titles():
+    """测试不转储时只含链接规则的扫描不提取标题，已处理的卡片不参与匹配"""
+    print("=== 测试链接规则扫描 ===")
+    page = _FeedPage({f"/explore/{NOTE_A}": "周末露营", f"/explore/{NOTE_C}": "美食探店"})
+    with tempfile.TemporaryDirectory() as tmp:
+        seen_index = SeenNoteIndex(os.path.join(tmp, "seen.tsv"))
+        seen_index.add(NOTE_C, STATUS_VISITED)
+        hit = xhs.find_card_link_by_keywords(
+            page, compile_rules([({"link"}, "/explore/")]), max_scroll_steps=1, scroll_pause_ms=0, seen_index=seen_index,
+        )
+    assert hit is not None and hit[1] == "/explore/"
+    assert page.title_requests == []
+    print("链接规则扫描正常")
+
+
+def test_full_scan_keyword():
+    """测试 incremental=False（--full-scan）时不带增量标记扫描，默认每次查找使用新标记"""
+    print("=== 测试全量扫描参数 ===")
+    page = _FeedPage({f"/explore/{NOTE_A}": "周末露营"})
+    rules = compile_rules([({"title"}, "露营")])
+    assert xhs.find_card_link_by_keywords(page, rules, max_scroll_steps=1, scroll_pause_ms=0, debug=True) is not None
+    assert xhs.find_card_link_by_keywords(page, rules, max_scroll_steps=1, scroll_pause_ms=0, incremental=False) is not None
+    assert page.scan_tokens[0] and page.scan_tokens[1] is None, page.scan_tokens
+    print("全量扫描参数正常")
+
+
+def test_async_engine_shares_scan():
+    """测试异步引擎走同一套扫描：产出与同步引擎相同，候选队列按规则顺序取出"""
+    print("=== 测试异步引擎扫描 ===")
+    titles = {
+        f"/explore/{NOTE_A}": "周末露营",
+        f"/explore/{NOTE_B}": "猫咪日常",
+        f"/explore/{NOTE_C}": "美食探店",
+    }
+    ruleset = compile_rules([({"title"}, "猫咪"), ({"title"}, "露营")])
+    sync_hits = [
+        (card["note_id"], expr)
+        for card, expr, _ in xhs.iter_matching_cards(_FeedPage(titles), ruleset, max_scroll_steps=2, scroll_pause_ms=0)
+    ]
+
+    async def scan():
+        cards = xhs_async.iter_matching_cards(_AsyncFeedPage(titles), ruleset, max_scroll_steps=2, scroll_pause_ms=0)
+        hits = [(card["note_id"], expr) async for card, expr, _ in cards]
+        feed = xhs_async.CandidateFeed(ruleset)
+        cards = xhs_async.iter_matching_cards(_AsyncFeedPage(titles), ruleset, max_scroll_steps=2, scroll_pause_ms=0)
+        await xhs_async._produce_candidates(feed, cards)
+        order = []
+        while True:
+            item = await feed.get()
+            if item is None:
+                break
+            order.append(item[2])
+        return hits, order
+
+    hits, order = asyncio.run(scan())
+    assert hits == sync_hits == [(NOTE_A, "露营"), (NOTE_B, "猫咪")], (hits, sync_hits)
+    assert order == ["猫咪", "露营"], order
+    print("异步引擎扫描正常")
+
+
+if __name__ == "__main__":
+    test_card_dump_link_only_rules()
+    test_link_only_scan_skips_titles()
+    test_full_scan_keyword()
+    test_async_engine_shares_scan()
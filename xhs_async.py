@@ -0,0 +1,522 @@
+"""
+基于 playwright.async_api 的异步引擎（--async）
+
+流程与同步版相同：加载首页 → 滚动扫描推荐流 → 打开命中笔记 → 判定是否可浏览并提取详情。
+区别在于彼此独立的页面操作可以并发：
+- 首页在详情页加载期间继续滚动扫描，命中卡片先进入队列；
+- 不可浏览判定与详情提取同时执行，判定为不可浏览时直接取消提取。
+
+选择器、浏览器端 JS、判定与详情解析、点赞方式表与同步引擎共用（xhs_page），扫描、候选队列与详情标签页池
+的流程同样共用（xhs_scan，本模块只提供异步驱动）；规则、NoteKey 与已处理笔记索引同样共用。
+本模块不导入同步引擎，匹配配置与各开关由参数传入。
+首页在扫描的同时不能被点击，所以详情一律通过已知链接在独立的详情标签页中打开（相当于 --open-mode direct）。
+"""
+import asyncio
+import time
+from typing import Optional, List, Tuple, Set, Dict, Any
+
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+
+from xhs_rules import CardDumpWriter, CompiledRuleSet, RuleSetReloader, compile_rules
+from xhs_network import FeedCapture
+from xhs_notes import (
+    NoteKey,
+    NoteDetail,
+    SeenNoteIndex,
+    STATUS_VISITED,
+    DEFAULT_UNVIEWABLE_TTL_SEC,
+)
+from xhs_page import (
+    HOMEPAGE_URL,
+    AUTH_STATE_PATH,
+    browser_launch_options,
+    browser_context_options,
+    LOGIN_DOM_SELECTORS,
+    DETAIL_TAB_HEADERS,
+    DETAIL_READY_SELECTOR,
+    DETAIL_FIELD_SELECTORS,
+    LIKE_BUTTON_SELECTORS,
+    LIKE_CLICK_METHODS,
+    LIKE_PRE_CLICK_WAIT_MS,
+    LIKE_SETTLE_MS,
+    UNVIEWABLE_URL,
+    print_note_detail,
+    _DETAIL_READY_JS,
+    _NOTE_VERDICT_JS,
+    _NOTE_VERDICT_ARG,
+    _NOTE_VERDICT_WAIT_JS,
+    _NOTE_DETAIL_JS,
+    _button_shows_liked,
+    _finish_verdict,
+    _is_login_page,
+    _landed_elsewhere,
+    _note_detail_from_values,
+    _open_seen_index,
+    _remember_note,
+    _remember_unviewable,
+    _report_verdict,
+    _url_looks_unviewable,
+)
+from xhs_scan import (
+    CandidateQueue,
+    DetailPagePoolBase,
+    call_async,
+    iter_async,
+    _find_card_steps,
+    _iter_matching_steps,
+    _wait_for_feed_ready_steps,
+)
+
+
+# 扫描协程最多领先详情处理的命中卡片数
+CANDIDATE_QUEUE_SIZE = 4
+
+
+async def _dom_looks_like_login(page) -> bool:
+    for sel in LOGIN_DOM_SELECTORS:
+        try:
+            loc = page.locator(sel).first
+            if await loc.count() > 0 and await loc.is_visible():
+                return True
+        except Exception:
+            continue
+    return False
+
+
+async def _on_login_page(page) -> bool:
+    return _is_login_page(page.url) or await _dom_looks_like_login(page)
+
+
+async def ensure_home_loaded(
+    page,
+    timeout_ms: int = 15000,
+    home_url: str = HOMEPAGE_URL,
+    retries: int = 2,
+    stop_if_login: bool = False,
+):
+    last_err = None
+    for attempt in range(retries + 1):
+        try:
+            print(f"尝试加载首页... (第{attempt + 1}次/共{retries + 1}次)")
+            await page.goto(home_url, wait_until="domcontentloaded", timeout=timeout_ms)
+            # 如果当前在登录页且要求停止刷新，则直接返回，不再重试
+            if stop_if_login and _is_login_page(page.url):
+                return
+            try:
+                await page.wait_for_load_state("networkidle", timeout=timeout_ms)
+            except PWTimeout:
+                pass
+            print("首页加载成功")
+            return
+        except Exception as e:
+            last_err = e
+            print(f"加载失败: {str(e)[:100]}")
+            if attempt < retries:
+                wait_time = (attempt + 1) * 2000  # 递增等待时间
+                print(f"等待 {wait_time/1000} 秒后重试...")
+                await page.wait_for_timeout(wait_time)
+    if last_err:
+        print(f"无法加载首页，最终错误: {last_err}")
+        raise last_err
+
+
+async def wait_for_feed_ready(page, timeout_ms: int = 12000, min_cards: int = 1, debug: bool = False) -> bool:
+    # 等待推荐流中至少出现 min_cards 个卡片链接（与同步引擎共用 xhs_scan 的实现）
+    ready, _ = await call_async(_wait_for_feed_ready_steps(page, timeout_ms, min_cards, debug))
+    return ready
+
+
+async def find_card_link_by_keywords(
+    page,
+    rules: List[Tuple[Set[str], str]],
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    exclude_urls: Optional[Set[Any]] = None,
+    max_scroll_steps: int = 6,
+    scroll_pause_ms: int = 800,
+    incremental: bool = True,
+    seen_index: Optional[SeenNoteIndex] = None,
+    capture: Optional[FeedCapture] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
+    match_options: Optional[Dict[str, bool]] = None,
+) -> Optional[Tuple[object, str, str]]:
+    # 返回第一张命中卡片的 (锚点, 表达式, 字段)，参数与同步版相同，匹配配置与开关由参数传入
+    return await call_async(_find_card_steps(
+        page, rules, exclude_rules, exclude_urls, max_scroll_steps, scroll_pause_ms, incremental,
+        seen_index, capture, reloader, card_dump, debug, match_options,
+    ))
+
+
+def iter_matching_cards(
+    page,
+    rules: List[Tuple[Set[str], str]],
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    exclude_urls: Optional[Set[Any]] = None,
+    max_scroll_steps: int = 6,
+    scroll_pause_ms: int = 800,
+    incremental: bool = True,
+    seen_index: Optional[SeenNoteIndex] = None,
+    max_refresh: int = 0,
+    refresh_interval_sec: float = 0.0,
+    capture: Optional[FeedCapture] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
+    match_options: Optional[Dict[str, bool]] = None,
+):
+    """滚动并刷新推荐流，逐个产出所有命中的卡片 (卡片, 表达式, 字段)（异步生成器），语义同同步版 iter_matching_cards"""
+    return iter_async(_iter_matching_steps(
+        page, rules, exclude_rules, exclude_urls, max_scroll_steps, scroll_pause_ms, incremental,
+        seen_index, max_refresh, refresh_interval_sec, capture, reloader, card_dump, debug, match_options,
+    ))
+
+
+class DetailPagePool(DetailPagePoolBase):
+    """详情标签页池（xhs_scan.DetailPagePoolBase）的异步实现"""
+
+    async def acquire(self):
+        return await call_async(self._acquire_steps())
+
+    async def adopt(self, tab):
+        return await call_async(self._adopt_steps(tab))
+
+    async def release(self, tab):
+        await call_async(self._release_steps(tab))
+
+    async def close(self):
+        await call_async(self._close_all_steps())
+
+
+class CandidateFeed:
+    """扫描协程与详情处理之间的命中卡片队列
+
+    与同步引擎相同按规则顺序（xhs_scan.CandidateQueue）取出，规则重新加载后按新规则重新排列；
+    扫描最多领先 CANDIDATE_QUEUE_SIZE 张卡片。
+    """
+
+    def __init__(self, ruleset: CompiledRuleSet, reloader: Optional[RuleSetReloader] = None):
+        self.candidates = CandidateQueue(ruleset)
+        self.reloader = reloader
+        self.finished = False
+        self._changed = asyncio.Condition()
+
+    async def put(self, card: Dict[str, Any], expr: str, field: str):
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self.candidates) < CANDIDATE_QUEUE_SIZE)
+            self.candidates.follow(self.reloader)
+            self.candidates.push(card, card["href"], expr, field)
+            self._changed.notify_all()
+
+    async def finish(self):
+        async with self._changed:
+            self.finished = True
+            self._changed.notify_all()
+
+    async def get(self) -> Optional[Tuple[Any, str, str, str]]:
+        """取出排在最前的 (卡片, href, 表达式, 字段)；扫描已结束且队列为空时返回 None"""
+        async with self._changed:
+            while True:
+                await self._changed.wait_for(lambda: len(self.candidates) > 0 or self.finished)
+                self.candidates.follow(self.reloader)
+                item = self.candidates.pop()
+                self._changed.notify_all()
+                if item is not None or self.finished:
+                    return item
+
+
+async def _wait_for_detail_ready(page, timeout_ms: int = 10000) -> bool:
+    try:
+        await page.wait_for_function(
+            _DETAIL_READY_JS, arg=DETAIL_READY_SELECTOR, timeout=timeout_ms, polling=100
+        )
+        return True
+    except Exception:
+        return False
+
+
+async def _open_card_detail(pool: DetailPagePool, url: str, *, wait_timeout_ms: int = 20000):
+    # 在池中的详情标签页直接跳转到笔记链接，成功返回该标签页，失败返回 None（标签页已归还）
+    expected = NoteKey.from_url(url)
+    print(f"[DEBUG] 尝试访问笔记链接: {url}（笔记ID: {expected or '未知'}）")
+    tab = await pool.acquire()
+    try:
+        await tab.goto(url, wait_until="domcontentloaded", timeout=wait_timeout_ms)
+        if _landed_elsewhere(tab, expected):
+            raise RuntimeError("打开了其他笔记")
+        await _wait_for_detail_ready(tab, wait_timeout_ms)
+    except Exception as e:
+        print(f"[DEBUG] 直接跳转失败: {e}")
+        await pool.release(tab)
+        return None
+    print(f"[DEBUG] 直接跳转成功: {tab.url}")
+    return tab
+
+
+async def classify_note_page(page, timeout_ms: int = 3000) -> Dict[str, Any]:
+    # 同 xhs_find_and_open.classify_note_page：等到可下结论时返回判定，超时按当前状态判定
+    try:
+        handle = await page.wait_for_function(
+            _NOTE_VERDICT_WAIT_JS, arg=_NOTE_VERDICT_ARG, timeout=timeout_ms, polling=100
+        )
+        verdict = await handle.json_value()
+    except PWTimeout:
+        verdict = await page.evaluate(_NOTE_VERDICT_JS, _NOTE_VERDICT_ARG)
+    return _finish_verdict(verdict)
+
+
+async def _unviewable_reason(page) -> Optional[str]:
+    # 同 xhs_find_and_open._unviewable_reason：返回不可浏览的依据，可浏览返回 None
+    if _url_looks_unviewable(page.url):
+        print(f"[DEBUG] 检测到错误URL: {page.url.lower()}")
+        return UNVIEWABLE_URL
+    verdict = await classify_note_page(page)
+    _report_verdict(verdict, page.url)
+    return verdict["reason"]
+
+
+async def _get_first_text(page, selectors: List[str], timeout_ms: int = 1000) -> Optional[str]:
+    for sel in selectors:
+        try:
+            loc = page.locator(sel).first
+            if await loc.count() > 0:
+                text = (await loc.inner_text(timeout=timeout_ms)).strip()
+                if text:
+                    return text
+        except Exception:
+            continue
+    return None
+
+
+async def extract_note_detail(page, fallback_timeout_ms: int = 1000) -> NoteDetail:
+    # 同 xhs_find_and_open.extract_note_detail：单次 evaluate 取回内嵌状态与 DOM 文本
+    url = page.url
+    try:
+        values = await page.evaluate(_NOTE_DETAIL_JS, DETAIL_FIELD_SELECTORS) or {}
+    except Exception as e:
+        print(f"[DEBUG] 批量提取详情失败，回退逐个提取: {e}")
+        values = {}
+        for name, selectors in DETAIL_FIELD_SELECTORS.items():
+            values[name] = await _get_first_text(page, selectors, timeout_ms=fallback_timeout_ms)
+    return _note_detail_from_values(values, url)
+
+
+async def inspect_note(page) -> Tuple[Optional[str], Optional[NoteDetail]]:
+    """并发执行不可浏览判定与详情提取，返回 (不可浏览的依据，可浏览为 None, 详情)
+
+    判定为不可浏览时取消提取；提取早于正文渲染完成（标题与正文都为空）时在判定之后重新提取一次。
+    """
+    extraction = asyncio.ensure_future(extract_note_detail(page))
+    try:
+        reason = await _unviewable_reason(page)
+    except Exception as e:
+        print(f"[DEBUG] 不可浏览判定失败: {e}")
+        reason = None
+    if reason:
+        extraction.cancel()
+        try:
+            await extraction
+        except BaseException:
+            pass
+        return reason, None
+    try:
+        detail = await extraction
+        if not (detail.title or detail.content):
+            detail = await extract_note_detail(page)
+    except Exception as e:
+        print(f"[DEBUG] 提取详情失败: {e}")
+        return None, None
+    return None, detail
+
+
+async def like_note(page) -> bool:
+    # 同 xhs_find_and_open.like_note：按钮选择器、点击前等待与点击方式表共用 xhs_page
+    print("检查点赞状态...")
+    like_button = None
+    for selector in LIKE_BUTTON_SELECTORS:
+        try:
+            btn = page.locator(selector).first
+            if await btn.count() > 0 and await btn.is_visible():
+                like_button = btn
+                print(f"找到点赞按钮: {selector}")
+                break
+        except Exception:
+            continue
+    if like_button is None:
+        print("未找到点赞按钮")
+        return False
+    try:
+        if _button_shows_liked(await like_button.text_content(), await like_button.get_attribute("aria-pressed")):
+            print("笔记已点赞")
+            return True
+    except Exception as e:
+        print(f"检查点赞状态异常: {e}")
+        return False
+    print("笔记未点赞，准备点赞...")
+    await page.wait_for_timeout(LIKE_PRE_CLICK_WAIT_MS)
+    for i, (method, args, kwargs) in enumerate(LIKE_CLICK_METHODS):
+        try:
+            await getattr(like_button, method)(*args, **kwargs)
+        except Exception as click_error:
+            print(f"点赞方法 {i+1} 失败: {click_error}")
+            continue
+        print(f"点赞方法 {i+1} 执行成功")
+        print("✅ 点赞成功！")
+        await page.wait_for_timeout(LIKE_SETTLE_MS)
+        return True
+    print("❌ 点赞失败")
+    return False
+
+
+async def _wait_for_login(page, login_timeout_sec: int) -> bool:
+    print(f"检测到登录页，请在打开的浏览器中完成扫码/登录（最多等待 {login_timeout_sec} 秒）…")
+    deadline = time.time() + max(5, int(login_timeout_sec))
+    while time.time() < deadline:
+        if not await _on_login_page(page):
+            return True
+        await page.wait_for_timeout(1000)
+    return False
+
+
+async def _produce_candidates(feed: CandidateFeed, cards):
+    # 扫描协程：把命中卡片放入候选队列，扫描结束（或出错）时标记结束
+    try:
+        async for card, expr, field in cards:
+            await feed.put(card, expr, field)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"扫描异常结束: {e}")
+    await feed.finish()
+
+
+async def run_async(
+    rules: List[Tuple[Set[str], str]],
+    max_refresh: int,
+    per_refresh_scroll_steps: int,
+    refresh_interval_sec: float,
+    headless: bool,
+    login_timeout_sec: int,
+    proxy_server: Optional[str],
+    home_url: str,
+    no_like: bool = False,
+    seen_index_path: Optional[str] = None,
+    unviewable_ttl_sec: float = DEFAULT_UNVIEWABLE_TTL_SEC,
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    use_regex: bool = False,
+    exact: bool = False,
+    case_sensitive: bool = False,
+    debug: bool = False,
+    incremental: bool = True,
+    card_dump: Optional[CardDumpWriter] = None,
+    capture_feed: bool = False,
+    rules_reloader: Optional[RuleSetReloader] = None,
+) -> Optional[NoteDetail]:
+    """异步版 run：首页扫描与详情处理并发，返回第一篇可浏览笔记的详情（未找到返回 None）
+
+    匹配配置、调试开关、增量扫描与卡片转储都作为参数传给扫描函数；card_dump 由调用方关闭。
+    """
+    if not rules:
+        raise ValueError("至少需要一个关键词")
+    match_options = {"use_regex": use_regex, "exact": exact, "case_sensitive": case_sensitive}
+    auth_path = AUTH_STATE_PATH
+    async with async_playwright() as p:
+        launch_kwargs = browser_launch_options(headless, proxy_server)
+        try:
+            browser = await p.chromium.launch(channel="chrome", **launch_kwargs)
+        except Exception:
+            browser = await p.chromium.launch(**launch_kwargs)
+        context = await browser.new_context(**browser_context_options(auth_path))
+        page = await context.new_page()
+        # 推荐流接口捕获：需在打开首页之前监听，才能收到首屏数据
+        capture = FeedCapture().install(page) if capture_feed else None
+        pool = DetailPagePool(context, headers=DETAIL_TAB_HEADERS)
+        scanner = None
+        found: Optional[NoteDetail] = None
+        try:
+            await ensure_home_loaded(page, home_url=home_url, stop_if_login=True)
+            if await _on_login_page(page):
+                if not await _wait_for_login(page, login_timeout_sec):
+                    print("登录超时，退出。")
+                    return None
+                await ensure_home_loaded(page, home_url=home_url)
+
+            # 监视关键词文件时由 rules_reloader 持有当前规则集，文件变化后在两步滚动之间换用新规则集
+            if rules_reloader is not None:
+                ruleset = rules_reloader.ruleset
+                print(f"正在监视关键词文件 {rules_reloader.keywords_file}，修改后在下一步滚动前生效")
+            else:
+                ruleset = compile_rules(rules, exclude_rules=exclude_rules, **match_options)
+            seen_index = _open_seen_index(seen_index_path, unviewable_ttl_sec)
+            feed = CandidateFeed(ruleset, rules_reloader)
+            cards = iter_matching_cards(
+                page,
+                ruleset,
+                max_scroll_steps=per_refresh_scroll_steps,
+                incremental=incremental,
+                seen_index=seen_index,
+                max_refresh=max_refresh,
+                refresh_interval_sec=refresh_interval_sec,
+                capture=capture,
+                reloader=rules_reloader,
+                card_dump=card_dump,
+                debug=debug,
+                match_options=match_options,
+            )
+            scanner = asyncio.ensure_future(_produce_candidates(feed, cards))
+
+            # 按规则顺序逐个处理命中卡片；处理期间扫描协程继续滚动首页
+            while True:
+                item = await feed.get()
+                if item is None:
+                    break
+                card, _, expr, field = item
+                print(f"已命中关键词：{expr}（字段：{field}），尝试进入详情…")
+                print("命中卡片 href:", card["href"])
+                detail_page = await _open_card_detail(pool, card["url"])
+                if detail_page is None:
+                    print("进入详情失败：未能完成跳转。")
+                    continue
+                unviewable_reason, detail = await inspect_note(detail_page)
+                if unviewable_reason:
+                    print("检测到当前笔记不可浏览，跳过：", detail_page.url)
+                    _remember_unviewable(seen_index, unviewable_reason, card["href"], detail_page.url)
+                    await pool.release(detail_page)
+                    continue
+                if detail is None:
+                    await pool.release(detail_page)
+                    continue
+                print_note_detail(detail)
+                _remember_note(seen_index, STATUS_VISITED, card["href"], detail_page.url)
+                if no_like:
+                    print("已禁用自动点赞功能")
+                else:
+                    await like_note(detail_page)
+                await detail_page.screenshot(path="detail_snapshot.png", full_page=True)
+                found = detail
+                break
+            if found is None:
+                print("未找到任何可浏览的关键词对应卡片")
+            if capture:
+                print(f"接口捕获：{capture.summary()}")
+            print(f"详情标签页：{pool.summary()}")
+            return found
+        finally:
+            if scanner is not None and not scanner.done():
+                scanner.cancel()
+                try:
+                    await scanner
+                except BaseException:
+                    pass
+            try:
+                await context.storage_state(path=auth_path)
+            except Exception:
+                pass
+            await pool.close()
+            await context.close()
+            await browser.close()
+
+
+def run(**kwargs) -> Optional[NoteDetail]:
+    """同步入口：在新的事件循环中执行 run_async（供命令行 --async 调用）"""
+    return asyncio.run(run_async(**kwargs))
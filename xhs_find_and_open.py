@@ -1,8 +1,10 @@
 import os
+import sys
 import time
 import argparse
 import json
 import glob
+import contextlib
 import random
 from typing import Optional, List, Tuple, Set, Dict, Any
 from pathlib import Path
@@ -10,12 +12,89 @@ from pathlib import Path
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
 from urllib.parse import urljoin
 
+from xhs_rules import (
+    CardDumpWriter,
+    RuleSetReloader,
+    RuleSyntaxError,
+    compile_rules,
+    dedupe_rules,
+    parse_rule_expr,
+    read_keywords_from_file,
+    _parse_fields_token,
+)
+from xhs_profile import PROFILER
+from xhs_network import LeanNetwork, FeedCapture
+from xhs_notes import (
+    NoteKey,
+    NoteDetail,
+    SeenNoteIndex,
+    SEEN_INDEX_FILE,
+    STATUS_VISITED,
+    DEFAULT_UNVIEWABLE_TTL_SEC,
+)
+from xhs_scan import (
+    CandidateQueue,
+    DetailPagePoolBase,
+    call_sync,
+    iter_sync,
+    _anchor_present_steps,
+    _card_links_steps,
+    _card_titles_steps,
+    _extract_card_texts_steps,
+    _find_card_steps,
+    _iter_matching_steps,
+    _queue_matching_steps,
+    _wait_for_feed_ready_steps,
+)
+from xhs_page import (
+    HOMEPAGE_URL,
+    AUTH_STATE_PATH,
+    browser_launch_options,
+    browser_context_options,
+    LOGIN_DOM_SELECTORS,
+    DETAIL_TAB_HEADERS,
+    DETAIL_READY_SELECTOR,
+    DETAIL_FIELD_SELECTORS,
+    NOTE_ERROR_KEYWORDS,
+    NOTE_ERROR_SELECTORS,
+    NOTE_CONTENT_SELECTORS,
+    NOTE_MAIN_SELECTORS,
+    NOTE_CONTAINER_SELECTORS,
+    UNVIEWABLE_URL,
+    UNVIEWABLE_TITLE,
+    UNVIEWABLE_KEYWORD,
+    UNVIEWABLE_ERROR_ELEMENT,
+    UNVIEWABLE_NO_CONTENT,
+    LIKE_BUTTON_SELECTORS,
+    LIKE_CLICK_METHODS,
+    LIKE_PRE_CLICK_WAIT_MS,
+    LIKE_SETTLE_MS,
+    print_note_detail,
+    _DETAIL_READY_JS,
+    _NOTE_VERDICT_JS,
+    _NOTE_VERDICT_ARG,
+    _NOTE_VERDICT_WAIT_JS,
+    _NOTE_DETAIL_JS,
+    _button_shows_liked,
+    _finish_verdict,
+    _is_login_page,
+    _landed_elsewhere,
+    _match_options_from,
+    _new_scan_token,
+    _note_detail_from_values,
+    _note_keys,
+    _open_seen_index,
+    _remember_note,
+    _remember_unviewable,
+    _report_verdict,
+    _url_looks_unviewable,
+)
+
 
-HOMEPAGE_URL = "https://www.xiaohongshu.com/explore"
-AUTH_STATE_PATH = "auth_state.json"
 ACCOUNTS_DIR = "accounts"
 ACCOUNT_USAGE_FILE = "account_usage.json"
 REPLY_CONTENT_FILE = "reply_content.txt"
+PROFILE_TRACE_FILE = "profile_trace.json"
 
 
 def setup_accounts_directory():
@@ -358,22 +437,9 @@ def post_comment(page, comment_text: str, *, max_retries: int = 3) -> bool:
         return False
 
 
-def _is_login_page(url: str) -> bool:
-    u = (url or "").lower()
-    return ("login" in u) or ("passport" in u)
-
-
 def _dom_looks_like_login(page) -> bool:
     try:
-        # 更严格：仅识别登录相关 iframe 或明显的登录弹层容器且可见
-        selectors = [
-            "iframe[src*='login']",
-            "iframe[src*='passport']",
-            "div[class*='login']",
-            "div[id*='login']",
-            "div[role='dialog'] div:has-text('扫码登录')",
-        ]
-        for sel in selectors:
+        for sel in LOGIN_DOM_SELECTORS:
             try:
                 loc = page.locator(sel).first
                 if loc.count() > 0 and loc.is_visible():
@@ -385,66 +451,6 @@ def _dom_looks_like_login(page) -> bool:
     return False
 
 
-def _parse_fields_token(token: str) -> Optional[Set[str]]:
-    token_low = token.strip().lower()
-    if token_low in {"title", "链接", "link"}:
-        # 单一字段
-        if token_low == "链接":
-            token_low = "link"
-        return {token_low}
-    if token_low in {"any", "全部", "all"}:
-        return {"title", "link"}
-    # 逗号分隔
-    parts = [p.strip().lower() for p in token_low.split(",") if p.strip()]
-    valid_map = {"title": "title", "link": "link", "链接": "link"}
-    fields: Set[str] = set()
-    for p in parts:
-        if p in valid_map:
-            fields.add(valid_map[p])
-    if fields:
-        return fields
-    return None
-
-
-def read_keywords_from_file(file_path: str, default_fields: Set[str]) -> List[Tuple[Set[str], str]]:
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"关键词文件不存在: {file_path}")
-    rules: List[Tuple[Set[str], str]] = []
-    with open(file_path, "r", encoding="utf-8-sig") as f:
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-            if line.startswith("#") or line.startswith("//"):
-                continue
-            # 支持形如： title:旅行 | link:/explore/abc | any:美食
-            # 也支持一行多个关键词用逗号分隔： title:旅行, 科技
-            fields = None
-            content = line
-            if ":" in line:
-                prefix, rest = line.split(":", 1)
-                maybe_fields = _parse_fields_token(prefix)
-                if maybe_fields is not None:
-                    fields = maybe_fields
-                    content = rest.strip()
-            # 按逗号分割多个关键词
-            parts = [p.strip() for p in content.split(",") if p.strip()]
-            for part in parts:
-                rules.append((fields or set(default_fields), part))
-    # 去重（按 字段集合+小写关键词）并保持顺序
-    seen: Set[str] = set()
-    unique_rules: List[Tuple[Set[str], str]] = []
-    for fields, kw in rules:
-        key = ",".join(sorted(fields)) + "|" + kw.lower()
-        if key in seen:
-            continue
-        seen.add(key)
-        unique_rules.append((fields, kw))
-    if not unique_rules:
-        raise ValueError("关键词文件为空或无有效关键词")
-    return unique_rules
-
-
 def get_first_text(page, selectors: List[str], timeout_ms: int = 3000) -> Optional[str]:
     for css in selectors:
         try:
@@ -462,234 +468,140 @@ def get_first_text(page, selectors: List[str], timeout_ms: int = 3000) -> Option
     return None
 
 
-def _normalize_text(text: str, case_sensitive: bool) -> str:
-    if text is None:
-        return ""
-    t = text.strip()
-    if not case_sensitive:
-        t = t.lower()
-    # 折叠多余空白
-    t = " ".join(t.split())
-    return t
-
-
 def _extract_card_texts(anchor) -> Dict[str, str]:
     # 提取卡片的标题相关文本（锚点文本 + 近邻标题/段落）
-    title_texts: List[str] = []
-    try:
-        txt = anchor.inner_text(timeout=150)
-        if txt:
-            title_texts.append(txt)
-    except Exception:
-        pass
-    # 锚点上的可读属性
-    try:
-        aria_label = anchor.get_attribute("aria-label")
-        if aria_label:
-            title_texts.append(aria_label)
-    except Exception:
-        pass
-    try:
-        title_attr = anchor.get_attribute("title")
-        if title_attr:
-            title_texts.append(title_attr)
-    except Exception:
-        pass
-    container = None
-    try:
-        loc = anchor.locator("xpath=ancestor::article[1]").first
-        if loc.count() > 0:
-            container = loc
-    except Exception:
-        container = None
-    if container is None:
-        try:
-            loc = anchor.locator("xpath=ancestor::div[1]").first
-            if loc.count() > 0:
-                container = loc
-        except Exception:
-            container = None
-    if container is None:
-        try:
-            loc = anchor.locator("xpath=ancestor::li[1]").first
-            if loc.count() > 0:
-                container = loc
-        except Exception:
-            container = None
-    if container is not None:
-        try:
-            # 常见标题/文本位置
-            cand = container.locator("h1, h2, h3, [class*='title'], [title], [aria-label], p, span")
-            inner = cand.all_inner_texts()
-            for t in inner:
-                t = (t or "").strip()
-                if t:
-                    title_texts.append(t)
-        except Exception:
-            pass
-        # 提取图片 alt 文本作为可能的标题来源
-        try:
-            alt_values = container.locator("img[alt]").evaluate_all("els => els.map(e => e.getAttribute('alt'))")
-            for t in alt_values or []:
-                t = (t or "").strip()
-                if t:
-                    title_texts.append(t)
-        except Exception:
-            pass
-        # 兜底抓取容器整体的内文本（避免过大）
-        try:
-            bulk_text = container.inner_text(timeout=200)
-            bulk_text = (bulk_text or "").strip()
-            if bulk_text:
-                title_texts.append(bulk_text)
-        except Exception:
-            pass
-    # 去重
-    seen = set()
-    merged = []
-    for t in title_texts:
-        if t not in seen:
-            seen.add(t)
-            merged.append(t)
-    try:
-        href = anchor.get_attribute("href") or ""
-    except Exception:
-        href = ""
-    return {"title": " \n".join(merged), "link": href}
+    return call_sync(_extract_card_texts_steps(anchor))
 
 
-def _pattern_matches(value: str, pattern: str, *, use_regex: bool, exact: bool, case_sensitive: bool) -> bool:
-    val = _normalize_text(value or "", case_sensitive)
-    if use_regex:
-        import re
-        flags = 0 if case_sensitive else re.IGNORECASE
-        try:
-            return re.search(pattern, value or "", flags) is not None
-        except re.error:
-            return False
-    patt = _normalize_text(pattern, case_sensitive)
-    if exact:
-        return val == patt
-    return patt in val
-
-
-def _expr_matches(value: str, expr: str, *, use_regex: bool, exact: bool, case_sensitive: bool) -> bool:
-    # 支持 AND/OR： "a && b"，"a || b"
-    if "&&" in expr:
-        parts = [p.strip() for p in expr.split("&&") if p.strip()]
-        return all(_pattern_matches(value, p, use_regex=use_regex, exact=exact, case_sensitive=case_sensitive) for p in parts)
-    if "||" in expr:
-        parts = [p.strip() for p in expr.split("||") if p.strip()]
-        return any(_pattern_matches(value, p, use_regex=use_regex, exact=exact, case_sensitive=case_sensitive) for p in parts)
-    return _pattern_matches(value, expr, use_regex=use_regex, exact=exact, case_sensitive=case_sensitive)
-
-
-def wait_for_feed_ready(page, timeout_ms: int = 12000) -> bool:
-    # 等待推荐流中至少出现若干卡片链接
-    selectors = [
-        "a[href*='/explore/']:not([href*='login']):not([href*='passport'])",
-        "article:has(a[href*='/explore/']) a[href*='/explore/']",
-        "div.note-item a[href*='/explore/']",
-        "section:has(a[href*='/explore/']) a[href*='/explore/']",
-        "div[class*='note'] a[href*='/explore/']",
-    ]
-    deadline = time.time() + (timeout_ms / 1000.0)
-    while time.time() < deadline:
-        try:
-            total = 0
-            for sel in selectors:
-                total += page.locator(sel).count()
-            if total >= 1:
-                return True
-        except Exception:
-            pass
-        page.wait_for_timeout(300)
-    return False
+def _anchor_present(anchor) -> bool:
+    return call_sync(_anchor_present_steps(anchor))
+
+
+def _extract_card_links(page, scan_token: Optional[str] = None) -> List[str]:
+    # 第一阶段：单次往返取回（新增）卡片的 href，不读取任何文本
+    return call_sync(_card_links_steps(page, scan_token))
+
+
+def _extract_card_titles(page, links: List[str]) -> Dict[str, str]:
+    # 第二阶段：单次往返只为给定 href 的卡片提取标题文本
+    return call_sync(_card_titles_steps(page, links))
+
+
+def wait_for_feed_ready(page, timeout_ms: int = 12000, min_cards: int = 1, debug: bool = False) -> bool:
+    # 等待推荐流中至少出现 min_cards 个卡片链接（xhs_scan）；耗时记录在 wait_for_feed_ready.last_wait_ms
+    ready, wait_for_feed_ready.last_wait_ms = call_sync(
+        _wait_for_feed_ready_steps(page, timeout_ms, min_cards, debug)
+    )
+    return ready
+
+
+def _match_options() -> Dict[str, bool]:
+    return _match_options_from(find_card_link_by_keywords)
 
 
 def find_card_link_by_keywords(
     page,
     rules: List[Tuple[Set[str], str]],
     exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
-    exclude_urls: Optional[Set[str]] = None,
+    exclude_urls: Optional[Set[Any]] = None,
     max_scroll_steps: int = 6,
     scroll_pause_ms: int = 800,
+    incremental: bool = True,
+    seen_index: Optional[SeenNoteIndex] = None,
+    capture: Optional[FeedCapture] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
 ) -> Optional[Tuple[object, str, str]]:
-    seen_hrefs = set()
-    # 预处理为小写
-    lowered_rules: List[Tuple[Set[str], str]] = [(fields, kw) for fields, kw in rules]
-    lowered_excludes: List[Tuple[Set[str], str]] = list(exclude_rules or [])
-    selector_list = [
-        "a[href*='/explore/']:not([href*='login']):not([href*='passport'])",
-        "article:has(a[href*='/explore/']) a[href*='/explore/']",
-        "div.note-item a[href*='/explore/']",
-        "section:has(a[href*='/explore/']) a[href*='/explore/']",
-        "div[class*='note'] a[href*='/explore/']",
-    ]
-    for step_idx in range(max_scroll_steps):
-        # 等待推荐流渲染一些卡片
-        wait_for_feed_ready(page, timeout_ms=3000 if step_idx == 0 else 1500)
-        anchors = []
-        for sel in selector_list:
-            try:
-                anchors.extend(page.locator(sel).all())
-            except Exception:
-                continue
-        debug_sample_printed = False
-        for a in anchors:
-            try:
-                field_values = _extract_card_texts(a)
-                href = field_values.get("link", "")
-                if not href or href in seen_hrefs:
-                    continue
-                seen_hrefs.add(href)
-            except Exception:
-                continue
+    # 返回第一张命中卡片的 (锚点, 表达式, 字段)；exclude_urls 可混放链接与 NoteKey
+    return call_sync(_find_card_steps(
+        page, rules, exclude_rules, exclude_urls, max_scroll_steps, scroll_pause_ms,
+        incremental, seen_index, capture, reloader, card_dump, debug, _match_options(),
+    ))
 
-            # 排除规则命中则跳过该卡片
-            excluded = False
-            for fields, expr in lowered_excludes:
-                if ("title" in fields and _expr_matches(field_values.get("title", ""), expr, use_regex=find_card_link_by_keywords.use_regex, exact=find_card_link_by_keywords.exact, case_sensitive=find_card_link_by_keywords.case_sensitive)) or (
-                    "link" in fields and _expr_matches(field_values.get("link", ""), expr, use_regex=find_card_link_by_keywords.use_regex, exact=find_card_link_by_keywords.exact, case_sensitive=find_card_link_by_keywords.case_sensitive)
-                ):
-                    excluded = True
-                    break
-            
-            # 检查是否在排除URL列表中
-            if exclude_urls and href in exclude_urls:
-                excluded = True
-                
-            if excluded:
-                continue
 
-            for fields, expr in lowered_rules:
-                if "title" in fields and _expr_matches(field_values.get("title", ""), expr, use_regex=find_card_link_by_keywords.use_regex, exact=find_card_link_by_keywords.exact, case_sensitive=find_card_link_by_keywords.case_sensitive):
-                    return a, expr, "title"
-                if "link" in fields and _expr_matches(field_values.get("link", ""), expr, use_regex=find_card_link_by_keywords.use_regex, exact=find_card_link_by_keywords.exact, case_sensitive=find_card_link_by_keywords.case_sensitive):
-                    return a, expr, "link"
-            # 若开启调试，打印部分候选卡片的内容，便于排查选择器/文本提取
-            if getattr(find_card_link_by_keywords, "debug", False) and not debug_sample_printed and step_idx == 0:
-                try:
-                    print("[DEBUG] 候选卡片示例（前5条）：")
-                    count = 0
-                    for a2 in anchors[:5]:
-                        try:
-                            fv = _extract_card_texts(a2)
-                            print("[DEBUG] href=", fv.get("link", ""))
-                            print("[DEBUG] title=", (fv.get("title", "") or "").replace("\n", " ")[:180])
-                            count += 1
-                        except Exception:
-                            continue
-                        if count >= 5:
-                            break
-                except Exception:
-                    pass
-                debug_sample_printed = True
-        page.mouse.wheel(0, 2600)
-        page.wait_for_timeout(scroll_pause_ms)
-    return None
+def queue_matching_cards(
+    page,
+    rules: List[Tuple[Set[str], str]],
+    candidates: CandidateQueue,
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    exclude_urls: Optional[Set[Any]] = None,
+    max_scroll_steps: int = 6,
+    scroll_pause_ms: int = 800,
+    incremental: bool = True,
+    seen_index: Optional[SeenNoteIndex] = None,
+    capture: Optional[FeedCapture] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
+) -> int:
+    """滚动扫描直到某一步出现命中，把这一步的全部命中卡片放入 candidates，返回新加入的数量"""
+    return call_sync(_queue_matching_steps(
+        page, rules, candidates, exclude_rules, exclude_urls, max_scroll_steps, scroll_pause_ms,
+        incremental, seen_index, capture, reloader, card_dump, debug, _match_options(),
+    ))
+
+
+def iter_matching_cards(
+    page,
+    rules: List[Tuple[Set[str], str]],
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    exclude_urls: Optional[Set[Any]] = None,
+    max_scroll_steps: int = 6,
+    scroll_pause_ms: int = 800,
+    incremental: bool = True,
+    seen_index: Optional[SeenNoteIndex] = None,
+    max_refresh: int = 0,
+    refresh_interval_sec: float = 0.0,
+    capture: Optional[FeedCapture] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
+):
+    """滚动并刷新推荐流，逐个产出所有命中的卡片 (卡片, 表达式, 字段)
+
+    卡片为可直接序列化的字典：{"note_id", "url", "href", "title"}；同一笔记在多次刷新间只产出一次。
+    每轮滚动完 max_scroll_steps 步后刷新首页，最多刷新 max_refresh 次（小于 0 表示不限）。
+    """
+    return iter_sync(_iter_matching_steps(
+        page, rules, exclude_rules, exclude_urls, max_scroll_steps, scroll_pause_ms,
+        incremental, seen_index, max_refresh, refresh_interval_sec, capture, reloader, card_dump, debug,
+        _match_options(),
+    ))
+
+
+def stream_matching_cards(page, rules, output: Any = None, max_matches: int = 0, **scan_kwargs) -> int:
+    """把 iter_matching_cards 的结果逐行写成 JSON Lines，返回写出的条数
+
+    output 为文件路径（追加写入）、已打开的文件对象或 None（标准输出）；max_matches 大于 0 时达到数量即停止。
+    """
+    close_after = False
+    if output is None or output == "-":
+        out = sys.stdout
+    elif isinstance(output, str):
+        folder = os.path.dirname(output)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        out = open(output, "a", encoding="utf-8")
+        close_after = True
+    else:
+        out = output
+    count = 0
+    try:
+        for card, expr, field in iter_matching_cards(page, rules, **scan_kwargs):
+            record = dict(card, rule=expr, field=field, ts=int(time.time()))
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            count += 1
+            if 0 < max_matches <= count:
+                break
+    finally:
+        if close_after:
+            out.close()
+    return count
 
 
+@PROFILER.phased("home_load")
 def ensure_home_loaded(
     page,
     timeout_ms: int = 15000,
@@ -724,124 +636,291 @@ def ensure_home_loaded(
         raise last_err
 
 
-def _open_card_detail(page, anchor, *, wait_timeout_ms: int = 20000):
-    old_url = page.url
-    tabs_page = page
-    href = ""
+def _wait_for_detail_ready(page, timeout_ms: int = 10000) -> bool:
+    # 条件满足立即返回，不做固定时长的等待
     try:
-        href = anchor.get_attribute("href") or ""
+        page.wait_for_function(_DETAIL_READY_JS, arg=DETAIL_READY_SELECTOR, timeout=timeout_ms, polling=100)
+        return True
     except Exception:
-        pass
-    abs_href = urljoin(page.url, href) if href else None
-    
-    print(f"[DEBUG] 尝试访问笔记链接: {abs_href}")
-    
-    # 等待页面稳定
-    page.wait_for_timeout(1000)
-    
-    # 1) 尝试多种模拟点击方式
-    click_methods = [
+        return False
+
+
+# 点击后的等待条件：同页 URL 变化（含 history 导航），或上下文的 page 事件处理函数写入了本次点击的标记
+_CLICK_RESULT_JS = """
+([oldUrl, token]) => window.__xhsOpenedTab === token || location.href !== oldUrl
+"""
+_MARK_OPENED_TAB_JS = "(token) => { window.__xhsOpenedTab = token; }"
+
+
+def _click_and_wait(page, click, old_url: str, timeout_ms: int):
+    # 执行一次点击，等待同页 URL 变化或新标签页打开，任一发生立即返回对应页面；超时返回 None
+    # 两者在一次 wait_for_function 中竞争：URL 在浏览器端检查，新标签页由上下文的 page 事件通知，
+    # 等待期间没有 Python 侧轮询
+    context = page.context
+    opened: List[Any] = []
+    token = _new_scan_token()
+
+    def on_page(new_page):
+        opened.append(new_page)
+        try:
+            page.evaluate(_MARK_OPENED_TAB_JS, token)
+        except Exception:
+            pass
+
+    context.on("page", on_page)
+    try:
+        click()
+        if not opened and page.url == old_url:
+            try:
+                page.wait_for_function(_CLICK_RESULT_JS, arg=[old_url, token], timeout=timeout_ms, polling=100)
+                changed = True
+            except PWTimeout:
+                changed = False
+            except Exception:
+                # 整页跳转销毁了执行上下文，URL 已经变化
+                changed = True
+            if changed and not opened and page.url == old_url:
+                # 浏览器端已看到 URL 变化，page.url 随 framenavigated 事件稍后更新
+                try:
+                    page.wait_for_url(lambda u: u != old_url, timeout=2000)
+                except Exception:
+                    pass
+        if opened:
+            return opened[-1]
+        if page.url != old_url:
+            return page
+        return None
+    finally:
+        context.remove_listener("page", on_page)
+
+
+# 打开详情的方式：click 依次尝试各种点击再回退直接跳转；direct 直接在复用的详情标签页中跳转；
+# auto 按本次运行中各方式的成功率排序
+OPEN_MODES = ("auto", "click", "direct")
+CLICK_METHODS = ("click_force", "click_js", "click_user", "dblclick")
+
+
+class OpenStrategyStats:
+    """记录本次运行中各打开方式的尝试/成功次数，auto 模式据此决定先尝试哪种方式"""
+
+    def __init__(self):
+        self._stats: Dict[str, List[int]] = {}
+
+    def record(self, method: str, success: bool):
+        rec = self._stats.setdefault(method, [0, 0])
+        rec[0] += 1
+        if success:
+            rec[1] += 1
+
+    def rate(self, method: str) -> float:
+        # 拉普拉斯平滑：未尝试过的方式记为 0.5
+        attempts, successes = self._stats.get(method, [0, 0])
+        return (successes + 1.0) / (attempts + 2.0)
+
+    def order(self, methods: List[str]) -> List[str]:
+        # 成功率相同则保持默认顺序
+        return sorted(methods, key=lambda m: -self.rate(m))
+
+    def summary(self) -> str:
+        parts = []
+        for method, (attempts, successes) in self._stats.items():
+            parts.append(f"{method} {successes}/{attempts}")
+        return ", ".join(parts) or "无"
+
+
+class DetailPagePool(DetailPagePoolBase):
+    """详情标签页池（xhs_scan.DetailPagePoolBase）的同步实现"""
+
+    def acquire(self):
+        return call_sync(self._acquire_steps())
+
+    def adopt(self, tab):
+        return call_sync(self._adopt_steps(tab))
+
+    def release(self, tab):
+        call_sync(self._release_steps(tab))
+
+    def close(self):
+        call_sync(self._close_all_steps())
+
+
+# 每个浏览器上下文对应的详情标签页池
+_DETAIL_POOLS: Dict[Any, DetailPagePool] = {}
+
+
+def detail_pool(context) -> DetailPagePool:
+    # 取得（或新建）该上下文的详情标签页池
+    pool = _DETAIL_POOLS.get(context)
+    if pool is None:
+        pool = DetailPagePool(context, headers=DETAIL_TAB_HEADERS)
+        _DETAIL_POOLS[context] = pool
+    return pool
+
+
+def close_detail_pool(context):
+    pool = _DETAIL_POOLS.pop(context, None)
+    if pool is not None:
+        pool.close()
+
+
+@contextlib.contextmanager
+def closing_detail_pools():
+    # 退出时关闭并移除期间新建的详情标签页池，run 的任何退出路径（包括异常）都不会把上下文留在 _DETAIL_POOLS 中
+    before = set(_DETAIL_POOLS)
+    try:
+        yield
+    finally:
+        for context in [c for c in _DETAIL_POOLS if c not in before]:
+            close_detail_pool(context)
+
+
+def release_detail_page(home_page, detail_page):
+    # 详情看完后归还标签页；首页本身不归还
+    if detail_page is None or detail_page is home_page:
+        return
+    detail_pool(home_page.context).release(detail_page)
+
+
+def _open_in_detail_tab(context, abs_href: str, wait_timeout_ms: int):
+    # 已知链接时直接在池中的详情标签页跳转，不做点击模拟
+    print("[DEBUG] 尝试直接跳转URL")
+    pool = detail_pool(context)
+    tab = pool.acquire()
+    try:
+        tab.goto(abs_href, wait_until="domcontentloaded", timeout=wait_timeout_ms)
+        # 等待详情内容渲染
+        _wait_for_detail_ready(tab, wait_timeout_ms)
+    except Exception:
+        pool.release(tab)
+        raise
+    print(f"[DEBUG] 直接跳转成功: {tab.url}")
+    return tab
+
+
+def _click_to_open(
+    page,
+    anchor,
+    method: str,
+    old_url: str,
+    wait_timeout_ms: int,
+    click_wait_ms: int,
+    expected: Optional[NoteKey] = None,
+):
+    # 用指定点击方式打开卡片，成功返回详情所在页面，失败返回 None
+    click_methods = {
         # 方法1: 强制点击
-        lambda: anchor.click(force=True, timeout=5000),
+        "click_force": lambda: anchor.click(force=True, timeout=5000),
         # 方法2: JS点击
-        lambda: anchor.evaluate("element => element.click()"),
+        "click_js": lambda: anchor.evaluate("element => element.click()"),
         # 方法3: 模拟用户点击
-        lambda: anchor.click(button="left", delay=100, timeout=5000),
+        "click_user": lambda: anchor.click(button="left", delay=100, timeout=5000),
         # 方法4: 双击
-        lambda: anchor.dblclick(timeout=5000),
-    ]
-    
-    for i, method in enumerate(click_methods):
+        "dblclick": lambda: anchor.dblclick(timeout=5000),
+    }
+    # 滚动到元素位置（Playwright 会等待元素稳定，无需额外停顿）
+    try:
+        anchor.scroll_into_view_if_needed(timeout=3000)
+    except:
+        pass
+
+    # 检查元素是否可见和可点击，点击后等待导航或新标签页
+    try:
+        if not anchor.is_visible():
+            print(f"[DEBUG] 元素不可见，尝试父元素")
+            # 尝试点击父元素
+            parent = anchor.locator("..")
+            if parent.count() > 0 and parent.is_visible():
+                click = lambda: parent.click(force=True, timeout=3000)
+            else:
+                return None
+        else:
+            click = click_methods[method]
+        opened = _click_and_wait(page, click, old_url, click_wait_ms)
+    except Exception as click_error:
+        print(f"[DEBUG] 点击方式 {method} 失败: {click_error}")
+        return None
+
+    # 同页导航成功
+    if opened is page:
+        if _landed_elsewhere(page, expected):
+            return None
+        _wait_for_detail_ready(page, wait_timeout_ms)
+        print(f"[DEBUG] 同页导航成功: {page.url}")
+        return page
+
+    # 打开了新标签页
+    if opened is not None:
         try:
-            print(f"[DEBUG] 尝试点击方法 {i+1}")
-            
-            # 滚动到元素位置
-            try:
-                anchor.scroll_into_view_if_needed(timeout=3000)
-                page.wait_for_timeout(500)
-            except:
-                pass
-            
-            # 检查元素是否可见和可点击
-            try:
-                if not anchor.is_visible():
-                    print(f"[DEBUG] 元素不可见，尝试父元素")
-                    # 尝试点击父元素
-                    parent = anchor.locator("..")
-                    if parent.count() > 0 and parent.is_visible():
-                        method_result = parent.click(force=True, timeout=3000)
-                    else:
-                        continue
-                else:
-                    method_result = method()
-            except Exception as click_error:
-                print(f"[DEBUG] 点击方法 {i+1} 失败: {click_error}")
-                continue
-            
-            # 等待导航
-            page.wait_for_timeout(2000)
-            
-            # 检查是否成功导航
-            if page.url != old_url:
-                print(f"[DEBUG] 同页导航成功: {page.url}")
-                return page
-            
-            # 检查是否打开了新标签页
-            try:
-                pages = page.context.pages
-                if len(pages) > 1:
-                    new_page = pages[-1]
-                    new_page.wait_for_load_state("domcontentloaded", timeout=wait_timeout_ms)
-                    new_page.wait_for_timeout(2000)
-                    print(f"[DEBUG] 新标签页打开成功: {new_page.url}")
-                    return new_page
-            except:
-                pass
-                
-        except Exception as e:
-            print(f"[DEBUG] 点击方法 {i+1} 异常: {e}")
-            continue
-    
-    # 2) 尝试直接跳转URL（备选方案）
-    if abs_href:
+            opened.wait_for_load_state("domcontentloaded", timeout=wait_timeout_ms)
+            if _landed_elsewhere(opened, expected):
+                raise RuntimeError("打开了其他笔记")
+            _wait_for_detail_ready(opened, wait_timeout_ms)
+            print(f"[DEBUG] 新标签页打开成功: {opened.url}")
+            # 交给详情页池管理，关闭池时一并关闭
+            return detail_pool(page.context).adopt(opened)
+        except:
+            # 未能就绪的新标签页交给详情页池回收
+            detail_pool(page.context).release(opened)
+    return None
+
+
+@PROFILER.phased("open_detail")
+def _open_card_detail(
+    page,
+    anchor,
+    *,
+    href: Optional[str] = None,
+    wait_timeout_ms: int = 20000,
+    click_wait_ms: int = 2000,
+    open_mode: str = "click",
+    stats: Optional[OpenStrategyStats] = None,
+):
+    # anchor 为 None 时只能按 href 直接跳转
+    old_url = page.url
+    if anchor is not None:
         try:
-            print(f"[DEBUG] 尝试直接跳转URL")
-            new_page = page.context.new_page()
-            
-            # 设置更真实的请求头
-            new_page.set_extra_http_headers({
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-                "Accept-Encoding": "gzip, deflate, br",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1",
-            })
-            
-            new_page.goto(abs_href, wait_until="domcontentloaded", timeout=wait_timeout_ms)
-            
-            # 等待页面完全加载
+            href = anchor.get_attribute("href") or href
+        except Exception:
+            pass
+    abs_href = urljoin(page.url, href) if href else None
+    # 目标笔记的规范标识，用于确认打开的是同一篇笔记
+    expected = NoteKey.from_url(abs_href)
+    
+    print(f"[DEBUG] 尝试访问笔记链接: {abs_href}（笔记ID: {expected or '未知'}）")
+
+    # 1) 按打开方式决定尝试顺序：各种模拟点击 / 直接跳转（备选方案）
+    methods = list(CLICK_METHODS) + (["direct"] if abs_href else [])
+    if anchor is None:
+        methods = ["direct"] if abs_href else []
+    elif open_mode == "direct" and abs_href:
+        methods = ["direct"]
+    elif open_mode == "auto" and stats is not None:
+        methods = stats.order(methods)
+    
+    for method in methods:
+        print(f"[DEBUG] 尝试打开方式 {method}")
+        result = None
+        if method == "direct":
             try:
-                new_page.wait_for_load_state("networkidle", timeout=15000)
-            except:
-                pass
-            
-            new_page.wait_for_timeout(3000)
-            print(f"[DEBUG] 直接跳转成功: {new_page.url}")
-            return new_page
-            
-        except Exception as e:
-            print(f"[DEBUG] 直接跳转失败: {e}")
+                result = _open_in_detail_tab(page.context, abs_href, wait_timeout_ms)
+            except Exception as e:
+                print(f"[DEBUG] 直接跳转失败: {e}")
+        else:
             try:
-                new_page.close()
-            except:
-                pass
+                result = _click_to_open(page, anchor, method, old_url, wait_timeout_ms, click_wait_ms, expected)
+            except Exception as e:
+                print(f"[DEBUG] 点击方式 {method} 异常: {e}")
+        if stats is not None:
+            stats.record(method, result is not None)
+        if result is not None:
+            return result
     
-    # 3) 尝试在当前页面直接导航
+    # 2) 尝试在当前页面直接导航
     if abs_href:
         try:
-            print(f"[DEBUG] 尝试当前页面导航")
+            print("[DEBUG] 尝试当前页面导航")
             page.goto(abs_href, wait_until="domcontentloaded", timeout=wait_timeout_ms)
-            page.wait_for_timeout(2000)
+            _wait_for_detail_ready(page, wait_timeout_ms)
             print(f"[DEBUG] 当前页面导航成功: {page.url}")
             return page
         except Exception as e:
@@ -850,13 +929,50 @@ def _open_card_detail(page, anchor, *, wait_timeout_ms: int = 20000):
     return None
 
 
+def classify_note_page(page, timeout_ms: int = 3000) -> Dict[str, Any]:
+    """一次页面内脚本给出结构化判定，页面可下结论时立即返回
+
+    返回字段：titleKeyword / keyword（命中的错误关键词）、errorElement（可见的错误元素选择器，
+    只在页面加载完成且没有笔记容器 noteContainer 时记录）、
+    content / mainText（正常内容迹象）、conclusive、unviewable
+    """
+    try:
+        handle = page.wait_for_function(_NOTE_VERDICT_WAIT_JS, arg=_NOTE_VERDICT_ARG, timeout=timeout_ms, polling=100)
+        verdict = handle.json_value()
+    except PWTimeout:
+        # 超时仍无定论：按当前页面状态判定
+        verdict = page.evaluate(_NOTE_VERDICT_JS, _NOTE_VERDICT_ARG)
+    return _finish_verdict(verdict)
+
+
 def _is_note_unviewable(page) -> bool:
+    return _unviewable_reason(page) is not None
+
+
+@PROFILER.phased("unviewable_check")
+def _unviewable_reason(page) -> Optional[str]:
+    # 返回不可浏览的依据（xhs_page.UNVIEWABLE_*），可浏览返回 None
+    # 先检查URL是否包含错误代码
+    if _url_looks_unviewable(page.url):
+        print(f"[DEBUG] 检测到错误URL: {page.url.lower()}")
+        return UNVIEWABLE_URL
+    try:
+        verdict = classify_note_page(page)
+    except Exception as e:
+        print(f"[DEBUG] 快速判定失败，回退逐项检测: {e}")
+        return _probe_note_unviewable(page)
+    _report_verdict(verdict, page.url)
+    return verdict["reason"]
+
+
+def _probe_note_unviewable(page) -> Optional[str]:
+    # 逐项探测的旧实现：固定等待后多次往返检查（快速判定失败时的兜底）
     try:
         # 先检查URL是否包含错误代码
         url = page.url.lower()
         if "404" in url or "error" in url or "300031" in url:
             print(f"[DEBUG] 检测到错误URL: {url}")
-            return True
+            return UNVIEWABLE_URL
             
         # 等待页面完全加载后再判断
         page.wait_for_timeout(3000)
@@ -866,25 +982,10 @@ def _is_note_unviewable(page) -> bool:
             title = page.title() or ""
             if "404" in title or "错误" in title or "无法浏览" in title:
                 print(f"[DEBUG] 检测到错误页面标题: {title}")
-                return True
+                return UNVIEWABLE_TITLE
         except:
             pass
         
-        keywords = [
-            "无法浏览",
-            "不可浏览", 
-            "不可访问",
-            "无法查看",
-            "内容不存在",
-            "已删除",
-            "违规",
-            "当前笔记无法浏览",
-            "暂时无法浏览",
-            "笔记不存在",
-            "页面不存在",
-            "访问受限",
-        ]
-        
         # 检查页面文本内容
         page_content = ""
         try:
@@ -892,50 +993,27 @@ def _is_note_unviewable(page) -> bool:
         except:
             pass
             
-        for k in keywords:
+        for k in NOTE_ERROR_KEYWORDS:
             if k in page_content:
                 print(f"[DEBUG] 检测到错误关键词: {k}")
-                return True
+                return UNVIEWABLE_KEYWORD
                 
-        # 检查特定的错误元素
-        error_selectors = [
-            ".error",
-            "[class*='error']", 
-            "[class*='not-found']",
-            "[class*='404']",
-            ".note-error",
-            ".content-error",
-            ".error-page",
-            ".error-container"
-        ]
-        
-        for sel in error_selectors:
-            try:
-                err = page.locator(sel).first
-                if err.count() > 0 and err.is_visible():
-                    print(f"[DEBUG] 检测到错误元素: {sel}")
-                    return True
-            except Exception:
-                continue
+        # 检查特定的错误元素（已有笔记容器时多为临时的错误提示，不作为依据）
+        if not _has_note_container(page):
+            for sel in NOTE_ERROR_SELECTORS:
+                try:
+                    err = page.locator(sel).first
+                    if err.count() > 0 and err.is_visible():
+                        print(f"[DEBUG] 检测到错误元素: {sel}")
+                        return UNVIEWABLE_ERROR_ELEMENT
+                except Exception:
+                    continue
                 
         # 检查页面是否有正常的笔记内容
-        content_indicators = [
-            # 标题相关
-            "h1", "h2", "[class*='title']", "[data-testid='title']",
-            # 内容相关
-            "[class*='content']", ".note-content", "section[class*='content']", "[data-testid='content']",
-            # 作者信息
-            "[class*='author']", "[class*='user']", "[data-testid='author']",
-            # 互动元素
-            "[class*='like']", "[class*='comment']", "[class*='collect']",
-            # 图片容器
-            "[class*='image']", "[class*='photo']", "[class*='img']",
-        ]
-        
         has_content = False
         content_details = []
         
-        for sel in content_indicators:
+        for sel in NOTE_CONTENT_SELECTORS:
             try:
                 elements = page.locator(sel)
                 if elements.count() > 0:
@@ -959,8 +1037,7 @@ def _is_note_unviewable(page) -> bool:
         if not has_content:
             try:
                 # 检查是否有小红书的主要容器
-                main_selectors = ["main", ".main", "[class*='main']", "#main"]
-                for sel in main_selectors:
+                for sel in NOTE_MAIN_SELECTORS:
                     try:
                         main_elem = page.locator(sel).first
                         if main_elem.count() > 0 and main_elem.is_visible():
@@ -977,16 +1054,99 @@ def _is_note_unviewable(page) -> bool:
             print(f"[DEBUG] 页面未检测到正常内容")
             print(f"[DEBUG] 页面URL: {page.url}")
             print(f"[DEBUG] 页面标题: {page.title() or '无'}")
-            return True
+            return UNVIEWABLE_NO_CONTENT
         else:
             print(f"[DEBUG] 检测到页面内容: {content_details[:2]}")
             
     except Exception as e:
         print(f"[DEBUG] 不可浏览检测异常: {e}")
         
+    return None
+
+
+def _has_note_container(page) -> bool:
+    for sel in NOTE_CONTAINER_SELECTORS:
+        try:
+            if page.locator(sel).count() > 0:
+                return True
+        except Exception:
+            continue
+    return False
+
+
+@PROFILER.phased("detail_extraction")
+def extract_note_detail(page, fallback_timeout_ms: int = 1000) -> NoteDetail:
+    # 优先使用页面内嵌的初始状态 JSON（与 URL 中的笔记 ID 对应时），缺失字段用 DOM 文本补齐；
+    # 单次 evaluate 同时取回两者，脚本执行失败时回退到逐字段 get_first_text
+    url = page.url
+    try:
+        values = page.evaluate(_NOTE_DETAIL_JS, DETAIL_FIELD_SELECTORS) or {}
+    except Exception as e:
+        print(f"[DEBUG] 批量提取详情失败，回退逐个提取: {e}")
+        values = {
+            name: get_first_text(page, selectors, timeout_ms=fallback_timeout_ms)
+            for name, selectors in DETAIL_FIELD_SELECTORS.items()
+        }
+    return _note_detail_from_values(values, url)
+
+
+def like_note(page) -> bool:
+    # 未点赞则点赞，返回点赞后（或原本）是否处于已点赞状态；按钮选择器与点击方式表与异步引擎共用（xhs_page）
+    print("检查点赞状态...")
+    like_button = None
+    for selector in LIKE_BUTTON_SELECTORS:
+        try:
+            btn = page.locator(selector).first
+            if btn.count() > 0 and btn.is_visible():
+                like_button = btn
+                print(f"找到点赞按钮: {selector}")
+                break
+        except Exception:
+            continue
+    if like_button is None:
+        print("未找到点赞按钮")
+        return False
+    try:
+        if _button_shows_liked(like_button.text_content(), like_button.get_attribute("aria-pressed")):
+            print("笔记已点赞")
+            return True
+    except Exception as e:
+        print(f"检查点赞状态异常: {e}")
+        return False
+    print("笔记未点赞，准备点赞...")
+    page.wait_for_timeout(LIKE_PRE_CLICK_WAIT_MS)
+    for i, (method, args, kwargs) in enumerate(LIKE_CLICK_METHODS):
+        try:
+            getattr(like_button, method)(*args, **kwargs)
+        except Exception as click_error:
+            print(f"点赞方法 {i+1} 失败: {click_error}")
+            continue
+        print(f"点赞方法 {i+1} 执行成功")
+        print("✅ 点赞成功！")
+        page.wait_for_timeout(LIKE_SETTLE_MS)
+        return True
+    print("❌ 点赞失败")
     return False
 
 
+def _return_to_feed(page, home_url: str, lean: Optional[LeanNetwork] = None):
+    # 详情在首页标签内打开（同页导航）时后退回推荐流，保留已排队候选卡片所在的页面；后退失败才重新加载首页
+    # 精简网络只在扫描推荐流时生效：打开详情前已移除，回到推荐流时重新安装
+    if lean is not None:
+        lean.install(page)
+    if NoteKey.from_url(page.url) is None:
+        return
+    try:
+        page.go_back(wait_until="domcontentloaded", timeout=10000)
+    except Exception:
+        pass
+    if NoteKey.from_url(page.url) is not None:
+        try:
+            ensure_home_loaded(page, home_url=home_url or HOMEPAGE_URL)
+        except Exception:
+            pass
+
+
 def run(
     rules: List[Tuple[Set[str], str]],
     max_refresh: int,
@@ -1002,6 +1162,19 @@ def run(
     specific_account: Optional[str] = None,
     enable_auto_reply: bool = False,
     reply_file_path: str = REPLY_CONTENT_FILE,
+    open_mode: str = "auto",
+    lean_network: bool = False,
+    seen_index_path: Optional[str] = None,
+    unviewable_ttl_sec: float = DEFAULT_UNVIEWABLE_TTL_SEC,
+    stream_output: Any = None,
+    max_matches: int = 0,
+    stream: bool = False,
+    capture_feed: bool = False,
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    rules_reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    incremental: bool = True,
+    debug: bool = False,
 ):
     if not rules:
         raise ValueError("至少需要一个关键词")
@@ -1031,25 +1204,9 @@ def run(
                 current_account = get_next_account()
                 print(f"选择账户: {current_account}")
 
-    with sync_playwright() as p:
+    with sync_playwright() as p, closing_detail_pools():
         # 优先尝试系统 Chrome，不可用则回退到内置 Chromium
-        launch_args = [
-            "--disable-blink-features=AutomationControlled",
-            "--disable-gpu",
-            "--no-sandbox",
-            "--disable-dev-shm-usage",
-            "--disable-web-security",
-            "--disable-features=VizDisplayCompositor",
-            "--disable-background-timer-throttling",
-            "--disable-backgrounding-occluded-windows",
-            "--disable-renderer-backgrounding",
-            "--disable-ipc-flooding-protection",
-            "--enable-automation",
-            "--start-maximized",
-        ]
-        launch_kwargs = {"headless": headless, "args": launch_args}
-        if proxy_server:
-            launch_kwargs["proxy"] = {"server": proxy_server}
+        launch_kwargs = browser_launch_options(headless, proxy_server)
         try:
             browser = p.chromium.launch(channel="chrome", **launch_kwargs)
         except Exception:
@@ -1061,31 +1218,16 @@ def run(
             auth_path = get_account_auth_path(current_account)
             print(f"使用账户认证文件: {auth_path}")
         
-        context = (
-            browser.new_context(
-                storage_state=auth_path,
-                locale="zh-CN",
-                timezone_id="Asia/Shanghai",
-                user_agent=(
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                    "(KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
-                ),
-                viewport={"width": 1366, "height": 900},
-                ignore_https_errors=True,
-            )
-            if os.path.exists(auth_path)
-            else browser.new_context(
-                locale="zh-CN",
-                timezone_id="Asia/Shanghai",
-                user_agent=(
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                    "(KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
-                ),
-                viewport={"width": 1366, "height": 900},
-                ignore_https_errors=True,
-            )
-        )
+        context = browser.new_context(**browser_context_options(auth_path))
         page = context.new_page()
+        # 精简网络：扫描页不加载图片/视频/字体/统计上报（登录页放行，保证二维码可见）
+        lean = LeanNetwork(bypass=_is_login_page) if lean_network else None
+        if lean:
+            lean.install(page)
+        # 推荐流接口捕获：需在打开首页之前监听，才能收到首屏数据
+        capture = FeedCapture() if capture_feed else None
+        if capture:
+            capture.install(page)
         # 首次进入首页：若跳转到登录页，则不进行任何刷新或重试，等待用户登录
         ensure_home_loaded(page, home_url=home_url, stop_if_login=True)
 
@@ -1102,26 +1244,60 @@ def run(
             if not logged_in:
                 print("登录超时，退出。")
                 context.storage_state(path=AUTH_STATE_PATH)
+                close_detail_pool(context)
                 context.close()
                 browser.close()
                 return
             # 登录成功后，确保跳转到首页
             ensure_home_loaded(page, home_url=home_url)
 
-        matched = None
-        matched_keyword = None
-        matched_field = None
-        excluded_urls = set()  # 记录已经访问过的不可浏览链接
-        visited_urls = set()   # 记录已经访问过的链接
-        # 关键词匹配配置（可扩展为参数）
-        find_card_link_by_keywords.use_regex = False
-        find_card_link_by_keywords.exact = False
-        find_card_link_by_keywords.case_sensitive = False
+        excluded_notes = set()  # 记录已经访问过的不可浏览笔记（NoteKey）
+        visited_notes = set()   # 记录已经访问过的笔记（NoteKey）
+        # 关键词规则与排除规则只编译一次（匹配配置沿用命令行注入的函数属性）
+        # 监视关键词文件时由 rules_reloader 持有当前规则集，文件变化后在两步滚动之间换用新规则集
+        if rules_reloader is not None:
+            ruleset = rules_reloader.ruleset
+            print(f"正在监视关键词文件 {rules_reloader.keywords_file}，修改后在下一步滚动前生效")
+        else:
+            ruleset = compile_rules(rules, exclude_rules=exclude_rules, **_match_options())
+        if exclude_rules:
+            print(f"已加载 {len(ruleset.exclude_rules)} 条排除规则，命中的卡片将被跳过")
+        # 本次运行中各打开方式的成功率（auto 模式使用）
+        open_stats = OpenStrategyStats()
+        # 跨运行的已处理笔记索引（首次查询时才读取文件）
+        seen_index = _open_seen_index(seen_index_path, unviewable_ttl_sec)
+
+        # 流式模式：持续滚动/刷新并输出所有命中卡片（JSON Lines），不进入详情
+        if stream:
+            print(f"流式模式：输出全部命中卡片（最多刷新 {max_refresh} 次）…")
+            count = stream_matching_cards(
+                page,
+                ruleset,
+                stream_output,
+                max_matches=max_matches,
+                max_scroll_steps=per_refresh_scroll_steps,
+                seen_index=seen_index,
+                max_refresh=max_refresh,
+                refresh_interval_sec=refresh_interval_sec,
+                capture=capture,
+                reloader=rules_reloader,
+                card_dump=card_dump,
+                incremental=incremental,
+                debug=debug,
+            )
+            print(f"流式模式结束，共输出 {count} 条命中卡片")
+            context.storage_state(path=auth_path)
+            close_detail_pool(context)
+            context.close()
+            browser.close()
+            return
 
         search_attempts = 0
         max_search_attempts = max_refresh * 2  # 增加搜索次数
-        
-        while search_attempts < max_search_attempts and not matched:
+        # 已扫描到、尚未打开的命中卡片（按规则顺序排列）：不可浏览时直接打开下一个，无需回首页重新扫描
+        candidates = CandidateQueue(ruleset)
+
+        while candidates or search_attempts < max_search_attempts:
             # 检查是否需要切换账户
             if enable_multi_account and account_switch_count > 0 and account_switch_count % account_switch_interval == 0:
                 print(f"已进行 {account_switch_count} 次搜索，准备切换账户...")
@@ -1134,6 +1310,7 @@ def run(
                     # 关闭当前context
                     try:
                         context.storage_state(path=auth_path)
+                        close_detail_pool(context)
                         context.close()
                     except:
                         pass
@@ -1144,31 +1321,13 @@ def run(
                     print(f"使用新的认证文件: {auth_path}")
                     
                     # 创建新的context
-                    context = (
-                        browser.new_context(
-                            storage_state=auth_path,
-                            locale="zh-CN",
-                            timezone_id="Asia/Shanghai",
-                            user_agent=(
-                                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                                "(KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
-                            ),
-                            viewport={"width": 1366, "height": 900},
-                            ignore_https_errors=True,
-                        )
-                        if os.path.exists(auth_path)
-                        else browser.new_context(
-                            locale="zh-CN",
-                            timezone_id="Asia/Shanghai",
-                            user_agent=(
-                                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                                "(KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
-                            ),
-                            viewport={"width": 1366, "height": 900},
-                            ignore_https_errors=True,
-                        )
-                    )
+                    context = browser.new_context(**browser_context_options(auth_path))
                     page = context.new_page()
+                    if lean:
+                        lean.install(page)
+                    if capture:
+                        capture.uninstall()
+                        capture.install(page)
                     
                     # 重新加载首页
                     ensure_home_loaded(page, home_url=home_url, stop_if_login=True)
@@ -1176,281 +1335,191 @@ def run(
                     # 重置搜索状态
                     search_attempts = 0
                     account_switch_count = 0
-                    excluded_urls.clear()
-                    visited_urls.clear()
+                    excluded_notes.clear()
+                    visited_notes.clear()
+                    candidates.clear()
                     
                     print(f"账户切换完成，继续搜索...")
                     continue
                 else:
                     print("没有其他可切换的账户，继续使用当前账户")
-            search_attempts += 1
-            # 若中途仍处于登录页，暂停查找与刷新，仅等待登录完成
-            if _is_login_page(page.url) or _dom_looks_like_login(page):
-                print("检测到仍在登录页，暂停刷新与查找，等待扫码完成…")
-                deadline = time.time() + max(2, int(refresh_interval_sec))
-                while time.time() < deadline:
+            if not candidates:
+                search_attempts += 1
+                # 若中途仍处于登录页，暂停查找与刷新，仅等待登录完成
+                if _is_login_page(page.url) or _dom_looks_like_login(page):
+                    print("检测到仍在登录页，暂停刷新与查找，等待扫码完成…")
+                    deadline = time.time() + max(2, int(refresh_interval_sec))
+                    while time.time() < deadline:
+                        if (not _is_login_page(page.url)) and (not _dom_looks_like_login(page)):
+                            break
+                        page.wait_for_timeout(500)
+                    # 登录完成后确保跳回首页
                     if (not _is_login_page(page.url)) and (not _dom_looks_like_login(page)):
-                        break
-                    page.wait_for_timeout(500)
-                # 登录完成后确保跳回首页
-                if (not _is_login_page(page.url)) and (not _dom_looks_like_login(page)):
+                        try:
+                            ensure_home_loaded(page, home_url=home_url)
+                        except Exception:
+                            pass
+                    # 进入下一轮重试（不会触发刷新分支）
+                    continue
+                print(f"第 {search_attempts}/{max_search_attempts} 轮：在首页查找关键词规则 …")
+                queued = queue_matching_cards(
+                    page,
+                    ruleset,
+                    candidates,
+                    exclude_urls=visited_notes,
+                    max_scroll_steps=per_refresh_scroll_steps,
+                    seen_index=seen_index,
+                    capture=capture,
+                    reloader=rules_reloader,
+                    card_dump=card_dump,
+                    incremental=incremental,
+                    debug=debug,
+                )
+                if rules_reloader is not None:
+                    ruleset = rules_reloader.ruleset
+                if lean:
+                    print(f"精简网络：{lean.summary()}")
+                if capture:
+                    print(f"接口捕获：{capture.summary()}")
+                if not queued:
+                    # 如果处于登录页，严格不刷新，直接继续等待下一轮
+                    if _is_login_page(page.url):
+                        page.wait_for_timeout(int(max(0.2, refresh_interval_sec) * 1000))
+                        continue
+                    # 没有找到匹配的，刷新页面
+                    # 增加账户切换计数
+                    if enable_multi_account:
+                        account_switch_count += 1
                     try:
-                        ensure_home_loaded(page, home_url=home_url)
+                        page.reload(wait_until="domcontentloaded", timeout=20000)
+                        # 卡片出现即可继续，无需等待网络空闲
+                        wait_for_feed_ready(page, timeout_ms=6000, debug=debug)
                     except Exception:
-                        pass
-                # 进入下一轮重试（不会触发刷新分支）
+                        # 若异常且不是登录页，再尝试回到首页
+                        if not _is_login_page(page.url):
+                            ensure_home_loaded(page, home_url=home_url)
+                    time.sleep(refresh_interval_sec)
+                    continue
+                print(f"本轮命中 {queued} 张卡片，按规则顺序依次尝试")
+
+            # 处理排在最前的命中卡片
+            candidate = candidates.pop(visited_notes)
+            if candidate is None:
                 continue
-            print(f"第 {search_attempts}/{max_search_attempts} 轮：在首页查找关键词规则 …")
-            res = find_card_link_by_keywords(
-                page,
-                rules,
-                exclude_urls=visited_urls,
-                max_scroll_steps=per_refresh_scroll_steps,
+            matched, matched_href, matched_keyword, matched_field = candidate
+            print(f"已命中关键词：{matched_keyword}（字段：{matched_field}），尝试进入详情…")
+            print("命中卡片 href:", matched_href)
+            # 卡片已不在页面上（例如接口数据尚未渲染）时直接按链接打开
+            if matched is not None and not _anchor_present(matched):
+                matched = None
+            # 详情可能在首页标签内打开（点击同页导航或直接跳转的回退），不拦截其图片和视频
+            if lean:
+                lean.uninstall()
+            detail_page = _open_card_detail(
+                page, matched, href=matched_href, wait_timeout_ms=20000, open_mode=open_mode, stats=open_stats
             )
-            if res:
-                matched, matched_keyword, matched_field = res
-                break
-            # 如果处于登录页，严格不刷新，直接继续等待下一轮
-            if _is_login_page(page.url):
-                page.wait_for_timeout(int(max(0.2, refresh_interval_sec) * 1000))
+            print(f"打开方式统计（成功/尝试）: {open_stats.summary()}")
+            if detail_page is None:
+                print("进入详情失败：未能完成跳转。")
+                # 本次运行不再尝试打开同一篇笔记
+                visited_notes.update(_note_keys(matched_href))
+                _return_to_feed(page, home_url, lean)
                 continue
-                
-            # 如果没有找到匹配的，刷新页面
-            if not matched:
-                # 增加账户切换计数
-                if enable_multi_account:
-                    account_switch_count += 1
-                
+
+            # 检测不可浏览则记录并跳过（_open_card_detail 已等待详情就绪）
+            unviewable_reason = _unviewable_reason(detail_page)
+            if unviewable_reason:
                 try:
-                    page.reload(wait_until="domcontentloaded", timeout=20000)
-                    try:
-                        page.wait_for_load_state("networkidle", timeout=6000)
-                    except PWTimeout:
-                        pass
+                    bad_url = detail_page.url
                 except Exception:
-                    # 若异常且不是登录页，再尝试回到首页
-                    if not _is_login_page(page.url):
-                        ensure_home_loaded(page, home_url=home_url)
-                time.sleep(refresh_interval_sec)
+                    bad_url = ""
+                # 将不可浏览的笔记加入排除列表（按笔记 ID，与链接形式无关）
+                bad_keys = _note_keys(matched_href, bad_url)
+                visited_notes.update(bad_keys)
+                excluded_notes.update(bad_keys)
+                print("检测到当前笔记不可浏览，跳过：", bad_url)
+                _remember_unviewable(seen_index, unviewable_reason, matched_href, bad_url)
+                # 归还当前详情页（重置后留给下一篇笔记复用）；同页打开的则回到推荐流
+                release_detail_page(page, detail_page)
+                _return_to_feed(page, home_url, lean)
+                print(f"继续尝试其他匹配的笔记（队列中还有 {len(candidates)} 张）...")
+                continue
 
-  # 处理找到的匹配结果
-        if matched:
-            print(f"已命中关键词：{matched_keyword}（字段：{matched_field}），尝试进入详情…")
+            # 只有当笔记可浏览时才提取详情
+            detail = extract_note_detail(detail_page)
+
+            print_note_detail(detail)
+
+            # 将成功访问的URL加入已访问列表
             try:
-                href_dbg = matched.get_attribute("href")
-                if href_dbg:
-                    print("命中卡片 href:", href_dbg)
+                success_url = detail_page.url
+                visited_notes.update(_note_keys(matched_href, success_url))
+                _remember_note(seen_index, STATUS_VISITED, matched_href, success_url)
             except Exception:
                 pass
-            detail_page = _open_card_detail(page, matched, wait_timeout_ms=20000)
-            if detail_page is None:
-                print("进入详情失败：未能完成跳转。")
-                # 重置匹配状态，继续搜索
-                matched = None
-                # 跳过当前循环的其余部分，直接进入下一轮
-                pass
-            else:
+            
+            # 检查是否已点赞，未点赞则进行点赞（除非禁用了点赞功能）
+            is_liked = False
+            if not no_like:
                 try:
-                    detail_page.wait_for_load_state("networkidle", timeout=8000)
-                except PWTimeout:
-                    pass
-
-                # 检测不可浏览则记录并跳过
-                if _is_note_unviewable(detail_page):
-                    try:
-                        bad_url = detail_page.url
-                        # 将不可浏览的URL加入排除列表
-                        if bad_url:
-                            visited_urls.add(bad_url)
-                            excluded_urls.add(bad_url)
-                    except Exception:
-                        bad_url = ""
-                    print("检测到当前笔记不可浏览，跳过：", bad_url)
-                    
-                    # 关闭当前详情页
-                    try:
-                        detail_page.close()
-                    except:
-                        pass
-                        
-                    # 等待一段时间再继续搜索，避免频率过高
-                    print("等待5秒后继续搜索其他笔记...")
-                    time.sleep(5)
+                    is_liked = like_note(detail_page)
+                except Exception as e:
+                    print(f"点赞功能异常: {e}")
+            else:
+                print("已禁用自动点赞功能")
+            
+            # 如果已点赞且启用了自动回复功能，则进行评论
+            if is_liked and enable_auto_reply:
+                print("检测到已点赞，准备自动回复...")
+                
+                # 获取随机回复内容
+                reply_content = get_random_reply(reply_file_path)
+                if reply_content:
+                    print(f"随机获取回复内容: {reply_content}")
                     
-                    # 返回首页继续搜索
-                    try:
-                        home_url_final = home_url or HOMEPAGE_URL
-                        ensure_home_loaded(page, home_url=home_url_final)
-                    except Exception:
-                        pass
-                        
-                    print("继续搜索其他匹配的笔记...")
-                    # 重置匹配状态，继续搜索
-                    matched = None
-                    matched_keyword = None
-                    matched_field = None
-                else:
-                    # 只有当笔记可浏览时才提取详情
-                    title = get_first_text(detail_page, ["h1", "h1[class*='title']", "div[class*='title'] h1"])
-                    author = get_first_text(detail_page, ["a[href*='/user/']", "span[class*='name']", "div[class*='author'] a"])
-                    content = get_first_text(detail_page, ["div[class*='content']", "section[class*='content']", "div.note-content"])
-                    like = get_first_text(detail_page, ["[class*='like'] span", "button[aria-label*='赞'] span"])
-                    comment = get_first_text(detail_page, ["[class*='comment'] span", "button[aria-label*='评'] span"])
-                    collect = get_first_text(detail_page, ["[class*='collect'] span", "button[aria-label*='藏'] span"])
-
-                    print("详情页URL:", detail_page.url)
-                    print("标题:", title or "")
-                    print("作者:", author or "")
-                    print("正文预览:", (content or "")[:200])
-                    print("点赞:", like or "")
-                    print("评论:", comment or "")
-                    print("收藏:", collect or "")
-
-                    # 将成功访问的URL加入已访问列表
-                    try:
-                        success_url = detail_page.url
-                        if success_url:
-                            visited_urls.add(success_url)
-                    except Exception:
-                        pass
+                    # 等待一下再进行评论
+                    detail_page.wait_for_timeout(2000)
                     
-                    # 检查是否已点赞，未点赞则进行点赞（除非禁用了点赞功能）
-                    is_liked = False
-                    if not no_like:
-                        print("检查点赞状态...")
-                        try:
-                            # 查找点赞按钮
-                            like_button_selectors = [
-                                "button[aria-label*='赞']",
-                                "button[class*='like']",
-                                "[data-testid='like-button']",
-                                ".like-button",
-                                "button:has-text('赞')"
-                            ]
-                            
-                            like_button = None
-                            for selector in like_button_selectors:
-                                try:
-                                    btn = detail_page.locator(selector).first
-                                    if btn.count() > 0 and btn.is_visible():
-                                        like_button = btn
-                                        print(f"找到点赞按钮: {selector}")
-                                        break
-                                except Exception:
-                                    continue
-                            
-                            if like_button:
-                                # 检查是否已点赞
-                                try:
-                                    # 检查按钮的激活状态或文本
-                                    button_text = like_button.text_content() or ""
-                                    if "已赞" in button_text or like_button.get_attribute("aria-pressed") == "true":
-                                        is_liked = True
-                                        print("笔记已点赞")
-                                    else:
-                                        print("笔记未点赞，准备点赞...")
-                                        
-                                        # 等待一下再点击
-                                        detail_page.wait_for_timeout(1000)
-                                        
-                                        # 尝试多种点击方式
-                                        click_methods = [
-                                            lambda: like_button.click(timeout=3000),
-                                            lambda: like_button.click(force=True, timeout=3000),
-                                            lambda: like_button.evaluate("el => el.click()"),
-                                            lambda: like_button.click(delay=100, timeout=3000)
-                                        ]
-                                        
-                                        for i, method in enumerate(click_methods):
-                                            try:
-                                                method()
-                                                print(f"点赞方法 {i+1} 执行成功")
-                                                is_liked = True
-                                                break
-                                            except Exception as click_error:
-                                                print(f"点赞方法 {i+1} 失败: {click_error}")
-                                                continue
-                                        
-                                        if is_liked:
-                                            print("✅ 点赞成功！")
-                                            # 等待点赞完成
-                                            detail_page.wait_for_timeout(2000)
-                                        else:
-                                            print("❌ 点赞失败")
-                                except Exception as e:
-                                    print(f"检查点赞状态异常: {e}")
-                            else:
-                                print("未找到点赞按钮")
-                                
-                        except Exception as e:
-                            print(f"点赞功能异常: {e}")
+                    # 发表评论
+                    reply_success = post_comment(detail_page, reply_content)
+                    if reply_success:
+                        print("✅ 自动回复成功！")
                     else:
-                        print("已禁用自动点赞功能")
-                    
-                    # 如果已点赞且启用了自动回复功能，则进行评论
-                    if is_liked and enable_auto_reply:
-                        print("检测到已点赞，准备自动回复...")
-                        
-                        # 获取随机回复内容
-                        reply_content = get_random_reply(reply_file_path)
-                        if reply_content:
-                            print(f"随机获取回复内容: {reply_content}")
-                            
-                            # 等待一下再进行评论
-                            detail_page.wait_for_timeout(2000)
-                            
-                            # 发表评论
-                            reply_success = post_comment(detail_page, reply_content)
-                            if reply_success:
-                                print("✅ 自动回复成功！")
-                            else:
-                                print("❌ 自动回复失败")
-                        else:
-                            print("未找到可用回复内容，跳过自动回复")
-                    elif is_liked:
-                        print("笔记已点赞，但自动回复功能未启用")
-                        
-                    detail_page.screenshot(path="detail_snapshot.png", full_page=True)
-                    
-                    # 保存认证状态
-                    context.storage_state(path=auth_path)
-                    
-                    # 记录账户使用情况
-                    if enable_multi_account and current_account:
-                        record_account_usage(current_account, success=True)
-                        print(f"账户 {current_account} 使用成功")
-                    
-                    context.close()
-                    browser.close()
-                    return  # 成功找到并访问了可浏览的笔记，退出程序
-
-        # 如果没有找到匹配的，刷新页面
-        if not matched:
-            try:
-                page.reload(wait_until="domcontentloaded", timeout=20000)
-                try:
-                    page.wait_for_load_state("networkidle", timeout=6000)
-                except PWTimeout:
-                    pass
-            except Exception:
-                # 若异常且不是登录页，再尝试回到首页
-                if not _is_login_page(page.url):
-                    ensure_home_loaded(page, home_url=home_url)
-            time.sleep(refresh_interval_sec)
+                        print("❌ 自动回复失败")
+                else:
+                    print("未找到可用回复内容，跳过自动回复")
+            elif is_liked:
+                print("笔记已点赞，但自动回复功能未启用")
+                
+            detail_page.screenshot(path="detail_snapshot.png", full_page=True)
+            
+            # 保存认证状态
+            context.storage_state(path=auth_path)
+            
+            # 记录账户使用情况
+            if enable_multi_account and current_account:
+                record_account_usage(current_account, success=True)
+                print(f"账户 {current_account} 使用成功")
+            
+            close_detail_pool(context)
+            context.close()
+            browser.close()
+            return  # 成功找到并访问了可浏览的笔记，退出程序
 
-    # 循环结束，未找到可浏览的笔记
-    print(f"未找到任何可浏览的关键词对应卡片（搜索次数={search_attempts}）")
+        # 循环结束，未找到可浏览的笔记
+        print(f"未找到任何可浏览的关键词对应卡片（搜索次数={search_attempts}）")
     
-    # 保存认证状态
-    context.storage_state(path=auth_path)
+        # 保存认证状态
+        context.storage_state(path=auth_path)
     
-    # 记录账户使用情况（失败）
-    if enable_multi_account and current_account:
-        record_account_usage(current_account, success=False)
-        print(f"账户 {current_account} 使用失败")
+        # 记录账户使用情况（失败）
+        if enable_multi_account and current_account:
+            record_account_usage(current_account, success=False)
+            print(f"账户 {current_account} 使用失败")
     
-    context.close()
-    browser.close()
+        close_detail_pool(context)
+        context.close()
+        browser.close()
 
 
 if __name__ == "__main__":
@@ -1466,6 +1535,15 @@ if __name__ == "__main__":
         "--keywords-file",
         help="从文件读取关键词（逐行，支持以 # 开头注释；一行多个可用逗号分隔）。未提供且当前目录存在 keywords.txt 时将自动读取该文件",
     )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        help="排除规则：命中的卡片直接跳过（语法同 --keyword，可多次提供）",
+    )
+    parser.add_argument(
+        "--exclude-file",
+        help="从文件读取排除规则（格式同关键词文件）",
+    )
     parser.add_argument(
         "--match-fields",
         default="title",
@@ -1498,7 +1576,50 @@ if __name__ == "__main__":
     parser.add_argument("--proxy", help="可选代理，如 http://127.0.0.1:7890 或 socks5://127.0.0.1:1080")
     parser.add_argument("--home-url", default=HOMEPAGE_URL, help="首页 URL（如被墙可改为镜像域名）")
     parser.add_argument("--debug", action="store_true", help="调试模式：打印候选卡片示例文本，便于排查")
+    parser.add_argument("--full-scan", action="store_true", help="每步滚动都重新处理全部卡片（默认只处理新渲染的卡片）")
+    parser.add_argument("--profile", action="store_true", help="统计各阶段耗时与 Playwright 调用次数，结束时打印汇总并写出 trace 文件")
+    parser.add_argument("--profile-output", default=PROFILE_TRACE_FILE, help="剖析 trace 文件路径（Chrome trace 格式，默认：profile_trace.json）")
     parser.add_argument("--no-like", action="store_true", help="禁用自动点赞功能")
+    parser.add_argument(
+        "--open-mode",
+        choices=OPEN_MODES,
+        default="auto",
+        help="打开笔记详情的方式：click 依次尝试模拟点击；direct 已知链接时直接在复用的详情标签页中跳转；auto 按本次运行的成功率自动选择（默认）",
+    )
+    parser.add_argument("--lean-network", action="store_true", help="精简网络模式：扫描首页时拦截图片、视频、字体和统计上报请求，节省带宽与渲染开销")
+    parser.add_argument(
+        "--seen-index",
+        nargs="?",
+        const=SEEN_INDEX_FILE,
+        default=None,
+        metavar="PATH",
+        help=f"启用已处理笔记索引，跨运行跳过已访问/不可浏览的笔记（不带路径时为 {SEEN_INDEX_FILE}；默认不启用）",
+    )
+    parser.add_argument(
+        "--unviewable-ttl",
+        type=float,
+        default=DEFAULT_UNVIEWABLE_TTL_SEC / 3600,
+        help="不可浏览判定的有效期（小时），过期后允许重新尝试；0 表示永不过期（默认：24）",
+    )
+    parser.add_argument("--capture-feed", action="store_true", help="监听推荐流接口响应，直接用接口返回的笔记数据匹配规则，只在打开命中卡片时访问页面元素")
+    parser.add_argument("--stream", action="store_true", help="流式模式：持续滚动/刷新，把所有命中卡片以 JSON Lines 输出，不进入详情页")
+    parser.add_argument("--stream-output", default="-", help="流式模式的输出文件（追加写入），- 表示标准输出（默认）")
+    parser.add_argument("--max-matches", type=int, default=0, help="流式模式下输出多少条命中后停止，0 表示不限（默认：0）")
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="使用异步引擎（xhs_async）：详情页加载期间继续扫描推荐流，不可浏览判定与详情提取并发执行；详情总在独立标签页中直接打开",
+    )
+    parser.add_argument(
+        "--dump-cards",
+        help="把扫描时提取到的卡片（href、标题、滚动步数、时间）追加写入 JSON Lines 文件，可用 python xhs_rules.py match 离线回放规则",
+    )
+    parser.add_argument(
+        "--watch-keywords",
+        action="store_true",
+        help="运行中监视关键词文件与排除规则文件，保存修改后在下一步滚动前换用新规则，无需重启",
+    )
     parser.add_argument("--multi-account", action="store_true", help="启用多账户轮流登录模式")
     parser.add_argument("--account-switch-interval", type=int, default=10, help="多账户模式下，每隔多少次搜索切换账户（默认：10次）")
     parser.add_argument("--account", help="指定使用特定账户（仅在多账户模式下有效）")
@@ -1524,54 +1645,156 @@ if __name__ == "__main__":
     default_fields = _parse_fields_token(args.match_fields) or {"title"}
 
     rules: List[Tuple[Set[str], str]] = []
+    exclude_rules: List[Tuple[Set[str], str]] = []
+    # 命令行直接提供的规则（监视文件时与重新读取的文件内容合并）
+    cli_rules: List[Tuple[Set[str], str]] = []
+    cli_exclude_rules: List[Tuple[Set[str], str]] = []
     # 若未指定 --keywords-file 与 --keyword，则默认读取当前目录 keywords.txt（若存在）
     if not args.keywords_file and not args.keyword:
         default_path = os.path.join(os.getcwd(), "keywords.txt")
         if os.path.exists(default_path):
             args.keywords_file = default_path
 
-    if args.keywords_file:
-        rules.extend(read_keywords_from_file(args.keywords_file, default_fields))
-    if args.keyword:
-        # 命令行提供的关键词使用默认字段集合
-        for kw in args.keyword:
+    try:
+        if args.keywords_file:
+            rules.extend(read_keywords_from_file(args.keywords_file, default_fields))
+        if args.keyword:
+            # 命令行提供的关键词使用默认字段集合
+            for kw in args.keyword:
+                k = (kw or "").strip()
+                if not k:
+                    continue
+                parse_rule_expr(k)
+                cli_rules.append((set(default_fields), k))
+        rules.extend(cli_rules)
+        # 排除规则与关键词规则格式相同，使用同一默认字段
+        if args.exclude_file:
+            exclude_rules.extend(read_keywords_from_file(args.exclude_file, default_fields))
+        for kw in args.exclude or []:
             k = (kw or "").strip()
-            if not k:
-                continue
-            rules.append((set(default_fields), k))
+            if k:
+                parse_rule_expr(k)
+                cli_exclude_rules.append((set(default_fields), k))
+        exclude_rules.extend(cli_exclude_rules)
+    except RuleSyntaxError as e:
+        print(f"关键词规则语法错误: {e}")
+        exit(1)
     # 去重
-    if rules:
-        seen_keys: Set[str] = set()
-        uniq_rules: List[Tuple[Set[str], str]] = []
-        for fset, kw in rules:
-            key = ",".join(sorted(fset)) + "|" + kw.lower()
-            if key in seen_keys:
-                continue
-            seen_keys.add(key)
-            uniq_rules.append((fset, kw))
-        rules = uniq_rules
+    rules = dedupe_rules(rules)
+    exclude_rules = dedupe_rules(exclude_rules)
 
     # 将匹配配置注入到查找函数的属性上
     find_card_link_by_keywords.use_regex = bool(args.regex)
     find_card_link_by_keywords.exact = bool(args.exact)
     find_card_link_by_keywords.case_sensitive = bool(args.case_sensitive)
-    find_card_link_by_keywords.debug = bool(args.debug)
-
-    run(
-        rules=rules,
-        max_refresh=args.max_refresh,
-        per_refresh_scroll_steps=args.scroll_steps,
-        refresh_interval_sec=args.interval,
-        headless=args.headless,
-        login_timeout_sec=args.login_timeout,
-        proxy_server=args.proxy,
-        home_url=args.home_url,
-        no_like=args.no_like,
-        enable_multi_account=args.multi_account,
-        account_switch_interval=args.account_switch_interval,
-        specific_account=args.account,
-        enable_auto_reply=args.auto_reply,
-        reply_file_path=args.reply_file,
-    )
+
+    # 监视关键词文件：规则集由 reloader 持有，文件变化后重新编译
+    rules_reloader = None
+    if args.watch_keywords:
+        if args.keywords_file:
+            rules_reloader = RuleSetReloader(
+                args.keywords_file,
+                default_fields,
+                extra_rules=cli_rules,
+                exclude_file=args.exclude_file,
+                extra_exclude_rules=cli_exclude_rules,
+                compile_options=_match_options(),
+            )
+        else:
+            print("未使用关键词文件，忽略 --watch-keywords")
+
+    # 流式输出到标准输出时，其余日志改写到标准错误，保证标准输出是纯 JSON Lines
+    stream_output = args.stream_output
+    log_redirect = contextlib.nullcontext()
+    if args.stream and stream_output == "-":
+        stream_output = sys.stdout
+        log_redirect = contextlib.redirect_stdout(sys.stderr)
+
+    # 异步引擎与同步引擎共用扫描、候选队列与详情标签页池（xhs_scan），其余功能尚未移植：明确拒绝，不改用同步引擎
+    if args.use_async:
+        sync_only = [
+            flag
+            for flag, enabled in (
+                ("--multi-account", args.multi_account),
+                ("--auto-reply", args.auto_reply),
+                ("--lean-network", args.lean_network),
+                ("--stream", args.stream),
+                ("--profile", args.profile),
+                ("--open-mode click", args.open_mode == "click"),
+            )
+            if enabled
+        ]
+        if sync_only:
+            print(f"异步引擎暂不支持 {', '.join(sync_only)}，请去掉这些参数或不使用 --async")
+            exit(1)
+
+    # 卡片转储：两个引擎共用同一个写入器，结束时（包括异常退出）关闭一次
+    card_dump = CardDumpWriter(args.dump_cards) if args.dump_cards else None
+    if args.profile:
+        PROFILER.enable()
+    with log_redirect:
+        try:
+            if args.use_async:
+                import xhs_async
+
+                xhs_async.run(
+                    rules=rules,
+                    max_refresh=args.max_refresh,
+                    per_refresh_scroll_steps=args.scroll_steps,
+                    refresh_interval_sec=args.interval,
+                    headless=args.headless,
+                    login_timeout_sec=args.login_timeout,
+                    proxy_server=args.proxy,
+                    home_url=args.home_url,
+                    no_like=args.no_like,
+                    seen_index_path=args.seen_index,
+                    unviewable_ttl_sec=args.unviewable_ttl * 3600,
+                    exclude_rules=exclude_rules,
+                    capture_feed=args.capture_feed,
+                    rules_reloader=rules_reloader,
+                    card_dump=card_dump,
+                    incremental=not args.full_scan,
+                    debug=args.debug,
+                    # 匹配配置显式传入：异步引擎不读取本模块查找函数上的属性
+                    **_match_options(),
+                )
+            else:
+                run(
+                    rules=rules,
+                    max_refresh=args.max_refresh,
+                    per_refresh_scroll_steps=args.scroll_steps,
+                    refresh_interval_sec=args.interval,
+                    headless=args.headless,
+                    login_timeout_sec=args.login_timeout,
+                    proxy_server=args.proxy,
+                    home_url=args.home_url,
+                    no_like=args.no_like,
+                    enable_multi_account=args.multi_account,
+                    account_switch_interval=args.account_switch_interval,
+                    specific_account=args.account,
+                    enable_auto_reply=args.auto_reply,
+                    reply_file_path=args.reply_file,
+                    open_mode=args.open_mode,
+                    lean_network=args.lean_network,
+                    seen_index_path=args.seen_index,
+                    unviewable_ttl_sec=args.unviewable_ttl * 3600,
+                    stream=args.stream,
+                    stream_output=stream_output,
+                    max_matches=args.max_matches,
+                    capture_feed=args.capture_feed,
+                    exclude_rules=exclude_rules,
+                    rules_reloader=rules_reloader,
+                    card_dump=card_dump,
+                    incremental=not args.full_scan,
+                    debug=args.debug,
+                )
+        finally:
+            if card_dump is not None:
+                card_dump.close()
+                print(f"已转储 {card_dump.count} 张卡片到 {args.dump_cards}")
+            if args.profile:
+                PROFILER.print_summary()
+                PROFILER.write_trace(args.profile_output)
+                print(f"剖析 trace 已写入 {args.profile_output}")
 
 
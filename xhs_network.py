@@ -0,0 +1,195 @@
+"""
+网络层辅助：
+
+- 扫描时的精简网络模式（--lean-network）：拦截图片、音视频、字体和统计上报请求。
+  匹配器和卡片提取只读取 DOM 文本、href 和 img 的 alt 属性，这些资源对扫描没有用处。
+  路由只注册按 URL 正则筛选的模式，其余请求（页面脚本、样式、接口）不经过 Python 处理。
+- 推荐流接口捕获（--capture-feed）：监听推荐流接口的响应，直接得到结构化的笔记列表。
+"""
+import inspect
+import re
+from typing import Optional, List, Dict, Callable
+
+from xhs_notes import FeedNote, parse_feed_response
+
+
+# 拦截的资源类型
+LEAN_BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+# 按扩展名识别的静态资源
+LEAN_BLOCKED_EXTENSIONS = [
+    "png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp",
+    "mp4", "webm", "m3u8", "ts", "mp3", "m4a",
+    "woff", "woff2", "ttf", "otf", "eot",
+]
+# 图片/视频 CDN：同域名下的脚本和样式仍然放行，只拦截 LEAN_BLOCKED_RESOURCE_TYPES
+LEAN_MEDIA_HOSTS = ["xhscdn.com"]
+# 统计与监控上报，整个域名拦截
+LEAN_TRACKER_HOSTS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "hm.baidu.com",
+    "cnzz.com",
+    "sentry.io",
+    "apm-fe.xiaohongshu.com",
+    "t2.xiaohongshu.com",
+]
+
+
+def _host_pattern(hosts: List[str]) -> str:
+    return r"^[a-z]+://(?:[^/?#]*\.)?(?:" + "|".join(re.escape(h) for h in hosts) + r")(?::\d+)?(?:[/?#]|$)"
+
+
+_EXTENSION_RE = re.compile(
+    r"^[^?#]*\.(?:" + "|".join(LEAN_BLOCKED_EXTENSIONS) + r")(?:[?#]|$)", re.IGNORECASE
+)
+_MEDIA_HOST_RE = re.compile(_host_pattern(LEAN_MEDIA_HOSTS), re.IGNORECASE)
+_TRACKER_RE = re.compile(_host_pattern(LEAN_TRACKER_HOSTS), re.IGNORECASE)
+# 注册给 page.route 的总模式：只有可能被拦截的请求才会交给处理函数
+LEAN_ROUTE_RE = re.compile(
+    "|".join(f"(?:{rx.pattern})" for rx in (_EXTENSION_RE, _MEDIA_HOST_RE, _TRACKER_RE)),
+    re.IGNORECASE,
+)
+
+
+def classify_request(url: str, resource_type: str) -> Optional[str]:
+    """返回拦截原因（tracker/image/media/font），放行返回 None"""
+    if _TRACKER_RE.search(url):
+        return "tracker"
+    if resource_type in LEAN_BLOCKED_RESOURCE_TYPES:
+        return resource_type
+    return None
+
+
+class LeanNetwork:
+    """安装在扫描页上的请求拦截器，统计各类被拦截的请求数"""
+
+    def __init__(self, bypass: Optional[Callable[[str], bool]] = None):
+        # bypass(页面URL) 为真时全部放行（例如登录页需要加载二维码图片）
+        self.bypass = bypass
+        self.blocked: Dict[str, int] = {}
+        self.allowed = 0
+        self._page = None
+        self._handler = None
+
+    def install(self, page):
+        # 已安装在该页面上时不重复注册
+        if self._page is page:
+            return self
+        self.uninstall()
+
+        def handler(route):
+            self._handle(page, route)
+        page.route(LEAN_ROUTE_RE, handler)
+        self._page, self._handler = page, handler
+        return self
+
+    def uninstall(self):
+        """移除拦截（例如在首页标签内打开笔记详情前），之后可再次 install"""
+        page, handler = self._page, self._handler
+        self._page = self._handler = None
+        if page is None:
+            return
+        try:
+            page.unroute(LEAN_ROUTE_RE, handler)
+        except Exception:
+            pass
+
+    def _handle(self, page, route):
+        request = route.request
+        reason = None
+        if not (self.bypass and self.bypass(page.url)):
+            reason = classify_request(request.url, request.resource_type)
+        if reason is None:
+            self.allowed += 1
+            route.continue_()
+            return
+        self.blocked[reason] = self.blocked.get(reason, 0) + 1
+        route.abort("blockedbyclient")
+
+    def total_blocked(self) -> int:
+        return sum(self.blocked.values())
+
+    def summary(self) -> str:
+        parts = [f"{reason} {count}" for reason, count in sorted(self.blocked.items())]
+        return f"已拦截 {self.total_blocked()} 个请求（{', '.join(parts) or '无'}），放行 {self.allowed} 个"
+
+
+# 推荐流接口
+FEED_API_PATTERNS = ["/api/sns/web/v1/homefeed"]
+
+
+class FeedCapture:
+    """监听 page 的 response 事件，收集推荐流接口返回的笔记，供规则直接匹配（同步与异步 API 的 page 都可安装）"""
+
+    def __init__(self, patterns: Optional[List[str]] = None):
+        self.patterns = list(patterns or FEED_API_PATTERNS)
+        self.responses = 0
+        self.notes_seen = 0
+        self.errors = 0
+        self._pending: List[FeedNote] = []
+        self._pages: List[object] = []
+
+    def install(self, page):
+        # 需在打开首页之前安装，才能收到首屏的接口响应
+        page.on("response", self._on_response)
+        self._pages.append(page)
+        return self
+
+    def uninstall(self):
+        for page in self._pages:
+            try:
+                page.remove_listener("response", self._on_response)
+            except Exception:
+                pass
+        self._pages = []
+
+    def matches(self, url: str) -> bool:
+        return any(p in url for p in self.patterns)
+
+    def _on_response(self, response):
+        # 异步 API 下 response.json() 返回协程：返回一个协程，由 page 的事件分发调度执行
+        if not self.matches(response.url):
+            return None
+        try:
+            data = response.json()
+        except Exception:
+            self.errors += 1
+            return None
+        if inspect.isawaitable(data):
+            return self._accept_later(data)
+        self._accept(data)
+        return None
+
+    async def _accept_later(self, pending):
+        try:
+            data = await pending
+        except Exception:
+            self.errors += 1
+            return
+        self._accept(data)
+
+    def _accept(self, data):
+        try:
+            notes = parse_feed_response(data)
+        except Exception:
+            self.errors += 1
+            return
+        self.responses += 1
+        self.notes_seen += len(notes)
+        self._pending.extend(notes)
+
+    def feed(self, data) -> int:
+        """直接送入一份接口 JSON（用于回放录制的响应），返回解析出的笔记数"""
+        notes = parse_feed_response(data)
+        self.responses += 1
+        self.notes_seen += len(notes)
+        self._pending.extend(notes)
+        return len(notes)
+
+    def drain(self) -> List[FeedNote]:
+        """取出上次调用之后新收到的笔记"""
+        notes, self._pending = self._pending, []
+        return notes
+
+    def summary(self) -> str:
+        return f"捕获推荐流响应 {self.responses} 次，笔记 {self.notes_seen} 条，解析失败 {self.errors} 次"
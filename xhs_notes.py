@@ -0,0 +1,357 @@
+"""
+笔记标识与跨运行的已处理笔记索引
+"""
+import os
+import re
+import json
+import time
+from dataclasses import dataclass, asdict
+from urllib.parse import quote
+from typing import Optional, List, Tuple, Dict, Any, Callable, Union
+
+
+# 笔记链接中的 24 位十六进制笔记 ID，兼容推荐流、发现页、搜索结果和个人主页中的链接形式：
+# /explore/<id>、/discovery/item/<id>、/search_result/<id>、/user/profile/<用户ID>/<id>
+_NOTE_ID_RE = re.compile(
+    r"/(?:explore|discovery/item|search_result|user/profile/[0-9a-zA-Z]+)/([0-9a-fA-F]{24})(?![0-9a-zA-Z])"
+)
+
+
+class NoteKey:
+    """笔记的规范标识：只由笔记 ID 决定，与查询参数（xsec_token 等）、相对/绝对链接和路径形式无关"""
+
+    __slots__ = ("note_id",)
+
+    def __init__(self, note_id: str):
+        self.note_id = note_id.lower()
+
+    @classmethod
+    def from_url(cls, url: Optional[str]) -> Optional["NoteKey"]:
+        """从卡片 href 或详情页 URL 中解析，解析不到返回 None"""
+        if not url:
+            return None
+        m = _NOTE_ID_RE.search(url)
+        return cls(m.group(1)) if m else None
+
+    @classmethod
+    def coerce(cls, value: Union["NoteKey", str, None]) -> Union["NoteKey", str, None]:
+        """能解析出笔记 ID 的链接转为 NoteKey，其余原样返回，便于与 NoteKey 混放在同一集合中"""
+        if value is None or isinstance(value, NoteKey):
+            return value
+        return cls.from_url(value) or value
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, NoteKey) and other.note_id == self.note_id
+
+    def __hash__(self) -> int:
+        return hash(self.note_id)
+
+    def __str__(self) -> str:
+        return self.note_id
+
+    def __repr__(self) -> str:
+        return f"NoteKey({self.note_id!r})"
+
+
+def note_id_from_url(url: Optional[str]) -> Optional[str]:
+    """从卡片 href 或详情页 URL 中解析笔记 ID，解析不到返回 None"""
+    key = NoteKey.from_url(url)
+    return key.note_id if key else None
+
+
+# 计数文本中的数量单位
+_COUNT_UNITS = {"万": 10000, "w": 10000, "k": 1000, "千": 1000, "亿": 100000000}
+_COUNT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(万|w|k|千|亿)?", re.IGNORECASE)
+
+
+def parse_count(text: Optional[str]) -> Optional[int]:
+    """把 "1.2万"、"3,456"、"10w+"、"1.5k" 之类的计数文本转为整数；没有数字（如未计数时显示的"赞"）返回 None"""
+    if not text:
+        return None
+    m = _COUNT_RE.search(text.replace(",", ""))
+    if not m:
+        return None
+    value = float(m.group(1))
+    unit = (m.group(2) or "").lower()
+    return int(round(value * _COUNT_UNITS.get(unit, 1)))
+
+
+@dataclass
+class NoteDetail:
+    """详情页提取结果；计数保留原始文本，likes/comments/collects 为解析后的整数
+
+    source 记录数据来源：state（页面内嵌状态 JSON）、dom（页面元素）或 state+dom（两者合并）。
+    """
+
+    __slots__ = ("url", "title", "author", "content", "like_text", "comment_text", "collect_text", "source")
+
+    url: str
+    title: Optional[str]
+    author: Optional[str]
+    content: Optional[str]
+    like_text: Optional[str]
+    comment_text: Optional[str]
+    collect_text: Optional[str]
+    source: str
+
+    @property
+    def likes(self) -> Optional[int]:
+        return parse_count(self.like_text)
+
+    @property
+    def comments(self) -> Optional[int]:
+        return parse_count(self.comment_text)
+
+    @property
+    def collects(self) -> Optional[int]:
+        return parse_count(self.collect_text)
+
+    def to_dict(self) -> Dict[str, object]:
+        data: Dict[str, object] = asdict(self)
+        data.update(likes=self.likes, comments=self.comments, collects=self.collects)
+        return data
+
+
+# 页面内嵌的初始状态：<script>window.__INITIAL_STATE__={...}</script>
+_STATE_MARKER_RE = re.compile(r"window\.__INITIAL_STATE__\s*=\s*")
+# JSON 字符串或裸的 undefined（页面状态是 JS 字面量，undefined 不是合法 JSON）
+_UNDEFINED_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\bundefined\b')
+
+
+def parse_note_state(html: Optional[str]) -> Optional[Dict[str, Any]]:
+    """从页面 HTML（或 script 文本）中解析 window.__INITIAL_STATE__，找不到或无法解析返回 None"""
+    if not html:
+        return None
+    m = _STATE_MARKER_RE.search(html)
+    if not m:
+        return None
+    end = html.find("</script>", m.end())
+    literal = html[m.end(): end if end >= 0 else len(html)].strip().rstrip(";")
+    literal = _UNDEFINED_RE.sub(lambda x: "null" if x.group(0) == "undefined" else x.group(0), literal)
+    try:
+        state = json.loads(literal)
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def note_detail_from_state(state: Optional[Dict[str, Any]], url: str = "") -> Optional[NoteDetail]:
+    """从初始状态中取出 URL 对应笔记（URL 中没有笔记 ID 时取当前笔记）的详情；状态中没有该笔记返回 None"""
+    note_state = (state or {}).get("note") or {}
+    detail_map = note_state.get("noteDetailMap") or {}
+    key = NoteKey.from_url(url)
+    note_id = key.note_id if key else note_state.get("currentNoteId") or note_state.get("firstNoteId")
+    entry = None
+    for map_id, value in detail_map.items():
+        if str(map_id).lower() == str(note_id or "").lower():
+            entry = value
+            break
+    note = (entry or {}).get("note") or {}
+    if not note:
+        return None
+    user = note.get("user") or {}
+    interact = note.get("interactInfo") or {}
+    return NoteDetail(
+        url=url,
+        title=_text(note.get("title")),
+        author=_text(user.get("nickname") or user.get("nickName")),
+        content=_text(note.get("desc")),
+        like_text=_text(interact.get("likedCount")),
+        comment_text=_text(interact.get("commentCount")),
+        collect_text=_text(interact.get("collectedCount")),
+        source="state",
+    )
+
+
+def merge_note_details(primary: Optional[NoteDetail], fallback: NoteDetail) -> NoteDetail:
+    """以 primary 为准，缺失的字段用 fallback 补齐；primary 为 None 时直接返回 fallback"""
+    if primary is None:
+        return fallback
+    values: Dict[str, Any] = {}
+    filled = False
+    for name in NoteDetail.__slots__:
+        if name in ("url", "source"):
+            continue
+        value = getattr(primary, name)
+        if value is None and getattr(fallback, name) is not None:
+            value = getattr(fallback, name)
+            filled = True
+        values[name] = value
+    source = f"{primary.source}+{fallback.source}" if filled else primary.source
+    return NoteDetail(url=primary.url or fallback.url, source=source, **values)
+
+
+@dataclass
+class FeedNote:
+    """推荐流接口返回的一条笔记"""
+
+    __slots__ = ("note_id", "xsec_token", "title", "author", "like_text")
+
+    note_id: str
+    xsec_token: Optional[str]
+    title: str
+    author: str
+    like_text: Optional[str]
+
+    @property
+    def key(self) -> NoteKey:
+        return NoteKey(self.note_id)
+
+    @property
+    def href(self) -> str:
+        # 与推荐流卡片上的链接形式一致
+        if not self.xsec_token:
+            return f"/explore/{self.note_id}"
+        return f"/explore/{self.note_id}?xsec_token={quote(self.xsec_token, safe='=')}&xsec_source=pc_feed"
+
+    def field_values(self) -> Dict[str, str]:
+        # 供规则匹配的字段；title 与页面卡片文本一样包含作者名
+        texts = [t for t in (self.title, self.author) if t]
+        return {"title": " \n".join(texts), "link": self.href}
+
+
+def parse_feed_response(data: Any) -> List[FeedNote]:
+    """解析推荐流接口（/api/sns/web/v1/homefeed）的 JSON，跳过热搜词等非笔记条目"""
+    if not isinstance(data, dict):
+        return []
+    payload = data.get("data") or {}
+    items = payload.get("items") if isinstance(payload, dict) else None
+    notes: List[FeedNote] = []
+    for item in items or []:
+        if not isinstance(item, dict) or item.get("model_type", "note") != "note":
+            continue
+        card = item.get("note_card") or {}
+        note_id = str(item.get("id") or card.get("note_id") or "")
+        if not NoteKey.from_url(f"/explore/{note_id}"):
+            continue
+        user = card.get("user") or {}
+        interact = card.get("interact_info") or {}
+        notes.append(FeedNote(
+            note_id=note_id.lower(),
+            xsec_token=_text(item.get("xsec_token")),
+            title=_text(card.get("display_title") or card.get("title")) or "",
+            author=_text(user.get("nickname") or user.get("nick_name")) or "",
+            like_text=_text(interact.get("liked_count")),
+        ))
+    return notes
+
+
+SEEN_INDEX_FILE = "seen_notes.tsv"
+# 已访问（处理过）的笔记永久跳过；不可浏览的判定按 TTL 过期后允许重试
+STATUS_VISITED = "visited"
+STATUS_UNVIEWABLE = "unviewable"
+SEEN_STATUSES = (STATUS_VISITED, STATUS_UNVIEWABLE)
+DEFAULT_UNVIEWABLE_TTL_SEC = 24 * 3600
+# 文件中的失效行超过有效记录数的该倍数（且不少于 COMPACT_MIN_LINES 行）时自动压缩
+COMPACT_RATIO = 2
+COMPACT_MIN_LINES = 256
+
+
+class SeenNoteIndex:
+    """按笔记 ID 记录已访问/不可浏览笔记的持久化索引
+
+    文件格式为每行一条 "笔记ID<TAB>状态<TAB>时间戳"，只追加写入，同一 ID 以最后一行为准；
+    首次查询时才读取文件，之后的成员判断都是内存字典查找。
+    """
+
+    def __init__(
+        self,
+        path: str = SEEN_INDEX_FILE,
+        unviewable_ttl_sec: float = DEFAULT_UNVIEWABLE_TTL_SEC,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.unviewable_ttl_sec = unviewable_ttl_sec
+        self.clock = clock
+        self._entries: Optional[Dict[str, Tuple[str, float]]] = None
+        self._file_lines = 0
+
+    def _load(self) -> Dict[str, Tuple[str, float]]:
+        if self._entries is not None:
+            return self._entries
+        entries: Dict[str, Tuple[str, float]] = {}
+        lines = 0
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for raw in f:
+                    lines += 1
+                    parts = raw.rstrip("\n").split("\t")
+                    if len(parts) != 3 or parts[1] not in SEEN_STATUSES:
+                        continue
+                    try:
+                        ts = float(parts[2])
+                    except ValueError:
+                        continue
+                    entries[parts[0]] = (parts[1], ts)
+        self._entries = entries
+        self._file_lines = lines
+        if lines >= COMPACT_MIN_LINES and lines > COMPACT_RATIO * max(1, self._live_count()):
+            self.compact()
+        return entries
+
+    def _expired(self, status: str, ts: float) -> bool:
+        if status != STATUS_UNVIEWABLE or self.unviewable_ttl_sec <= 0:
+            return False
+        return self.clock() - ts >= self.unviewable_ttl_sec
+
+    def _live_count(self) -> int:
+        return sum(1 for status, ts in (self._entries or {}).values() if not self._expired(status, ts))
+
+    def status(self, note_id: Optional[str]) -> Optional[str]:
+        """返回笔记的有效状态（visited/unviewable），未记录或已过期返回 None"""
+        if not note_id:
+            return None
+        entry = self._load().get(note_id)
+        if entry is None or self._expired(*entry):
+            return None
+        return entry[0]
+
+    def __contains__(self, note_id: Optional[str]) -> bool:
+        return self.status(note_id) is not None
+
+    def __len__(self) -> int:
+        self._load()
+        return self._live_count()
+
+    def contains_url(self, url: Optional[str]) -> bool:
+        return note_id_from_url(url) in self
+
+    def add(self, note_id: Optional[str], status: str) -> bool:
+        """记录笔记状态并追加写入文件；返回是否记录成功"""
+        if not note_id or status not in SEEN_STATUSES:
+            return False
+        entries = self._load()
+        ts = self.clock()
+        entries[note_id] = (status, ts)
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{note_id}\t{status}\t{int(ts)}\n")
+        self._file_lines += 1
+        return True
+
+    def add_url(self, url: Optional[str], status: str) -> bool:
+        return self.add(note_id_from_url(url), status)
+
+    def compact(self):
+        """丢弃被覆盖和已过期的记录，重写索引文件"""
+        entries = self._load()
+        live: List[Tuple[str, str, float]] = []
+        for note_id, (status, ts) in entries.items():
+            if not self._expired(status, ts):
+                live.append((note_id, status, ts))
+        self._entries = {note_id: (status, ts) for note_id, status, ts in live}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for note_id, status, ts in live:
+                f.write(f"{note_id}\t{status}\t{int(ts)}\n")
+        os.replace(tmp_path, self.path)
+        self._file_lines = len(live)
@@ -0,0 +1,538 @@
+"""
+同步引擎（xhs_find_and_open）与异步引擎（xhs_async）共用的页面逻辑
+
+这里只放与 Playwright API 形式无关的部分：浏览器配置、选择器、浏览器端 JS、
+判定与详情的解析、扫描时的跳过/匹配规则、点赞的点击方式表。两个引擎都从这里导入，
+各自只实现同步或异步的页面调用。
+"""
+import os
+import random
+from typing import Optional, List, Tuple, Set, Dict, Any, Callable
+from urllib.parse import urljoin
+
+from xhs_rules import CompiledRuleSet, compile_rules
+from xhs_notes import (
+    NoteKey,
+    NoteDetail,
+    parse_note_state,
+    note_detail_from_state,
+    merge_note_details,
+    SeenNoteIndex,
+    STATUS_UNVIEWABLE,
+)
+
+
+HOMEPAGE_URL = "https://www.xiaohongshu.com/explore"
+AUTH_STATE_PATH = "auth_state.json"
+
+
+# 浏览器启动参数与上下文配置
+BROWSER_LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-web-security",
+    "--disable-features=VizDisplayCompositor",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-ipc-flooding-protection",
+    "--enable-automation",
+    "--start-maximized",
+]
+BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
+)
+
+
+def browser_launch_options(headless: bool, proxy_server: Optional[str] = None) -> Dict[str, Any]:
+    launch_kwargs: Dict[str, Any] = {"headless": headless, "args": list(BROWSER_LAUNCH_ARGS)}
+    if proxy_server:
+        launch_kwargs["proxy"] = {"server": proxy_server}
+    return launch_kwargs
+
+
+def browser_context_options(auth_path: str) -> Dict[str, Any]:
+    # 认证文件存在时带上登录状态
+    options: Dict[str, Any] = {
+        "locale": "zh-CN",
+        "timezone_id": "Asia/Shanghai",
+        "user_agent": BROWSER_USER_AGENT,
+        "viewport": {"width": 1366, "height": 900},
+        "ignore_https_errors": True,
+    }
+    if os.path.exists(auth_path):
+        options["storage_state"] = auth_path
+    return options
+
+
+def _is_login_page(url: str) -> bool:
+    u = (url or "").lower()
+    return ("login" in u) or ("passport" in u)
+
+
+# 更严格：仅识别登录相关 iframe 或明显的登录弹层容器且可见
+LOGIN_DOM_SELECTORS = [
+    "iframe[src*='login']",
+    "iframe[src*='passport']",
+    "div[class*='login']",
+    "div[id*='login']",
+    "div[role='dialog'] div:has-text('扫码登录')",
+]
+
+
+# 直接跳转时使用更真实的请求头
+DETAIL_TAB_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+}
+# 每个浏览器上下文最多保留的空闲详情标签页数
+DETAIL_POOL_SIZE = 2
+# 归还标签页时重置到的空白页
+DETAIL_POOL_BLANK_URL = "about:blank"
+
+
+# 推荐流卡片锚点选择器（多个选择器可能命中同一卡片）
+FEED_CARD_SELECTORS = [
+    "a[href*='/explore/']:not([href*='login']):not([href*='passport'])",
+    "article:has(a[href*='/explore/']) a[href*='/explore/']",
+    "div.note-item a[href*='/explore/']",
+    "section:has(a[href*='/explore/']) a[href*='/explore/']",
+    "div[class*='note'] a[href*='/explore/']",
+]
+# 合并为一个选择器，浏览器端按文档顺序去重
+FEED_CARD_SELECTOR = ", ".join(FEED_CARD_SELECTORS)
+
+# 浏览器端的卡片标题提取，取值顺序与 xhs_find_and_open._extract_card_texts 保持一致
+_CARD_TITLE_JS = """
+(a) => {
+    const texts = [];
+    const push = (t) => {
+        t = (t || "").trim();
+        if (t) texts.push(t);
+    };
+    push(a.innerText);
+    push(a.getAttribute("aria-label"));
+    push(a.getAttribute("title"));
+    const container = a.closest("article") || a.closest("div") || a.closest("li");
+    if (container) {
+        container
+            .querySelectorAll("h1, h2, h3, [class*='title'], [title], [aria-label], p, span")
+            .forEach((e) => push(e.innerText));
+        container.querySelectorAll("img[alt]").forEach((e) => push(e.getAttribute("alt")));
+        push(container.innerText);
+    }
+    return Array.from(new Set(texts)).join(" \\n");
+}
+"""
+
+# 两阶段扫描的第一阶段：一次 evaluate_all 只取 href，按文档顺序去重
+# 传入扫描标记时为增量模式：已处理的锚点打上 data-xhs-scan，之后只返回新渲染的卡片；
+# 标记值包含 href，节点被虚拟列表复用为其他笔记时会重新处理
+_CARD_LINKS_JS = """
+(els, token) => {
+    const out = [];
+    const emitted = new Set();
+    for (const a of els) {
+        const link = a.getAttribute("href") || "";
+        if (token) {
+            const mark = token + "|" + link;
+            if (a.getAttribute("data-xhs-scan") === mark) continue;
+            a.setAttribute("data-xhs-scan", mark);
+        }
+        if (!link || emitted.has(link)) continue;
+        emitted.add(link);
+        out.push(link);
+    }
+    return out;
+}
+"""
+
+# 第二阶段：只为筛选后留下的 href 提取标题文本，返回 {href: title}
+_CARD_TITLES_JS = """
+(els, links) => {
+    const titleOf = %s;
+    const wanted = new Set(links);
+    const out = {};
+    for (const a of els) {
+        const link = a.getAttribute("href") || "";
+        if (!wanted.has(link) || Object.prototype.hasOwnProperty.call(out, link)) continue;
+        out[link] = titleOf(a);
+    }
+    return out;
+}
+""" % _CARD_TITLE_JS
+
+
+# 浏览器端判断推荐流中是否已有足够的卡片
+_FEED_READY_JS = """
+([selector, minCards]) => document.querySelectorAll(selector).length >= minCards
+"""
+
+
+def _card_anchor(page, href: str):
+    # 按 href 重新定位卡片锚点（批量提取只返回纯数据）
+    escaped = href.replace("\\", "\\\\").replace('"', '\\"')
+    return page.locator(f'a[href="{escaped}"]').first
+
+
+def _new_scan_token() -> str:
+    # 每次查找使用新的标记，避免沿用上一轮（可能规则不同）的扫描结果
+    return "%x" % random.getrandbits(48)
+
+
+def _match_options_from(holder) -> Dict[str, bool]:
+    # 匹配配置由命令行注入到同步引擎 find_card_link_by_keywords 的函数属性上（异步引擎由参数传入）
+    return {
+        "use_regex": bool(getattr(holder, "use_regex", False)),
+        "exact": bool(getattr(holder, "exact", False)),
+        "case_sensitive": bool(getattr(holder, "case_sensitive", False)),
+    }
+
+
+def _compile_scan_rules(rules, exclude_rules, match_options: Dict[str, bool]):
+    # 规则只编译一次；调用方可直接传入已编译的规则集（可已包含排除规则）
+    # 未编译的规则与排除规则编译进同一个规则集，每张卡片只扫描一遍文本；
+    # 只有规则已单独编译时排除规则才作为第二个规则集另行检查
+    exclude_set = None
+    if isinstance(rules, CompiledRuleSet):
+        ruleset = rules
+        if exclude_rules:
+            exclude_set = exclude_rules if isinstance(exclude_rules, CompiledRuleSet) else compile_rules(exclude_rules, **match_options)
+    elif exclude_rules and not isinstance(exclude_rules, CompiledRuleSet):
+        ruleset = compile_rules(rules, exclude_rules=exclude_rules, **match_options)
+    else:
+        ruleset = compile_rules(rules, **match_options)
+        exclude_set = exclude_rules or None
+    return ruleset, exclude_set
+
+
+def _make_skip_href(seen_keys: Set[Any], excluded: Set[Any], seen_index: Optional[SeenNoteIndex]) -> Callable[[str], bool]:
+    def skip_href(href: str) -> bool:
+        # 只凭 href 即可排除的卡片：本次已见过、在排除列表中、或在跨运行的已处理笔记索引中
+        if not href:
+            return True
+        key = NoteKey.coerce(href)
+        return key in seen_keys or _skip_reason(key, excluded, seen_index) is not None
+    return skip_href
+
+
+def _skip_reason(key: Any, excluded: Set[Any], seen_index: Optional[SeenNoteIndex]) -> Optional[str]:
+    # 卡片不参与匹配的原因：excluded（本次运行已访问/排除）、seen（已处理笔记索引中）；参与匹配返回 None
+    if key in excluded:
+        return "excluded"
+    if seen_index is not None and isinstance(key, NoteKey) and key.note_id in seen_index:
+        return "seen"
+    return None
+
+
+def _match_card(
+    ruleset: CompiledRuleSet, exclude_set: Optional[CompiledRuleSet], field_values: Dict[str, str]
+) -> Optional[Tuple[str, str]]:
+    # 排除规则命中则跳过该卡片，否则返回第一条命中的 (表达式, 字段)
+    if exclude_set is not None and exclude_set.match(field_values) is not None:
+        return None
+    return ruleset.match(field_values)
+
+
+def _card_record(base_url: str, field_values: Dict[str, str]) -> Dict[str, Any]:
+    # 命中卡片的可序列化记录
+    href = field_values.get("link", "")
+    key = NoteKey.from_url(href)
+    return {
+        "note_id": key.note_id if key else None,
+        "url": urljoin(base_url, href),
+        "href": href,
+        "title": (field_values.get("title", "") or "").strip(),
+    }
+
+
+# 详情页就绪：出现笔记容器/标题/错误提示，或页面已完全加载
+DETAIL_READY_SELECTOR = (
+    "#noteContainer, .note-container, #detail-title, .note-content, "
+    "[class*='not-found'], [class*='error']"
+)
+_DETAIL_READY_JS = """
+(selector) => !!document.querySelector(selector) || document.readyState === "complete"
+"""
+
+
+def _landed_elsewhere(opened, expected: Optional[NoteKey]) -> bool:
+    # 打开的是另一篇笔记（而非目标笔记或错误页）时视为打开失败
+    landed = NoteKey.from_url(opened.url)
+    if expected is not None and landed is not None and landed != expected:
+        print(f"[DEBUG] 打开的笔记 {landed} 与目标 {expected} 不一致")
+        return True
+    return False
+
+
+# 不可浏览判定依据
+NOTE_ERROR_KEYWORDS = [
+    "无法浏览",
+    "不可浏览",
+    "不可访问",
+    "无法查看",
+    "内容不存在",
+    "已删除",
+    "违规",
+    "当前笔记无法浏览",
+    "暂时无法浏览",
+    "笔记不存在",
+    "页面不存在",
+    "访问受限",
+]
+NOTE_ERROR_TITLE_KEYWORDS = ["404", "错误", "无法浏览"]
+NOTE_ERROR_SELECTORS = [
+    ".error",
+    "[class*='error']",
+    "[class*='not-found']",
+    "[class*='404']",
+    ".note-error",
+    ".content-error",
+    ".error-page",
+    ".error-container",
+]
+# 正常笔记内容的迹象
+NOTE_CONTENT_SELECTORS = [
+    # 标题相关
+    "h1", "h2", "[class*='title']", "[data-testid='title']",
+    # 内容相关
+    "[class*='content']", ".note-content", "section[class*='content']", "[data-testid='content']",
+    # 作者信息
+    "[class*='author']", "[class*='user']", "[data-testid='author']",
+    # 互动元素
+    "[class*='like']", "[class*='comment']", "[class*='collect']",
+    # 图片容器
+    "[class*='image']", "[class*='photo']", "[class*='img']",
+]
+NOTE_MAIN_SELECTORS = ["main", ".main", "[class*='main']", "#main"]
+# 笔记容器：页面上已有笔记容器时，错误元素（多为临时的错误提示/toast）不作为不可浏览的依据
+NOTE_CONTAINER_SELECTORS = ["#noteContainer", ".note-container", "#detail-title"]
+
+# 页面内一次性收集判定依据，检查顺序与同步引擎的逐项探测（_probe_note_unviewable）一致：标题 -> 错误关键词 -> 错误元素 -> 内容 -> 主容器
+# 错误元素只在页面加载完成且没有笔记容器时才算数，避免正常笔记上的临时错误提示被判为不可浏览
+_NOTE_VERDICT_JS = """
+([titleKeywords, keywords, errorSelectors, contentSelectors, mainSelectors, containerSelectors]) => {
+    const visible = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== "hidden";
+    };
+    const title = document.title || "";
+    const bodyText = document.body ? document.body.textContent || "" : "";
+    const verdict = {
+        title: title,
+        titleKeyword: titleKeywords.find((k) => title.includes(k)) || null,
+        keyword: keywords.find((k) => bodyText.includes(k)) || null,
+        errorElement: null,
+        content: null,
+        mainText: false,
+        ready: document.readyState === "complete",
+    };
+    verdict.noteContainer = containerSelectors.some((sel) => !!document.querySelector(sel));
+    if (verdict.ready && !verdict.noteContainer) {
+        for (const sel of errorSelectors) {
+            const el = document.querySelector(sel);
+            if (el && visible(el)) {
+                verdict.errorElement = sel;
+                break;
+            }
+        }
+    }
+    for (const sel of contentSelectors) {
+        const els = Array.from(document.querySelectorAll(sel)).slice(0, 5);
+        const hit = els.find((el) => visible(el) && (el.textContent || "").trim().length > 3);
+        if (hit) {
+            verdict.content = sel + ": " + hit.textContent.trim().slice(0, 50);
+            break;
+        }
+    }
+    if (!verdict.content) {
+        verdict.mainText = mainSelectors.some((sel) => {
+            const el = document.querySelector(sel);
+            return !!el && visible(el) && (el.textContent || "").trim().length > 10;
+        });
+    }
+    const error = !!(verdict.titleKeyword || verdict.keyword || verdict.errorElement);
+    verdict.conclusive = error || ((!!verdict.content || verdict.mainText) && verdict.ready);
+    return verdict;
+}
+"""
+
+
+_NOTE_VERDICT_ARG = [
+    NOTE_ERROR_TITLE_KEYWORDS, NOTE_ERROR_KEYWORDS, NOTE_ERROR_SELECTORS, NOTE_CONTENT_SELECTORS, NOTE_MAIN_SELECTORS,
+    NOTE_CONTAINER_SELECTORS,
+]
+# 等到页面可下结论时返回判定
+_NOTE_VERDICT_WAIT_JS = "(arg) => { const v = (%s)(arg); return v.conclusive ? v : null; }" % _NOTE_VERDICT_JS
+
+
+# 不可浏览的判定依据
+UNVIEWABLE_URL = "url"
+UNVIEWABLE_TITLE = "title"
+UNVIEWABLE_KEYWORD = "keyword"
+UNVIEWABLE_ERROR_ELEMENT = "error_element"
+UNVIEWABLE_NO_CONTENT = "no_content"
+
+
+def _finish_verdict(verdict: Dict[str, Any]) -> Dict[str, Any]:
+    # reason：不可浏览的依据（title / keyword / error_element / no_content），可浏览为 None
+    if verdict.get("titleKeyword"):
+        reason = UNVIEWABLE_TITLE
+    elif verdict.get("keyword"):
+        reason = UNVIEWABLE_KEYWORD
+    elif verdict.get("errorElement"):
+        reason = UNVIEWABLE_ERROR_ELEMENT
+    elif not (verdict.get("content") or verdict.get("mainText")):
+        reason = UNVIEWABLE_NO_CONTENT
+    else:
+        reason = None
+    verdict["reason"] = reason
+    verdict["unviewable"] = reason is not None
+    return verdict
+
+
+def _url_looks_unviewable(url: str) -> bool:
+    # URL 中包含错误代码
+    url = (url or "").lower()
+    return "404" in url or "error" in url or "300031" in url
+
+
+def _report_verdict(verdict: Dict[str, Any], url: str):
+    if verdict.get("titleKeyword"):
+        print(f"[DEBUG] 检测到错误页面标题: {verdict.get('title')}")
+    elif verdict.get("keyword"):
+        print(f"[DEBUG] 检测到错误关键词: {verdict.get('keyword')}")
+    elif verdict.get("errorElement"):
+        print(f"[DEBUG] 检测到错误元素: {verdict.get('errorElement')}")
+    elif verdict["unviewable"]:
+        print(f"[DEBUG] 页面未检测到正常内容")
+        print(f"[DEBUG] 页面URL: {url}")
+        print(f"[DEBUG] 页面标题: {verdict.get('title') or '无'}")
+    else:
+        print(f"[DEBUG] 检测到页面内容: {[verdict.get('content') or '主容器文本']}")
+
+
+# 详情页各字段的候选选择器（按顺序取第一个有文本的元素）
+DETAIL_FIELD_SELECTORS = {
+    "title": ["h1", "h1[class*='title']", "div[class*='title'] h1"],
+    "author": ["a[href*='/user/']", "span[class*='name']", "div[class*='author'] a"],
+    "content": ["div[class*='content']", "section[class*='content']", "div.note-content"],
+    "like": ["[class*='like'] span", "button[aria-label*='赞'] span"],
+    "comment": ["[class*='comment'] span", "button[aria-label*='评'] span"],
+    "collect": ["[class*='collect'] span", "button[aria-label*='藏'] span"],
+}
+
+# 浏览器端一次取完所有字段，不逐个等待可见；同时带回内嵌初始状态的 script 文本（__state）
+_NOTE_DETAIL_JS = """
+(fields) => {
+    const out = {};
+    const script = Array.from(document.scripts).find((s) => (s.textContent || "").indexOf("__INITIAL_STATE__") >= 0);
+    out.__state = script ? script.textContent : null;
+    for (const [name, selectors] of Object.entries(fields)) {
+        out[name] = null;
+        for (const css of selectors) {
+            let el = null;
+            try {
+                el = document.querySelector(css);
+            } catch (e) {
+                continue;
+            }
+            const text = el ? (el.innerText || el.textContent || "").trim() : "";
+            if (text) {
+                out[name] = text;
+                break;
+            }
+        }
+    }
+    return out;
+}
+"""
+
+
+def _note_detail_from_values(values: Dict[str, Any], url: str) -> NoteDetail:
+    # _NOTE_DETAIL_JS 的结果：内嵌状态优先，DOM 文本补齐
+    dom_detail = NoteDetail(
+        url=url,
+        title=values.get("title"),
+        author=values.get("author"),
+        content=values.get("content"),
+        like_text=values.get("like"),
+        comment_text=values.get("comment"),
+        collect_text=values.get("collect"),
+        source="dom",
+    )
+    state_detail = note_detail_from_state(parse_note_state(values.get("__state")), url)
+    return merge_note_details(state_detail, dom_detail)
+
+
+def print_note_detail(detail: NoteDetail):
+    print("详情页URL:", detail.url, f"（数据来源: {detail.source}）")
+    print("标题:", detail.title or "")
+    print("作者:", detail.author or "")
+    print("正文预览:", (detail.content or "")[:200])
+    print("点赞:", detail.like_text or "", f"({detail.likes})" if detail.likes is not None else "")
+    print("评论:", detail.comment_text or "", f"({detail.comments})" if detail.comments is not None else "")
+    print("收藏:", detail.collect_text or "", f"({detail.collects})" if detail.collects is not None else "")
+
+
+# 详情页的点赞按钮
+LIKE_BUTTON_SELECTORS = [
+    "button[aria-label*='赞']",
+    "button[class*='like']",
+    "[data-testid='like-button']",
+    ".like-button",
+    "button:has-text('赞')",
+]
+
+
+# 找到未点赞的按钮后先等待再点击；点赞成功后等待请求完成
+LIKE_PRE_CLICK_WAIT_MS = 1000
+LIKE_SETTLE_MS = 2000
+# 依次尝试的点击方式 (定位器方法名, 位置参数, 关键字参数)，前一种抛出异常才尝试下一种
+LIKE_CLICK_METHODS: List[Tuple[str, Tuple[Any, ...], Dict[str, Any]]] = [
+    ("click", (), {"timeout": 3000}),
+    ("click", (), {"force": True, "timeout": 3000}),
+    ("evaluate", ("el => el.click()",), {}),
+    ("click", (), {"delay": 100, "timeout": 3000}),
+]
+
+
+def _button_shows_liked(button_text: Optional[str], aria_pressed: Optional[str]) -> bool:
+    # 按钮文本含“已赞”或 aria-pressed 为 true 即视为已点赞
+    return "已赞" in (button_text or "") or aria_pressed == "true"
+
+
+def _note_keys(*urls: Optional[str]) -> Set[Any]:
+    # 命中卡片的 href 与详情页 URL 统一转为 NoteKey（解析不到笔记 ID 的保留原链接）
+    return {NoteKey.coerce(url) for url in urls if url}
+
+
+def _remember_note(seen_index: Optional[SeenNoteIndex], status: str, *urls: Optional[str]):
+    # 按第一个能解析出笔记 ID 的链接写入已处理笔记索引
+    if seen_index is None:
+        return
+    for url in urls:
+        if seen_index.add_url(url, status):
+            return
+
+
+def _open_seen_index(path: Optional[str], unviewable_ttl_sec: float) -> Optional[SeenNoteIndex]:
+    # 跨运行的已处理笔记索引需用 --seen-index 显式启用；启用时打印路径与不可浏览判定的有效期
+    if not path:
+        return None
+    ttl = f"{unviewable_ttl_sec / 3600:g} 小时" if unviewable_ttl_sec > 0 else "永不过期"
+    print(f"已处理笔记索引：{path}（不可浏览判定有效期：{ttl}）")
+    return SeenNoteIndex(path, unviewable_ttl_sec=unviewable_ttl_sec)
+
+
+def _remember_unviewable(seen_index: Optional[SeenNoteIndex], reason: Optional[str], *urls: Optional[str]):
+    # 只凭错误元素判定的不可浏览可能是临时的错误提示：本次运行内跳过，但不写入跨运行的已处理笔记索引
+    if reason == UNVIEWABLE_ERROR_ELEMENT:
+        return
+    _remember_note(seen_index, STATUS_UNVIEWABLE, *urls)
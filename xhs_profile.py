@@ -0,0 +1,227 @@
+"""
+运行剖析：统计每个阶段的耗时与 Playwright 调用次数（--profile）
+"""
+import json
+import time
+import inspect
+import functools
+from typing import List, Tuple, Dict, Any
+
+
+# 只在本地构造定位器、不产生浏览器往返的方法，不计入调用次数
+LOCAL_METHODS = {
+    "locator", "nth", "filter", "and_", "or_", "frame_locator",
+    "get_by_alt_text", "get_by_label", "get_by_placeholder", "get_by_role",
+    "get_by_test_id", "get_by_text", "get_by_title",
+}
+# 单次运行最多记录的调用事件数（阶段事件不受限制）
+MAX_CALL_EVENTS = 200000
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "started", "child_seconds")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.started = 0.0
+        self.child_seconds = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.profiler._stack.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        prof = self.profiler
+        ended = time.perf_counter()
+        prof._stack.pop()
+        elapsed = ended - self.started
+        stats = prof._phase_stats(self.name)
+        stats["count"] += 1
+        stats["seconds"] += elapsed
+        stats["self_seconds"] += elapsed - self.child_seconds
+        if prof._stack:
+            prof._stack[-1].child_seconds += elapsed
+        prof._events.append({
+            "name": self.name, "cat": "phase", "ph": "X", "pid": 1, "tid": 1,
+            "ts": round((self.started - prof._origin) * 1e6, 1),
+            "dur": round(elapsed * 1e6, 1),
+        })
+        return False
+
+
+class Profiler:
+    """按阶段归集墙钟时间与 Playwright 调用；未启用时 phase() 几乎没有开销"""
+
+    def __init__(self):
+        self.enabled = False
+        self._patched: List[Tuple[type, str, Any]] = []
+        self.reset()
+
+    def reset(self):
+        self._origin = time.perf_counter()
+        self._stack: List[_Phase] = []
+        self._phases: Dict[str, Dict[str, float]] = {}
+        self._calls: Dict[Tuple[str, str], List[float]] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._call_events = 0
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.reset()
+        self._install()
+
+    def disable(self):
+        self._uninstall()
+        self.enabled = False
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def phased(self, name: str):
+        """函数装饰器：整个函数调用计入指定阶段"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Phase(self, name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def current_phase(self) -> str:
+        return self._stack[-1].name if self._stack else "other"
+
+    def total_calls(self) -> int:
+        return int(sum(v[0] for v in self._calls.values()))
+
+    def _phase_stats(self, name: str) -> Dict[str, float]:
+        stats = self._phases.get(name)
+        if stats is None:
+            stats = {"count": 0, "seconds": 0.0, "self_seconds": 0.0}
+            self._phases[name] = stats
+        return stats
+
+    def _install(self):
+        from playwright.sync_api import Page, Locator, Mouse, BrowserContext
+        for cls in (Page, Locator, Mouse, BrowserContext):
+            for name, fn in list(vars(cls).items()):
+                if name.startswith("_") or name in LOCAL_METHODS or not inspect.isfunction(fn):
+                    continue
+                setattr(cls, name, self._wrap(f"{cls.__name__}.{name}", fn))
+                self._patched.append((cls, name, fn))
+
+    def _uninstall(self):
+        for cls, name, fn in self._patched:
+            setattr(cls, name, fn)
+        self._patched = []
+
+    def _wrap(self, label: str, fn):
+        prof = self
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not prof.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                key = (prof.current_phase(), label)
+                rec = prof._calls.get(key)
+                if rec is None:
+                    rec = [0, 0.0]
+                    prof._calls[key] = rec
+                rec[0] += 1
+                rec[1] += elapsed
+                if prof._call_events < MAX_CALL_EVENTS:
+                    prof._call_events += 1
+                    prof._events.append({
+                        "name": label, "cat": "playwright", "ph": "X", "pid": 1, "tid": 2,
+                        "ts": round((started - prof._origin) * 1e6, 1),
+                        "dur": round(elapsed * 1e6, 1),
+                        "args": {"phase": key[0]},
+                    })
+        return wrapper
+
+    def summary(self) -> Dict[str, Any]:
+        phases: Dict[str, Dict[str, Any]] = {}
+        for name, stats in self._phases.items():
+            phases[name] = {
+                "count": int(stats["count"]),
+                "seconds": round(stats["seconds"], 4),
+                "self_seconds": round(stats["self_seconds"], 4),
+                "calls": 0,
+                "call_seconds": 0.0,
+                "top_calls": [],
+            }
+        per_phase: Dict[str, List[Tuple[str, int, float]]] = {}
+        for (phase, label), (count, seconds) in self._calls.items():
+            entry = phases.setdefault(phase, {
+                "count": 0, "seconds": 0.0, "self_seconds": 0.0,
+                "calls": 0, "call_seconds": 0.0, "top_calls": [],
+            })
+            entry["calls"] += int(count)
+            entry["call_seconds"] = round(entry["call_seconds"] + seconds, 4)
+            per_phase.setdefault(phase, []).append((label, int(count), seconds))
+        for phase, items in per_phase.items():
+            items.sort(key=lambda x: x[2], reverse=True)
+            phases[phase]["top_calls"] = [
+                {"call": label, "count": count, "seconds": round(seconds, 4)}
+                for label, count, seconds in items[:5]
+            ]
+        return {
+            "wall_seconds": round(time.perf_counter() - self._origin, 4),
+            "total_calls": self.total_calls(),
+            "phases": phases,
+        }
+
+    def print_summary(self):
+        data = self.summary()
+        print("=== 运行剖析 ===")
+        print(f"总耗时: {data['wall_seconds']:.2f}s，Playwright 调用: {data['total_calls']} 次")
+        ordered = sorted(data["phases"].items(), key=lambda kv: kv[1]["self_seconds"], reverse=True)
+        for name, p in ordered:
+            print(
+                f"  {name:<18} 次数 {p['count']:>4}  总计 {p['seconds']:>8.2f}s  "
+                f"自身 {p['self_seconds']:>8.2f}s  调用 {p['calls']:>6} 次 / {p['call_seconds']:.2f}s"
+            )
+            for c in p["top_calls"][:3]:
+                print(f"      {c['call']:<36} {c['count']:>6} 次  {c['seconds']:.2f}s")
+        print("================")
+
+    def write_trace(self, path: str):
+        """写出 Chrome trace 格式（chrome://tracing 或 Perfetto 可直接打开）"""
+        trace = {
+            "traceEvents": [
+                {"name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": "phases"}},
+                {"name": "thread_name", "ph": "M", "pid": 1, "tid": 2, "args": {"name": "playwright"}},
+            ] + self._events,
+            "displayTimeUnit": "ms",
+            "otherData": {"summary": self.summary()},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+
+
+PROFILER = Profiler()
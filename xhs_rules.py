@@ -0,0 +1,838 @@
+"""
+关键词规则解析与匹配（纯 Python，不依赖 Playwright）
+
+规则表达式语法（keywords.txt 每行、--keyword 的值）：
+- 运算符：!（非）、&&（与）、||（或），优先级依次降低；括号分组：(a || b) && !c
+- 关键词前可加字段前缀只在该字段上匹配：title:猫 && link:/explore/；前缀也可作用于分组：title:(a || b)
+- 双引号内为原样关键词："a && b"、"(图)"
+- 以 ( 开头但右括号后还有文字的关键词（如正则 (旅|美)食）整体作为一个关键词
+- 关键词文件的每条规则与 --keyword 按同一语法解析：行首的 title: 等前缀只作用于紧跟的关键词；
+  整行（含逗号分隔的多条规则）指定字段需显式写成 @字段: 形式，如 @title,link: 旅行, 科技
+  行首前缀后跟逗号分隔的多条规则（如 link:a, b）含义有歧义，读取时报错要求改写
+
+离线回放：扫描时用 --dump-cards 把提取到的卡片写成 JSON Lines，之后无需浏览器即可调整规则：
+    python xhs_rules.py match --keywords-file keywords.txt cards.jsonl
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import functools
+from typing import Optional, List, Tuple, Set, Dict, Any, Iterable
+
+from xhs_notes import NoteKey
+
+
+def _parse_fields_token(token: str) -> Optional[Set[str]]:
+    token_low = token.strip().lower()
+    if token_low in {"title", "链接", "link"}:
+        # 单一字段
+        if token_low == "链接":
+            token_low = "link"
+        return {token_low}
+    if token_low in {"any", "全部", "all"}:
+        return {"title", "link"}
+    # 逗号分隔
+    parts = [p.strip().lower() for p in token_low.split(",") if p.strip()]
+    valid_map = {"title": "title", "link": "link", "链接": "link"}
+    fields: Set[str] = set()
+    for p in parts:
+        if p in valid_map:
+            fields.add(valid_map[p])
+    if fields:
+        return fields
+    return None
+
+
+class RuleSyntaxError(ValueError):
+    """规则表达式语法错误；从文件读取时带有文件名与行号"""
+
+    def __init__(self, message: str, expr: str = "", position: int = 0, path: Optional[str] = None, line: Optional[int] = None):
+        self.message = message
+        self.expr = expr
+        self.position = position
+        self.path = path
+        self.line = line
+        super().__init__(str(self))
+
+    def __str__(self) -> str:
+        where = f"{self.path}:{self.line}: " if self.line is not None else ""
+        return f"{where}{self.message}（第 {self.position + 1} 个字符）：{self.expr}"
+
+    def located(self, path: str, line: int) -> "RuleSyntaxError":
+        return RuleSyntaxError(self.message, self.expr, self.position, path, line)
+
+
+# 关键词前的字段前缀，如 title: / link: / any:
+_FIELD_PREFIX_RE = re.compile(r"([A-Za-z]+|链接|全部):")
+
+
+class _ExprParser:
+    # 递归下降解析，语法树节点为元组：
+    # ("term", 关键词, 字段集合或 None)、("not", 子节点)、("and", (子节点...))、("or", (子节点...))
+    # 字段为 None 的关键词在规则自身的字段上匹配
+
+    def __init__(self, expr: str):
+        self.s = expr
+        self.n = len(expr)
+        self.i = 0
+
+    def error(self, message: str, position: Optional[int] = None):
+        raise RuleSyntaxError(message, self.s, self.i if position is None else position)
+
+    def skip_ws(self):
+        while self.i < self.n and self.s[self.i].isspace():
+            self.i += 1
+
+    def peek_op(self) -> Optional[str]:
+        self.skip_ws()
+        for op in ("&&", "||"):
+            if self.s.startswith(op, self.i):
+                return op
+        return None
+
+    def parse(self):
+        node = self.parse_or(None)
+        self.skip_ws()
+        if self.i < self.n:
+            self.error("多余的右括号" if self.s[self.i] == ")" else "缺少运算符")
+        return node
+
+    def parse_or(self, fields):
+        children = [self.parse_and(fields)]
+        while self.peek_op() == "||":
+            self.i += 2
+            children.append(self.parse_and(fields))
+        return children[0] if len(children) == 1 else ("or", tuple(children))
+
+    def parse_and(self, fields):
+        children = [self.parse_unary(fields)]
+        while self.peek_op() == "&&":
+            self.i += 2
+            children.append(self.parse_unary(fields))
+        return children[0] if len(children) == 1 else ("and", tuple(children))
+
+    def parse_unary(self, fields):
+        self.skip_ws()
+        if self.i >= self.n:
+            self.error("缺少关键词")
+        ch = self.s[self.i]
+        if ch == "!":
+            self.i += 1
+            return ("not", self.parse_unary(fields))
+        m = _FIELD_PREFIX_RE.match(self.s, self.i)
+        if m:
+            prefix_fields = _parse_fields_token(m.group(1))
+            if prefix_fields is not None:
+                self.i = m.end()
+                return self.parse_unary(frozenset(prefix_fields))
+        if ch == '"':
+            end = self.s.find('"', self.i + 1)
+            if end < 0:
+                self.error("引号不匹配")
+            if end == self.i + 1:
+                self.error("缺少关键词")
+            term = self.s[self.i + 1:end]
+            self.i = end + 1
+            return ("term", term, fields)
+        if ch == "(":
+            end = self._matching_paren(self.i)
+            if self._is_group(end):
+                self.i += 1
+                node = self.parse_or(fields)
+                self.skip_ws()
+                if self.i != end:
+                    self.error("缺少运算符")
+                self.i = end + 1
+                return node
+        if ch == ")":
+            self.error("缺少关键词")
+        return self.parse_term(fields)
+
+    def parse_term(self, fields):
+        # 关键词到同层的 && / || / 右括号为止；关键词内部成对的括号（如正则分组）原样保留
+        start = self.i
+        depth = 0
+        while self.i < self.n:
+            if depth == 0 and (self.s.startswith("&&", self.i) or self.s.startswith("||", self.i)):
+                break
+            ch = self.s[self.i]
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            self.i += 1
+        if depth:
+            self.error("括号不匹配", start)
+        term = self.s[start:self.i].strip()
+        if not term:
+            self.error("缺少关键词", start)
+        return ("term", term, fields)
+
+    def _matching_paren(self, start: int) -> int:
+        depth = 0
+        i = start
+        while i < self.n:
+            ch = self.s[i]
+            if ch == '"':
+                close = self.s.find('"', i + 1)
+                if close < 0:
+                    break
+                i = close
+            elif ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+                if depth == 0:
+                    return i
+            i += 1
+        self.error("括号不匹配", start)
+
+    def _is_group(self, end: int) -> bool:
+        # 右括号后紧跟运算符、右括号或结尾时才是分组，否则整体是一个关键词
+        j = end + 1
+        while j < self.n and self.s[j].isspace():
+            j += 1
+        return j >= self.n or self.s.startswith(("&&", "||", ")"), j)
+
+
+# 不限缓存大小：按文件顺序反复读取上万条规则时，有界的 LRU 缓存会被依次逐出、每次全部重新解析
+# （每个不同的表达式只保存一棵语法树，规模与规则文件相当）
+@functools.lru_cache(maxsize=None)
+def parse_rule_expr(expr: str):
+    """把规则表达式解析为语法树，语法错误抛出 RuleSyntaxError"""
+    return _ExprParser(expr).parse()
+
+
+def split_rule_list(content: str) -> List[str]:
+    # 按逗号拆分一行中的多条规则；括号和引号内的逗号不拆分
+    parts: List[str] = []
+    depth = 0
+    quoted = False
+    start = 0
+    for i, ch in enumerate(content):
+        if ch == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        elif ch == "," and depth == 0:
+            parts.append(content[start:i])
+            start = i + 1
+    parts.append(content[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+# 旧版写在行首、逗号分隔的多字段前缀，如 title,link:猫
+_MULTI_FIELD_LINE_RE = re.compile(r"\s*[^\s,:]+(?:\s*,\s*[^\s,:]+)+\s*:")
+
+
+def _has_leading_field_prefix(line: str) -> bool:
+    # 行首是 title: / link: / any: 等单字段前缀
+    m = _FIELD_PREFIX_RE.match(line)
+    return m is not None and _parse_fields_token(m.group(1)) is not None
+
+
+def read_keywords_from_file(file_path: str, default_fields: Set[str]) -> List[Tuple[Set[str], str]]:
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"关键词文件不存在: {file_path}")
+    rules: List[Tuple[Set[str], str]] = []
+    with open(file_path, "r", encoding="utf-8-sig") as f:
+        for lineno, raw in enumerate(f, 1):
+            line = raw.strip()
+            if not line:
+                continue
+            if line.startswith("#") or line.startswith("//"):
+                continue
+            # 一行多个规则用逗号分隔，每条规则与 --keyword 的值按同一语法解析（title:旅行 只对“旅行”生效）
+            # 整行指定字段（旧写法）需显式加 @：@title,link: 旅行, 科技
+            fields = None
+            content = line
+            if line.startswith("@"):
+                prefix, sep, rest = line[1:].partition(":")
+                fields = _parse_fields_token(prefix) if sep else None
+                if fields is None:
+                    raise RuleSyntaxError("@ 后应为字段列表和冒号，如 @title,link:", line, 0).located(file_path, lineno)
+                content = rest.strip()
+            elif _MULTI_FIELD_LINE_RE.match(line) and _parse_fields_token(line.split(":", 1)[0]) is not None:
+                # 旧版的多字段行前缀按新语法会被逗号拆开，要求改写以免含义悄悄改变
+                raise RuleSyntaxError(
+                    "多字段行前缀需写成 @字段: 形式（整行生效），或在关键词前使用 any:", line, 0
+                ).located(file_path, lineno)
+            elif _has_leading_field_prefix(line) and len(split_rule_list(line)) > 1:
+                # 旧版中 link:a, b 的前缀作用于整行，新语法只作用于 a，b 会悄悄改在默认字段上匹配
+                raise RuleSyntaxError(
+                    "行首字段前缀后有逗号分隔的多条规则：整行生效需写成 @字段: 形式（如 @link: a, b），"
+                    "只作用于第一条时请为其余规则各自加前缀",
+                    line,
+                    0,
+                ).located(file_path, lineno)
+            # 按逗号分割多个关键词，逐条检查语法
+            for part in split_rule_list(content):
+                try:
+                    parse_rule_expr(part)
+                except RuleSyntaxError as e:
+                    raise e.located(file_path, lineno) from None
+                rules.append((fields or set(default_fields), part))
+    unique_rules = dedupe_rules(rules)
+    if not unique_rules:
+        raise ValueError("关键词文件为空或无有效关键词")
+    return unique_rules
+
+
+def dedupe_rules(rules: List[Tuple[Set[str], str]]) -> List[Tuple[Set[str], str]]:
+    # 去重（按 字段集合+小写关键词）并保持顺序
+    seen: Set[str] = set()
+    unique_rules: List[Tuple[Set[str], str]] = []
+    for fields, kw in rules:
+        key = ",".join(sorted(fields)) + "|" + kw.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        unique_rules.append((fields, kw))
+    return unique_rules
+
+
+def _normalize_text(text: str, case_sensitive: bool) -> str:
+    if text is None:
+        return ""
+    t = text.strip()
+    if not case_sensitive:
+        t = t.lower()
+    # 折叠多余空白
+    t = " ".join(t.split())
+    return t
+
+
+def _pattern_matches(value: str, pattern: str, *, use_regex: bool, exact: bool, case_sensitive: bool) -> bool:
+    val = _normalize_text(value or "", case_sensitive)
+    if use_regex:
+        flags = 0 if case_sensitive else re.IGNORECASE
+        try:
+            return re.search(pattern, value or "", flags) is not None
+        except re.error:
+            return False
+    patt = _normalize_text(pattern, case_sensitive)
+    if exact:
+        return val == patt
+    return patt in val
+
+
+def _expr_matches(
+    value: str,
+    expr: str,
+    *,
+    use_regex: bool,
+    exact: bool,
+    case_sensitive: bool,
+    field_values: Optional[Dict[str, str]] = None,
+) -> bool:
+    # 逐个关键词解释执行（CompiledRuleSet 的对照实现）；带字段前缀的关键词在 field_values 的对应字段上匹配
+    opts = {"use_regex": use_regex, "exact": exact, "case_sensitive": case_sensitive}
+
+    def evaluate(node) -> bool:
+        tag = node[0]
+        if tag == "term":
+            if node[2] is None or field_values is None:
+                return _pattern_matches(value, node[1], **opts)
+            return any(_pattern_matches(field_values.get(f, "") or "", node[1], **opts) for f in node[2])
+        if tag == "not":
+            return not evaluate(node[1])
+        if tag == "and":
+            return all(evaluate(c) for c in node[1])
+        return any(evaluate(c) for c in node[1])
+
+    return evaluate(parse_rule_expr(expr))
+
+
+class AhoCorasick:
+    """多模式子串匹配自动机：一次扫描文本即可找出出现过的全部模式"""
+
+    def __init__(self, patterns: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for pid, patt in enumerate(patterns):
+            state = 0
+            for ch in patt:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(pid)
+        # 广度优先构建失败指针，并把失败链上的输出合并到当前状态
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> Set[int]:
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class _FieldTable:
+    # 单个字段（title/link）上的全部去重后的匹配项，及匹配项到 (规则序号, 字段序号) 的倒排索引
+    # （正向规则与排除规则各一份，共用同一批匹配项）
+    __slots__ = ("patterns", "term_ids", "term_rules", "term_excludes", "automaton", "regexes")
+
+    def __init__(self):
+        self.patterns: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.term_rules: List[List[Tuple[int, int]]] = []
+        self.term_excludes: List[List[Tuple[int, int]]] = []
+        self.automaton: Optional[AhoCorasick] = None
+        self.regexes: List[Optional[Any]] = []
+
+    def term(self, pattern: str) -> int:
+        tid = self.term_ids.get(pattern)
+        if tid is None:
+            tid = len(self.patterns)
+            self.term_ids[pattern] = tid
+            self.patterns.append(pattern)
+            self.term_rules.append([])
+            self.term_excludes.append([])
+        return tid
+
+
+_NO_HITS: Set[int] = frozenset()
+
+
+def _eval_compiled(node, hits: Dict[str, Set[int]]) -> bool:
+    # 编译后的语法树：关键词节点为 ("term", ((字段, term_id), ...))，只查已算好的命中集合；
+    # 同一字段上的纯关键词与/或（旧语法的全部规则）折叠为 ("all"/"any", 字段, (term_id...))
+    tag = node[0]
+    if tag == "all":
+        found = hits.get(node[1], _NO_HITS)
+        for tid in node[2]:
+            if tid not in found:
+                return False
+        return True
+    if tag == "any":
+        found = hits.get(node[1], _NO_HITS)
+        for tid in node[2]:
+            if tid in found:
+                return True
+        return False
+    if tag == "term":
+        for field, tid in node[1]:
+            found = hits.get(field)
+            if found and tid in found:
+                return True
+        return False
+    if tag == "not":
+        return not _eval_compiled(node[1], hits)
+    if tag == "and":
+        for child in node[1]:
+            if not _eval_compiled(child, hits):
+                return False
+        return True
+    for child in node[1]:
+        if _eval_compiled(child, hits):
+            return True
+    return False
+
+
+class CompiledRuleSet:
+    """把 (字段集合, 表达式) 规则一次性编译成可快速匹配的结构
+
+    - 子串模式：每个字段上的全部关键词共用一个 Aho-Corasick 自动机
+    - 精确模式：规范化后的关键词放入字典查找
+    - 正则模式：预编译正则，每张卡片每个正则最多执行一次
+    表达式解析为语法树后，所有规则共用同一批关键词：每张卡片上每个不同的关键词最多检测一次，
+    规则只在命中集合上求值。匹配结果与逐条调用 _expr_matches 的顺序语义一致：按规则顺序，先 title 后 link。
+    exclude_rules 与正向规则编译进同一批匹配项，同一次扫描中先对排除规则求值，命中任一条即不再匹配。
+    """
+
+    FIELDS = ("title", "link")
+
+    def __init__(
+        self,
+        rules: List[Tuple[Set[str], str]],
+        *,
+        exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+        use_regex: bool = False,
+        exact: bool = False,
+        case_sensitive: bool = False,
+    ):
+        self.rules = list(rules)
+        self.exclude_rules = list(exclude_rules or [])
+        self.use_regex = use_regex
+        self.exact = exact
+        self.case_sensitive = case_sensitive
+        self._tables: Dict[str, _FieldTable] = {f: _FieldTable() for f in self.FIELDS}
+        # (规则序号, 字段序号) -> 在该字段上求值的编译后语法树；
+        # always 为没有任何关键词命中时也成立的组合（含 ! 的规则），每张卡片都要求值
+        self._compiled, self._always = self._compile(self.rules, "term_rules")
+        self._exclude_compiled, self._exclude_always = self._compile(self.exclude_rules, "term_excludes")
+        for table in self._tables.values():
+            if use_regex:
+                flags = 0 if case_sensitive else re.IGNORECASE
+                for patt in table.patterns:
+                    try:
+                        table.regexes.append(re.compile(patt, flags))
+                    except re.error:
+                        table.regexes.append(None)
+            elif not exact and table.patterns:
+                table.automaton = AhoCorasick(table.patterns)
+
+    def _compile(self, rules: List[Tuple[Set[str], str]], index: str):
+        compiled: Dict[Tuple[int, int], Any] = {}
+        always: List[Tuple[int, int]] = []
+        for idx, (fields, expr) in enumerate(rules):
+            tree = parse_rule_expr(expr)
+            for rank, field in enumerate(self.FIELDS):
+                if field not in fields:
+                    continue
+                inst = (idx, rank)
+                node = self._instantiate(tree, field, inst, set(), index)
+                compiled[inst] = node
+                if _eval_compiled(node, {}):
+                    always.append(inst)
+        return compiled, always
+
+    def _instantiate(self, node, field: str, inst: Tuple[int, int], registered: Set[Tuple[str, int]], index: str):
+        # 把语法树中的关键词换成各字段表中的 term_id，并登记到倒排索引 index（term_rules / term_excludes）
+        tag = node[0]
+        if tag == "term":
+            refs = []
+            for f in self.FIELDS:
+                if f not in (node[2] or (field,)):
+                    continue
+                table = self._tables[f]
+                tid = table.term(node[1] if self.use_regex else _normalize_text(node[1], self.case_sensitive))
+                refs.append((f, tid))
+                if (f, tid) not in registered:
+                    registered.add((f, tid))
+                    getattr(table, index)[tid].append(inst)
+            return ("term", tuple(refs))
+        if tag == "not":
+            return ("not", self._instantiate(node[1], field, inst, registered, index))
+        children = tuple(self._instantiate(c, field, inst, registered, index) for c in node[1])
+        refs = [c[1][0] for c in children if c[0] == "term" and len(c[1]) == 1]
+        if len(refs) == len(children) and len({f for f, _ in refs}) == 1:
+            return ("all" if tag == "and" else "any", refs[0][0], tuple(tid for _, tid in refs))
+        return (tag, children)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @property
+    def needs_title(self) -> bool:
+        """是否有规则（含排除规则）用到 title 字段；为假时匹配只需要卡片 href"""
+        return bool(self._tables["title"].patterns)
+
+    def _hits(self, table: _FieldTable, value: str) -> Set[int]:
+        if self.use_regex:
+            return {tid for tid, rx in enumerate(table.regexes) if rx is not None and rx.search(value)}
+        val = _normalize_text(value, self.case_sensitive)
+        if self.exact:
+            tid = table.term_ids.get(val)
+            return set() if tid is None else {tid}
+        found = table.automaton.find_all(val) if table.automaton else set()
+        # 空关键词在任何文本中都成立
+        empty = table.term_ids.get("")
+        if empty is not None:
+            found.add(empty)
+        return found
+
+    def match_rule(self, field_values: Dict[str, str]) -> Optional[Tuple[int, str, str]]:
+        """返回 (规则序号, 表达式, 命中字段)，未命中返回 None"""
+        # 每个字段的关键词命中集合只计算一次，只有引用了命中关键词（或含 !）的规则才需要求值
+        hits: Dict[str, Set[int]] = {}
+        candidates = set(self._always)
+        excludes = set(self._exclude_always)
+        for field in self.FIELDS:
+            table = self._tables[field]
+            if not table.patterns:
+                continue
+            found = self._hits(table, field_values.get(field, "") or "")
+            hits[field] = found
+            for tid in found:
+                candidates.update(table.term_rules[tid])
+                if table.term_excludes[tid]:
+                    excludes.update(table.term_excludes[tid])
+        # 排除规则先于正向规则求值
+        for inst in excludes:
+            if _eval_compiled(self._exclude_compiled[inst], hits):
+                return None
+        best: Optional[Tuple[int, int]] = None
+        for inst in candidates:
+            if best is not None and inst >= best:
+                continue
+            if _eval_compiled(self._compiled[inst], hits):
+                best = inst
+        if best is None:
+            return None
+        idx, rank = best
+        return idx, self.rules[idx][1], self.FIELDS[rank]
+
+    def match(self, field_values: Dict[str, str]) -> Optional[Tuple[str, str]]:
+        """返回 (表达式, 命中字段)，未命中返回 None"""
+        res = self.match_rule(field_values)
+        if res is None:
+            return None
+        return res[1], res[2]
+
+
+def compile_rules(
+    rules: List[Tuple[Set[str], str]],
+    *,
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    use_regex: bool = False,
+    exact: bool = False,
+    case_sensitive: bool = False,
+) -> CompiledRuleSet:
+    return CompiledRuleSet(
+        rules, exclude_rules=exclude_rules, use_regex=use_regex, exact=exact, case_sensitive=case_sensitive
+    )
+
+
+class RuleSetReloader:
+    """监视关键词文件（及排除规则文件）的修改时间，内容变化时重新读取并编译规则集
+
+    poll() 在扫描的两步滚动之间调用：文件未变化时只做一次 stat。
+    新内容读取失败（语法错误、文件暂时为空等）时保留当前规则集并打印原因，下次保存后再试。
+    parse_rule_expr 的缓存不限大小，重新读取时未改动的规则直接取缓存中的语法树，只有新增的规则需要解析；
+    匹配用的关键词表与自动机仍按新规则整体重建。
+    """
+
+    def __init__(
+        self,
+        keywords_file: str,
+        default_fields: Set[str],
+        *,
+        extra_rules: Optional[List[Tuple[Set[str], str]]] = None,
+        exclude_file: Optional[str] = None,
+        extra_exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+        compile_options: Optional[Dict[str, bool]] = None,
+    ):
+        self.keywords_file = keywords_file
+        self.exclude_file = exclude_file
+        self.default_fields = set(default_fields)
+        self.extra_rules = list(extra_rules or [])
+        self.extra_exclude_rules = list(extra_exclude_rules or [])
+        self.compile_options = dict(compile_options or {})
+        self.reloads = 0
+        self._mtimes = self._stat()
+        self._rules, self._exclude_rules = self._read()
+        self.ruleset = compile_rules(self._rules, exclude_rules=self._exclude_rules, **self.compile_options)
+
+    def _stat(self) -> Tuple[Optional[int], ...]:
+        mtimes = []
+        for path in (self.keywords_file, self.exclude_file):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns if path else None)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _read(self) -> Tuple[List[Tuple[Set[str], str]], List[Tuple[Set[str], str]]]:
+        rules = read_keywords_from_file(self.keywords_file, self.default_fields) + self.extra_rules
+        excludes = list(self.extra_exclude_rules)
+        if self.exclude_file:
+            excludes = read_keywords_from_file(self.exclude_file, self.default_fields) + excludes
+        return dedupe_rules(rules), dedupe_rules(excludes)
+
+    def poll(self) -> Optional[CompiledRuleSet]:
+        """文件有变化且规则确实不同时返回新的规则集（同时更新 self.ruleset），否则返回 None"""
+        mtimes = self._stat()
+        if mtimes == self._mtimes:
+            return None
+        self._mtimes = mtimes
+        try:
+            rules, excludes = self._read()
+        except (ValueError, OSError) as e:
+            print(f"关键词文件重新加载失败，继续使用原规则: {e}")
+            return None
+        if rules == self._rules and excludes == self._exclude_rules:
+            return None
+        old = {(frozenset(f), e) for f, e in self._rules + self._exclude_rules}
+        new = {(frozenset(f), e) for f, e in rules + excludes}
+        self.ruleset = compile_rules(rules, exclude_rules=excludes, **self.compile_options)
+        self._rules, self._exclude_rules = rules, excludes
+        self.reloads += 1
+        print(
+            f"关键词规则已重新加载：新增 {len(new - old)} 条，移除 {len(old - new)} 条，"
+            f"共 {len(rules)} 条规则、{len(excludes)} 条排除规则"
+        )
+        return self.ruleset
+
+
+class CardDumpWriter:
+    """把扫描时提取到的卡片逐行写成 JSON Lines：{"href", "title", "step", "ts"}，供 match 子命令离线回放
+
+    因已访问/已处理而未参与匹配的卡片也会写出，并带上 "skipped"（excluded 或 seen）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.count = 0
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, field_values: Dict[str, str], step: int, skipped: Optional[str] = None):
+        record = {
+            "href": field_values.get("link", "") or "",
+            "title": field_values.get("title", "") or "",
+            "step": step,
+            "ts": int(time.time()),
+        }
+        if skipped:
+            record["skipped"] = skipped
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def replay_card_dump(ruleset: CompiledRuleSet, paths: Iterable[str], *, dedupe: bool = True) -> Dict[str, Any]:
+    """用规则集匹配卡片转储文件，按每张卡片首条命中的规则计数（与在线运行选中的规则一致）
+
+    dedupe 为真时同一笔记（按 NoteKey）只计一次；无法解析的行计入 invalid。
+    """
+    hits = [0] * len(ruleset.rules)
+    seen: Set[Any] = set()
+    cards = duplicates = invalid = matched = 0
+    match_rule = ruleset.match_rule
+    loads = json.loads
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = loads(line)
+                    href = record.get("href") or ""
+                    title = record.get("title") or ""
+                except (ValueError, AttributeError):
+                    invalid += 1
+                    continue
+                if dedupe:
+                    key = NoteKey.coerce(href)
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(key)
+                cards += 1
+                hit = match_rule({"title": title, "link": href})
+                if hit is not None:
+                    hits[hit[0]] += 1
+                    matched += 1
+    return {
+        "cards": cards,
+        "duplicates": duplicates,
+        "invalid": invalid,
+        "matched": matched,
+        "hits": [(expr, hits[idx]) for idx, (_, expr) in enumerate(ruleset.rules)],
+    }
+
+
+def _load_cli_rules(path: Optional[str], exprs: Optional[List[str]], default_fields: Set[str]) -> List[Tuple[Set[str], str]]:
+    rules: List[Tuple[Set[str], str]] = []
+    if path:
+        rules.extend(read_keywords_from_file(path, default_fields))
+    for kw in exprs or []:
+        k = (kw or "").strip()
+        if k:
+            parse_rule_expr(k)
+            rules.append((set(default_fields), k))
+    return dedupe_rules(rules)
+
+
+def _cmd_match(args) -> int:
+    default_fields = _parse_fields_token(args.match_fields) or {"title"}
+    try:
+        rules = _load_cli_rules(args.keywords_file, args.keyword, default_fields)
+        exclude_rules = _load_cli_rules(args.exclude_file, args.exclude, default_fields)
+    except RuleSyntaxError as e:
+        print(f"关键词规则语法错误: {e}", file=sys.stderr)
+        return 1
+    if not rules:
+        print("至少需要一个关键词（--keywords-file 或 --keyword）", file=sys.stderr)
+        return 1
+    ruleset = compile_rules(
+        rules, exclude_rules=exclude_rules,
+        use_regex=args.regex, exact=args.exact, case_sensitive=args.case_sensitive,
+    )
+    start = time.perf_counter()
+    report = replay_card_dump(ruleset, args.dumps, dedupe=not args.no_dedupe)
+    elapsed = time.perf_counter() - start
+    report["elapsed_sec"] = round(elapsed, 3)
+    if args.json:
+        report["hits"] = [{"rule": expr, "hits": count} for expr, count in report["hits"]]
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    rate = report["cards"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"卡片 {report['cards']} 张（重复 {report['duplicates']}，无效行 {report['invalid']}），"
+        f"命中 {report['matched']} 张，用时 {elapsed:.2f}s（{rate:,.0f} 张/秒）"
+    )
+    width = max(len(str(count)) for _, count in report["hits"])
+    for expr, count in report["hits"]:
+        print(f"{count:>{width}}  {expr}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="关键词规则离线工具")
+    sub = parser.add_subparsers(dest="command")
+    match = sub.add_parser("match", help="用规则匹配 --dump-cards 写出的卡片文件，统计每条规则的命中数")
+    match.add_argument("dumps", nargs="+", help="卡片转储文件（JSON Lines，可多个）")
+    match.add_argument("--keywords-file", help="关键词文件（格式同主程序）")
+    match.add_argument("--keyword", action="append", help="关键词规则（可多次提供）")
+    match.add_argument("--exclude", action="append", help="排除规则（可多次提供）")
+    match.add_argument("--exclude-file", help="排除规则文件")
+    match.add_argument("--match-fields", default="title", help="默认匹配字段，逗号分隔，可选：title, link, any")
+    match.add_argument("--regex", action="store_true", help="将关键词作为正则表达式匹配（默认按子串匹配）")
+    match.add_argument("--exact", action="store_true", help="使用精确匹配（默认为包含匹配）")
+    match.add_argument("--case-sensitive", action="store_true", help="区分大小写（默认不区分）")
+    match.add_argument("--no-dedupe", action="store_true", help="不按笔记去重，每行都计数")
+    match.add_argument("--json", action="store_true", help="以 JSON 输出统计结果")
+    args = parser.parse_args(argv)
+    if args.command == "match":
+        return _cmd_match(args)
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,761 @@
+"""
+同步引擎（xhs_find_and_open）与异步引擎（xhs_async）共用的扫描、候选队列与详情标签页池
+
+这里的页面流程写成"步骤生成器"：每次页面调用都以 yield PageCall(fn) 交给驱动执行，
+驱动把结果 send 回来（出错时把异常 throw 回生成器），其余产出（命中的卡片等）交给调用方。
+同步 API 下 fn() 直接返回结果，异步 API 下返回 awaitable，驱动分别是 iter_sync/call_sync 与 iter_async/call_async；
+流程本身（滚动、两阶段提取与回退、接口捕获、规则重新加载、卡片转储、去重）只有这一份实现。
+
+匹配配置、调试开关、增量扫描与卡片转储都由参数传入，不读取任何模块或函数上的状态。
+"""
+import heapq
+import inspect
+import time
+from typing import Optional, List, Tuple, Set, Dict, Any, Callable
+
+# 同步与异步 API 的 TimeoutError 是同一个类
+from playwright.sync_api import TimeoutError as PWTimeout
+
+from xhs_rules import CardDumpWriter, CompiledRuleSet, RuleSetReloader
+from xhs_profile import PROFILER
+from xhs_network import FeedCapture
+from xhs_notes import NoteKey, SeenNoteIndex
+from xhs_page import (
+    DETAIL_POOL_SIZE,
+    DETAIL_POOL_BLANK_URL,
+    FEED_CARD_SELECTORS,
+    FEED_CARD_SELECTOR,
+    _CARD_LINKS_JS,
+    _CARD_TITLES_JS,
+    _FEED_READY_JS,
+    _card_anchor,
+    _card_record,
+    _compile_scan_rules,
+    _is_login_page,
+    _make_skip_href,
+    _match_card,
+    _new_scan_token,
+    _skip_reason,
+)
+
+
+class PageCall:
+    """步骤生成器交给驱动执行的一次页面调用"""
+
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+
+
+def _resume(steps, value, error):
+    if error is not None:
+        return steps.throw(error)
+    return steps.send(value)
+
+
+def iter_sync(steps):
+    """同步驱动：执行 steps 中的页面调用，逐个产出其余产出"""
+    value, error = None, None
+    try:
+        while True:
+            try:
+                item = _resume(steps, value, error)
+            except StopIteration:
+                return
+            value, error = None, None
+            if isinstance(item, PageCall):
+                try:
+                    value = item.fn()
+                except Exception as e:
+                    error = e
+            else:
+                yield item
+    finally:
+        steps.close()
+
+
+def call_sync(steps):
+    """同步驱动：执行只含页面调用的 steps，返回其返回值"""
+    value, error = None, None
+    try:
+        while True:
+            try:
+                item = _resume(steps, value, error)
+            except StopIteration as stop:
+                return stop.value
+            value, error = None, None
+            try:
+                value = item.fn()
+            except Exception as e:
+                error = e
+    finally:
+        steps.close()
+
+
+async def _await_call(item: PageCall):
+    result = item.fn()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def iter_async(steps):
+    """异步驱动：iter_sync 的异步版本（异步生成器）"""
+    value, error = None, None
+    try:
+        while True:
+            try:
+                item = _resume(steps, value, error)
+            except StopIteration:
+                return
+            value, error = None, None
+            if isinstance(item, PageCall):
+                try:
+                    value = await _await_call(item)
+                except Exception as e:
+                    error = e
+            else:
+                yield item
+    finally:
+        steps.close()
+
+
+async def call_async(steps):
+    """异步驱动：call_sync 的异步版本"""
+    value, error = None, None
+    try:
+        while True:
+            try:
+                item = _resume(steps, value, error)
+            except StopIteration as stop:
+                return stop.value
+            value, error = None, None
+            try:
+                value = await _await_call(item)
+            except Exception as e:
+                error = e
+    finally:
+        steps.close()
+
+
+# 内层步骤生成器已结束
+_DONE = object()
+
+
+def _next_output(steps):
+    # 在外层步骤生成器中取内层 steps 的下一个产出（页面调用原样转交驱动）；内层结束时返回 _DONE
+    value, error = None, None
+    while True:
+        try:
+            item = _resume(steps, value, error)
+        except StopIteration:
+            return _DONE
+        value, error = None, None
+        if not isinstance(item, PageCall):
+            return item
+        try:
+            value = yield item
+        except Exception as e:
+            error = e
+
+
+def _extract_card_texts_steps(anchor):
+    # 提取卡片的标题相关文本（锚点文本 + 近邻标题/段落）
+    title_texts: List[str] = []
+    try:
+        txt = yield PageCall(lambda: anchor.inner_text(timeout=150))
+        if txt:
+            title_texts.append(txt)
+    except Exception:
+        pass
+    # 锚点上的可读属性
+    for attr in ("aria-label", "title"):
+        try:
+            value = yield PageCall(lambda: anchor.get_attribute(attr))
+            if value:
+                title_texts.append(value)
+        except Exception:
+            pass
+    container = None
+    for xpath in ("xpath=ancestor::article[1]", "xpath=ancestor::div[1]", "xpath=ancestor::li[1]"):
+        try:
+            loc = anchor.locator(xpath).first
+            if (yield PageCall(loc.count)) > 0:
+                container = loc
+                break
+        except Exception:
+            continue
+    if container is not None:
+        try:
+            # 常见标题/文本位置
+            cand = container.locator("h1, h2, h3, [class*='title'], [title], [aria-label], p, span")
+            inner = yield PageCall(cand.all_inner_texts)
+            for t in inner:
+                t = (t or "").strip()
+                if t:
+                    title_texts.append(t)
+        except Exception:
+            pass
+        # 提取图片 alt 文本作为可能的标题来源
+        try:
+            alt_values = yield PageCall(
+                lambda: container.locator("img[alt]").evaluate_all("els => els.map(e => e.getAttribute('alt'))")
+            )
+            for t in alt_values or []:
+                t = (t or "").strip()
+                if t:
+                    title_texts.append(t)
+        except Exception:
+            pass
+        # 兜底抓取容器整体的内文本（避免过大）
+        try:
+            bulk_text = yield PageCall(lambda: container.inner_text(timeout=200))
+            bulk_text = (bulk_text or "").strip()
+            if bulk_text:
+                title_texts.append(bulk_text)
+        except Exception:
+            pass
+    # 去重
+    seen = set()
+    merged = []
+    for t in title_texts:
+        if t not in seen:
+            seen.add(t)
+            merged.append(t)
+    try:
+        href = (yield PageCall(lambda: anchor.get_attribute("href"))) or ""
+    except Exception:
+        href = ""
+    return {"title": " \n".join(merged), "link": href}
+
+
+def _card_links_steps(page, scan_token: Optional[str] = None):
+    # 第一阶段：单次往返取回（新增）卡片的 href，不读取任何文本
+    links = yield PageCall(lambda: page.locator(FEED_CARD_SELECTOR).evaluate_all(_CARD_LINKS_JS, scan_token))
+    return list(links or [])
+
+
+def _card_titles_steps(page, links: List[str]):
+    # 第二阶段：单次往返只为给定 href 的卡片提取标题文本
+    if not links:
+        return {}
+    titles = yield PageCall(lambda: page.locator(FEED_CARD_SELECTOR).evaluate_all(_CARD_TITLES_JS, links))
+    return dict(titles or {})
+
+
+def _iter_feed_cards_steps(
+    page,
+    scan_token: Optional[str] = None,
+    skip_href: Optional[Callable[[str], bool]] = None,
+    need_title: bool = True,
+    debug: bool = False,
+):
+    # 逐个产出 (锚点, 字段值)，分两阶段：先取全部 href 并用 skip_href 筛掉已见/已排除的卡片，
+    # 再只为剩下的卡片提取标题（need_title 为假时完全跳过）；批量提取失败时回退到逐个锚点提取
+    try:
+        with PROFILER.phase("scan"):
+            links = yield from _card_links_steps(page, scan_token)
+    except Exception as e:
+        links = None
+        if debug:
+            print(f"[DEBUG] 批量提取卡片失败，回退逐个提取: {e}")
+    if links is not None:
+        if skip_href is not None:
+            links = [link for link in links if not skip_href(link)]
+        titles: Optional[Dict[str, str]] = {}
+        if need_title and links:
+            try:
+                with PROFILER.phase("scan"):
+                    titles = yield from _card_titles_steps(page, links)
+            except Exception as e:
+                titles = None
+                if debug:
+                    print(f"[DEBUG] 批量提取标题失败，回退逐个提取: {e}")
+        for link in links:
+            if titles is not None:
+                yield None, {"title": titles.get(link, ""), "link": link}
+                continue
+            a = _card_anchor(page, link)
+            try:
+                with PROFILER.phase("scan"):
+                    field_values = yield from _extract_card_texts_steps(a)
+            except Exception:
+                continue
+            yield a, field_values
+        return
+    anchors = []
+    with PROFILER.phase("scan"):
+        for sel in FEED_CARD_SELECTORS:
+            try:
+                anchors.extend((yield PageCall(page.locator(sel).all)))
+            except Exception:
+                continue
+    for a in anchors:
+        try:
+            with PROFILER.phase("scan"):
+                href = (yield PageCall(lambda: a.get_attribute("href"))) or ""
+                if skip_href is not None and skip_href(href):
+                    continue
+                if need_title:
+                    field_values = yield from _extract_card_texts_steps(a)
+                else:
+                    field_values = {"title": "", "link": href}
+        except Exception:
+            continue
+        yield a, field_values
+
+
+def _iter_captured_cards(capture: FeedCapture, skip_href: Callable[[str], bool]):
+    # 产出接口捕获到的新笔记 (None, 字段值)
+    with PROFILER.phase("scan"):
+        notes = capture.drain()
+    for note in notes:
+        field_values = note.field_values()
+        if skip_href(field_values["link"]):
+            continue
+        yield None, field_values
+
+
+def _poll_feed_ready_steps(page, deadline: float, min_cards: int):
+    # 逐个选择器计数的轮询方式（浏览器端判断不可用时的兜底）
+    while time.time() < deadline:
+        try:
+            total = 0
+            for sel in FEED_CARD_SELECTORS:
+                total += yield PageCall(page.locator(sel).count)
+            if total >= min_cards:
+                return True
+        except Exception:
+            pass
+        yield PageCall(lambda: page.wait_for_timeout(300))
+    return False
+
+
+def _wait_for_feed_ready_steps(page, timeout_ms: int = 12000, min_cards: int = 1, debug: bool = False):
+    # 等待推荐流中至少出现 min_cards 个卡片链接：一次 wait_for_function，条件满足立即返回
+    # 返回 (是否就绪, 等待毫秒数)
+    started = time.time()
+    with PROFILER.phase("feed_ready"):
+        try:
+            # 使用定时轮询而非 raf：首页标签在后台时 raf 不会触发
+            yield PageCall(
+                lambda: page.wait_for_function(
+                    _FEED_READY_JS, arg=[FEED_CARD_SELECTOR, min_cards], timeout=timeout_ms, polling=100
+                )
+            )
+            ready = True
+        except PWTimeout:
+            ready = False
+        except Exception:
+            ready = yield from _poll_feed_ready_steps(page, started + timeout_ms / 1000.0, min_cards)
+    waited_ms = (time.time() - started) * 1000.0
+    if debug:
+        print(f"[DEBUG] 推荐流{'就绪' if ready else '未就绪'}，等待 {waited_ms:.0f}ms")
+    return ready, waited_ms
+
+
+def _scan_matches_steps(
+    page,
+    ruleset: CompiledRuleSet,
+    exclude_set: Optional[CompiledRuleSet],
+    excluded: Set[Any],
+    seen_keys: Set[Any],
+    seen_index: Optional[SeenNoteIndex],
+    max_scroll_steps: int,
+    scroll_pause_ms: int,
+    scan_token: Optional[str],
+    capture: Optional[FeedCapture] = None,
+    stop_after_step: Optional[Callable[[], bool]] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
+):
+    # 滚动扫描当前推荐流，逐个产出命中的 (锚点或 None, 字段值, 表达式, 字段)
+    # 传入 capture 且已收到推荐流接口响应时，直接匹配接口数据，不读取页面文本
+    # stop_after_step() 在一步的卡片处理完后为真时停止，不再滚动
+    # 传入 reloader 时每步滚动前检查关键词文件，规则变化后换用新规则集，并重新匹配当前已渲染的卡片
+    # 已见/排除的卡片按 NoteKey 比较（同一笔记的 href 可能带不同的 xsec_token 或路径形式）
+    # 只含链接规则时无需提取标题
+    # card_dump（--dump-cards）：每张提取到的卡片（含被排除/已处理而跳过的）都带标题写入转储文件，供 xhs_rules.py match 离线回放；
+    # 此时只在提取阶段筛掉本次已见过的卡片，跳过原因随记录写出
+    need_title = card_dump is not None or ruleset.needs_title or (exclude_set is not None and exclude_set.needs_title)
+    if card_dump is not None:
+        skip_href = _make_skip_href(seen_keys, set(), None)
+    else:
+        skip_href = _make_skip_href(seen_keys, excluded, seen_index)
+    for step_idx in range(max_scroll_steps):
+        if reloader is not None:
+            reloaded = reloader.poll()
+            if reloaded is not None:
+                ruleset = reloaded
+                need_title = card_dump is not None or ruleset.needs_title or (exclude_set is not None and exclude_set.needs_title)
+                # 已见过的卡片按新规则再匹配一次（接口捕获的笔记已取出，不会重新匹配）
+                seen_keys.clear()
+                if scan_token is not None:
+                    scan_token = _new_scan_token()
+        # 等待推荐流渲染一些卡片
+        yield from _wait_for_feed_ready_steps(page, timeout_ms=3000 if step_idx == 0 else 1500, debug=debug)
+        debug_printed = 0
+        if capture is not None and capture.responses > 0:
+            cards = _iter_captured_cards(capture, skip_href)
+        else:
+            cards = _iter_feed_cards_steps(page, scan_token, skip_href, need_title, debug)
+        while True:
+            item = yield from _next_output(cards)
+            if item is _DONE:
+                break
+            a, field_values = item
+            href = field_values.get("link", "")
+            key = NoteKey.coerce(href)
+            if not href or key in seen_keys:
+                continue
+            seen_keys.add(key)
+            if card_dump is not None:
+                skipped = _skip_reason(key, excluded, seen_index)
+                card_dump.write(field_values, step_idx, skipped)
+                if skipped:
+                    continue
+
+            # 若开启调试，打印部分候选卡片的内容，便于排查选择器/文本提取
+            if debug and step_idx == 0 and debug_printed < 5:
+                if debug_printed == 0:
+                    print("[DEBUG] 候选卡片示例（前5条）：")
+                print("[DEBUG] href=", href)
+                print("[DEBUG] title=", (field_values.get("title", "") or "").replace("\n", " ")[:180])
+                debug_printed += 1
+
+            with PROFILER.phase("match"):
+                hit = _match_card(ruleset, exclude_set, field_values)
+            if hit:
+                expr, field = hit
+                yield a, field_values, expr, field
+        if card_dump is not None:
+            card_dump.flush()
+        if stop_after_step is not None and stop_after_step():
+            return
+        with PROFILER.phase("scan"):
+            yield PageCall(lambda: page.mouse.wheel(0, 2600))
+            yield PageCall(lambda: page.wait_for_timeout(scroll_pause_ms))
+
+
+def _prepare_scan(rules, exclude_rules, match_options: Dict[str, bool], incremental: bool):
+    # 增量模式（默认开启）：每步滚动后只处理新渲染的卡片
+    ruleset, exclude_set = _compile_scan_rules(rules, exclude_rules, match_options)
+    return ruleset, exclude_set, bool(incremental)
+
+
+def _note_anchor(page, href: str):
+    # 按笔记 ID 定位卡片锚点（接口数据中的链接参数可能与页面上的不同）
+    key = NoteKey.from_url(href)
+    if key is None:
+        return _card_anchor(page, href)
+    return page.locator(f"a[href*='/explore/{key.note_id}']").first
+
+
+def _anchor_present_steps(anchor):
+    try:
+        return (yield PageCall(anchor.count)) > 0
+    except Exception:
+        return False
+
+
+def _find_card_steps(
+    page,
+    rules: List[Tuple[Set[str], str]],
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    exclude_urls: Optional[Set[Any]] = None,
+    max_scroll_steps: int = 6,
+    scroll_pause_ms: int = 800,
+    incremental: bool = True,
+    seen_index: Optional[SeenNoteIndex] = None,
+    capture: Optional[FeedCapture] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
+    match_options: Optional[Dict[str, bool]] = None,
+):
+    # 返回第一张命中卡片的 (锚点, 表达式, 字段)；exclude_urls 可混放链接与 NoteKey
+    ruleset, exclude_set, incremental = _prepare_scan(rules, exclude_rules, match_options or {}, incremental)
+    excluded = {NoteKey.coerce(u) for u in exclude_urls} if exclude_urls else set()
+    scan_token = _new_scan_token() if incremental else None
+    # 接口数据命中但卡片尚未渲染到页面上的，滚动后再找
+    deferred: List[Tuple[Any, str, str]] = []
+
+    def resolve_deferred():
+        for anchor, expr, field in deferred:
+            if (yield from _anchor_present_steps(anchor)):
+                return anchor, expr, field
+        return None
+
+    matches = _scan_matches_steps(
+        page, ruleset, exclude_set, excluded, set(), seen_index,
+        max_scroll_steps, scroll_pause_ms, scan_token, capture,
+        reloader=reloader, card_dump=card_dump, debug=debug,
+    )
+    try:
+        while True:
+            item = yield from _next_output(matches)
+            if item is _DONE:
+                break
+            a, field_values, expr, field = item
+            if a is not None:
+                return a, expr, field
+            href = field_values.get("link", "")
+            if capture is None:
+                return _card_anchor(page, href), expr, field
+            # 只有点击/打开命中卡片时才访问页面元素
+            deferred.append((_note_anchor(page, href), expr, field))
+            found = yield from resolve_deferred()
+            if found:
+                return found
+    finally:
+        matches.close()
+    return (yield from resolve_deferred())
+
+
+class CandidateQueue:
+    """已命中、尚未打开的卡片，按规则顺序（规则文件中的先后）排列，同一笔记只保留一次
+
+    详情判定为不可浏览时直接打开下一个候选，无需回到首页重新扫描。
+    """
+
+    def __init__(self, ruleset: CompiledRuleSet):
+        self._heap: List[Tuple[int, int, Any, str, str, str]] = []
+        self._keys: Set[Any] = set()
+        self._seq = 0
+        self._set_ranks(ruleset)
+
+    def _set_ranks(self, ruleset: CompiledRuleSet):
+        self.ruleset = ruleset
+        self._rank: Dict[str, int] = {}
+        for idx, (_, expr) in enumerate(ruleset.rules):
+            self._rank.setdefault(expr, idx)
+
+    def rerank(self, ruleset: CompiledRuleSet):
+        """规则重新加载后按新的规则顺序排列，丢弃命中规则已被删除的候选"""
+        self._set_ranks(ruleset)
+        heap = []
+        for _, seq, anchor, href, expr, field in self._heap:
+            if expr in self._rank:
+                heap.append((self._rank[expr], seq, anchor, href, expr, field))
+            else:
+                self._keys.discard(NoteKey.coerce(href))
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def follow(self, reloader: Optional[RuleSetReloader]):
+        """规则被 reloader 换新后按新规则重新排列"""
+        if reloader is not None and self.ruleset is not reloader.ruleset:
+            self.rerank(reloader.ruleset)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, anchor, href: str, expr: str, field: str) -> bool:
+        key = NoteKey.coerce(href)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        # 同一规则按发现顺序
+        heapq.heappush(self._heap, (self._rank.get(expr, len(self._rank)), self._seq, anchor, href, expr, field))
+        self._seq += 1
+        return True
+
+    def pop(self, exclude: Optional[Set[Any]] = None) -> Optional[Tuple[Any, str, str, str]]:
+        """取出排在最前的 (锚点, href, 表达式, 字段)，跳过 exclude 中的笔记；队列为空返回 None"""
+        while self._heap:
+            _, _, anchor, href, expr, field = heapq.heappop(self._heap)
+            if exclude and NoteKey.coerce(href) in exclude:
+                continue
+            return anchor, href, expr, field
+        return None
+
+    def clear(self):
+        self._heap = []
+        self._keys = set()
+
+
+def _queue_matching_steps(
+    page,
+    rules: List[Tuple[Set[str], str]],
+    candidates: CandidateQueue,
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    exclude_urls: Optional[Set[Any]] = None,
+    max_scroll_steps: int = 6,
+    scroll_pause_ms: int = 800,
+    incremental: bool = True,
+    seen_index: Optional[SeenNoteIndex] = None,
+    capture: Optional[FeedCapture] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
+    match_options: Optional[Dict[str, bool]] = None,
+):
+    # 滚动扫描直到某一步出现命中，把这一步的全部命中卡片放入 candidates，返回新加入的数量
+    ruleset, exclude_set, incremental = _prepare_scan(rules, exclude_rules, match_options or {}, incremental)
+    excluded = {NoteKey.coerce(u) for u in exclude_urls} if exclude_urls else set()
+    scan_token = _new_scan_token() if incremental else None
+    # 接口数据对应的卡片可能尚未渲染，按笔记 ID 定位
+    locate = _note_anchor if capture is not None else _card_anchor
+    added = 0
+    matches = _scan_matches_steps(
+        page, ruleset, exclude_set, excluded, set(), seen_index,
+        max_scroll_steps, scroll_pause_ms, scan_token, capture,
+        stop_after_step=lambda: added > 0, reloader=reloader, card_dump=card_dump, debug=debug,
+    )
+    while True:
+        item = yield from _next_output(matches)
+        if item is _DONE:
+            break
+        a, field_values, expr, field = item
+        candidates.follow(reloader)
+        href = field_values.get("link", "")
+        if candidates.push(a if a is not None else locate(page, href), href, expr, field):
+            added += 1
+    return added
+
+
+def _iter_matching_steps(
+    page,
+    rules: List[Tuple[Set[str], str]],
+    exclude_rules: Optional[List[Tuple[Set[str], str]]] = None,
+    exclude_urls: Optional[Set[Any]] = None,
+    max_scroll_steps: int = 6,
+    scroll_pause_ms: int = 800,
+    incremental: bool = True,
+    seen_index: Optional[SeenNoteIndex] = None,
+    max_refresh: int = 0,
+    refresh_interval_sec: float = 0.0,
+    capture: Optional[FeedCapture] = None,
+    reloader: Optional[RuleSetReloader] = None,
+    card_dump: Optional[CardDumpWriter] = None,
+    debug: bool = False,
+    match_options: Optional[Dict[str, bool]] = None,
+):
+    # 滚动并刷新推荐流，逐个产出所有命中的卡片 (卡片, 表达式, 字段)，语义见 xhs_find_and_open.iter_matching_cards
+    ruleset, exclude_set, incremental = _prepare_scan(rules, exclude_rules, match_options or {}, incremental)
+    excluded = {NoteKey.coerce(u) for u in exclude_urls} if exclude_urls else set()
+    seen_keys: Set[Any] = set()
+    # 规则重新加载后已见卡片会被重新匹配，已产出的笔记不再重复产出
+    emitted: Set[Any] = set()
+    refreshes = 0
+    while True:
+        scan_token = _new_scan_token() if incremental else None
+        matches = _scan_matches_steps(
+            page, ruleset, exclude_set, excluded, seen_keys, seen_index,
+            max_scroll_steps, scroll_pause_ms, scan_token, capture,
+            reloader=reloader, card_dump=card_dump, debug=debug,
+        )
+        while True:
+            item = yield from _next_output(matches)
+            if item is _DONE:
+                break
+            _, field_values, expr, field = item
+            key = NoteKey.coerce(field_values.get("link", ""))
+            if key in emitted:
+                continue
+            emitted.add(key)
+            yield _card_record(page.url, field_values), expr, field
+        if reloader is not None:
+            ruleset = reloader.ruleset
+        if 0 <= max_refresh <= refreshes:
+            return
+        refreshes += 1
+        if refresh_interval_sec > 0:
+            yield PageCall(lambda: page.wait_for_timeout(refresh_interval_sec * 1000))
+        # 刷新首页，卡片出现即可继续
+        try:
+            yield PageCall(lambda: page.reload(wait_until="domcontentloaded", timeout=20000))
+            yield from _wait_for_feed_ready_steps(page, timeout_ms=6000, debug=debug)
+        except Exception as e:
+            print(f"刷新首页失败: {e}")
+            if _is_login_page(page.url):
+                return
+
+
+class DetailPagePoolBase:
+    """浏览器上下文所属的详情标签页池
+
+    acquire() 优先取已预热的空闲标签页，没有才新建；release() 把标签页重置到空白页后放回池中，
+    超出容量或重置失败的标签页直接关闭。点击打开的新标签页用 adopt() 登记后由池管理，
+    未登记的标签页归还时同样会被收入池中。页面调用写成步骤生成器，各引擎的 DetailPagePool 用自己的驱动执行。
+    """
+
+    def __init__(self, context, size: int = DETAIL_POOL_SIZE, headers: Optional[Dict[str, str]] = None):
+        self.context = context
+        self.size = max(0, size)
+        self.headers = headers
+        self._idle: List[Any] = []
+        self._busy: List[Any] = []
+        self.created = 0
+        self.reused = 0
+
+    def owns(self, tab) -> bool:
+        return any(t is tab for t in self._busy) or any(t is tab for t in self._idle)
+
+    def summary(self) -> str:
+        return f"新建 {self.created} 个，复用 {self.reused} 次"
+
+    def _prepare_steps(self, tab):
+        if self.headers:
+            yield PageCall(lambda: tab.set_extra_http_headers(self.headers))
+        return tab
+
+    def _acquire_steps(self):
+        while self._idle:
+            tab = self._idle.pop()
+            if tab.is_closed():
+                continue
+            self._busy.append(tab)
+            self.reused += 1
+            return tab
+        tab = yield PageCall(self.context.new_page)
+        yield from self._prepare_steps(tab)
+        self.created += 1
+        self._busy.append(tab)
+        return tab
+
+    def _adopt_steps(self, tab):
+        # 登记池外打开的标签页（设置请求头），出错时关闭它
+        if self.owns(tab):
+            return tab
+        try:
+            yield from self._prepare_steps(tab)
+        except Exception:
+            yield from self._close_steps(tab)
+            raise
+        self._busy.append(tab)
+        return tab
+
+    def _release_steps(self, tab):
+        if not self.owns(tab):
+            try:
+                yield from self._adopt_steps(tab)
+            except Exception:
+                return
+        self._busy = [t for t in self._busy if t is not tab]
+        if tab.is_closed():
+            return
+        if len(self._idle) >= self.size:
+            yield from self._close_steps(tab)
+            return
+        try:
+            # 重置：离开详情页，停止其脚本与媒体加载
+            yield PageCall(lambda: tab.goto(DETAIL_POOL_BLANK_URL, timeout=5000))
+        except Exception:
+            yield from self._close_steps(tab)
+            return
+        self._idle.append(tab)
+
+    def _close_all_steps(self):
+        tabs, self._busy, self._idle = self._busy + self._idle, [], []
+        for tab in tabs:
+            yield from self._close_steps(tab)
+
+    @staticmethod
+    def _close_steps(tab):
+        try:
+            yield PageCall(tab.close)
+        except Exception:
+            pass